@@ -1,9 +1,22 @@
 import logging
+import os
 from typing import Tuple
 
-from app.views import FlatsForSalePaginatedListView
+from app.services.autocomplete import AutocompleteService
+from app.services.image_cache import ImageProxy
+from app.views import (
+    AutocompleteView,
+    FlatsFilteredListView,
+    FlatsForSalePaginatedListView,
+    FlatsMapView,
+    FlatsSearchView,
+    ImageThumbnailView,
+    PoolStatsView,
+)
 from database.apply_migrations import AlembicMigrationManager
 from database.factory import SQLAlchemySessionFactory
+from database.services.image_cache import ImageCacheConfig
+from database.services.row_count import COUNT_PROVIDERS
 from http_server.handler import SimpleHTTPRequestHandler
 
 logger = logging.getLogger(__name__)
@@ -13,17 +26,24 @@ class Application:
     def __init__(self, db_url: str):
         """
         Initialize the application with database URL and session factory for centralizing the session creation.
+        The number of flats per page is read from the ITEMS_PER_PAGE environment variable (500 by default): pages
+        are queried with LIMIT / OFFSET, so it does not depend on the size of the catalog.
+        The total number of flats of a listing is counted as set by the COUNT_STRATEGY environment variable (see
+        database.services.row_count): "exact" (SELECT count(*), the default), "estimate" (the planner's estimate,
+        shown as "about N") or "cached" (the row counter the scraper keeps, for the unfiltered listing).
         """
-        self.MAX_ITEMS_PER_PAGE = 500
+        self.MAX_ITEMS_PER_PAGE = int(os.environ.get("ITEMS_PER_PAGE", 500))
+        self.COUNT_STRATEGY = os.environ.get("COUNT_STRATEGY", "exact")
         self.database_url = db_url
         self.session_factory = None
+        self.autocomplete_service = None
 
     def setup(self) -> Tuple[bool, str]:
         """
         The setup method is used to initialize the application:
             - Apply database migrations
             - Create session factory
-            - Set up routes for the HTTP server
+            - Set up routes for the HTTP server, build the autocomplete index and start its background refresh
 
         :return: A tuple of success and message. If success is False, the message contains the error.
         """
@@ -60,8 +80,64 @@ class Application:
 
     def _setup_routes(self) -> Tuple[bool, str]:
         try:
-            flats_view = FlatsForSalePaginatedListView(self.session_factory, items_per_page=self.MAX_ITEMS_PER_PAGE)
-            SimpleHTTPRequestHandler.add_route("/", lambda handler: flats_view.render())
+            image_config = ImageCacheConfig.from_env()
+            # The proxy and its disk cache exist only if the pages link the thumbnails it serves
+            image_view = (
+                ImageThumbnailView(self.session_factory, ImageProxy.from_config(image_config))
+                if image_config.enabled
+                else None
+            )
+            image_src = image_view.image_src if image_view is not None else None
+            if self.COUNT_STRATEGY not in COUNT_PROVIDERS:
+                raise ValueError(
+                    f"Unknown COUNT_STRATEGY {self.COUNT_STRATEGY!r}, expected one of: {', '.join(COUNT_PROVIDERS)}"
+                )
+            count_provider = COUNT_PROVIDERS[self.COUNT_STRATEGY]()
+            flats_view = FlatsForSalePaginatedListView(
+                self.session_factory,
+                items_per_page=self.MAX_ITEMS_PER_PAGE,
+                image_src=image_src,
+                count_provider=count_provider,
+            )
+            filtered_flats_view = FlatsFilteredListView(
+                self.session_factory,
+                items_per_page=self.MAX_ITEMS_PER_PAGE,
+                image_src=image_src,
+                count_provider=count_provider,
+            )
+            search_view = FlatsSearchView(
+                self.session_factory,
+                items_per_page=self.MAX_ITEMS_PER_PAGE,
+                image_src=image_src,
+                count_provider=count_provider,
+            )
+            SimpleHTTPRequestHandler.add_route(
+                FlatsForSalePaginatedListView.PATH, lambda handler: flats_view.render(handler.path)
+            )
+            SimpleHTTPRequestHandler.add_route(
+                FlatsFilteredListView.PATH, lambda handler: filtered_flats_view.render(handler.path)
+            )
+            SimpleHTTPRequestHandler.add_route(FlatsSearchView.PATH, lambda handler: search_view.render(handler.path))
+            self.autocomplete_service = AutocompleteService(self.session_factory)
+            self.autocomplete_service.build()
+            self.autocomplete_service.start_refresh()
+            autocomplete_view = AutocompleteView(self.autocomplete_service)
+            SimpleHTTPRequestHandler.add_route(
+                AutocompleteView.PATH, lambda handler: autocomplete_view.render(handler.path)
+            )
+            map_view = FlatsMapView(self.session_factory)
+            SimpleHTTPRequestHandler.add_route(
+                FlatsMapView.FLATS_PATH, lambda handler: map_view.render_flats(handler.path)
+            )
+            SimpleHTTPRequestHandler.add_route(
+                FlatsMapView.CLUSTERS_PATH, lambda handler: map_view.render_clusters(handler.path)
+            )
+            pool_stats_view = PoolStatsView(self.session_factory)
+            SimpleHTTPRequestHandler.add_route(PoolStatsView.PATH, lambda handler: pool_stats_view.render())
+            if image_view is not None:
+                SimpleHTTPRequestHandler.add_route(
+                    ImageThumbnailView.PATH_PREFIX, lambda handler: image_view.render(handler.path), prefix=True
+                )
             return True, "Routes set up successfully"
         except Exception as e:
             logger.exception("Failed to set up routes: %s", e)
@@ -0,0 +1,164 @@
+import bisect
+import heapq
+import logging
+import threading
+import time
+from array import array
+from typing import Dict, Iterable, List, NamedTuple, Optional
+
+from database.factory import SQLAlchemySessionFactory
+from database.services.flat import FlatDataReader
+from database.services.notifications import FLATS_UPDATED_CHANNEL, NotificationListener
+from database.sql_schema import UNACCENT_FROM, UNACCENT_TO
+
+logger = logging.getLogger(__name__)
+
+# Accents are folded like in the full-text search (database.sql_schema), "+" is a separator: "2+kk" is "2 kk"
+FOLD_TABLE = str.maketrans(UNACCENT_FROM + "+", UNACCENT_TO + " ")
+
+
+def fold(value: str) -> str:
+    """
+    Search key of a value: without accents, lower case, single spaces ("Praha 6 -  Bubeneč" -> "praha 6 - bubenec").
+    """
+    return " ".join(value.translate(FOLD_TABLE).lower().split())
+
+
+class AutocompleteEntry(NamedTuple):
+    """
+    A suggestion: kind of the value ("locality" or "disposition"), the value and the number of flats with it.
+    """
+
+    kind: str
+    value: str
+    count: int
+
+
+class AutocompleteIndex:
+    """
+    Immutable in-memory prefix index of values (localities, dispositions), searched by the prefix of any of their
+    words: "bub" suggests "Praha 6 - Bubeneč", the values with the most flats first.
+
+    The entries are numbered by decreasing count, so the best suggestions of a prefix are the smallest entry
+    numbers among its matches. Every word start of a folded value is a key ("praha 6 - bubenec", "6 - bubenec",
+    "bubenec"), the keys are sorted and a prefix is looked up with bisect. The suggestions of the prefixes matched
+    by more than PRECOMPUTE_THRESHOLD keys ("p", "pra", ...) are computed when the index is built, so no lookup
+    looks at more than PRECOMPUTE_THRESHOLD keys.
+    """
+
+    MAX_LIMIT = 10
+    PRECOMPUTE_THRESHOLD = 64
+
+    def __init__(self, entries: Iterable[AutocompleteEntry]):
+        self.entries: List[AutocompleteEntry] = sorted(entries, key=lambda entry: (-entry.count, entry.value))
+        keys = []
+        for number, entry in enumerate(self.entries):
+            folded = fold(entry.value)
+            for position in range(len(folded)):
+                if folded[position].isalnum() and (position == 0 or not folded[position - 1].isalnum()):
+                    keys.append((folded[position:], number))
+        keys.sort()
+        self.keys: List[str] = [key for key, _ in keys]
+        self.numbers = array("I", (number for _, number in keys))
+        self.precomputed: Dict[str, List[int]] = {}
+        self._precompute(0, len(self.keys), 0)
+
+    def __len__(self) -> int:
+        return len(self.entries)
+
+    def _best(self, lo: int, hi: int) -> List[int]:
+        return heapq.nsmallest(self.MAX_LIMIT, set(self.numbers[lo:hi]))
+
+    def _precompute(self, lo: int, hi: int, depth: int) -> None:
+        """
+        Compute the suggestions of the prefix of length depth shared by keys[lo:hi] if there are more than
+        PRECOMPUTE_THRESHOLD of them, then of its longer prefixes.
+        """
+        if hi - lo <= self.PRECOMPUTE_THRESHOLD:
+            return
+        self.precomputed[self.keys[lo][:depth]] = self._best(lo, hi)
+        start = lo
+        while start < hi:
+            prefix = self.keys[start][: depth + 1]
+            if len(prefix) <= depth:
+                # The key is the prefix itself, it has no longer prefixes
+                start += 1
+                continue
+            end = bisect.bisect_left(self.keys, prefix + "\uffff", start, hi)
+            self._precompute(start, end, depth + 1)
+            start = end
+
+    def search(self, query: str, limit: int = MAX_LIMIT) -> List[AutocompleteEntry]:
+        """
+        :param query: Beginning of a word of the values, accents and case are ignored.
+        :param limit: Maximum number of suggestions (at most MAX_LIMIT).
+        :return: The matching entries, the ones with the most flats first.
+        """
+        prefix = fold(query)
+        numbers = self.precomputed.get(prefix)
+        if numbers is None:
+            lo = bisect.bisect_left(self.keys, prefix)
+            hi = bisect.bisect_left(self.keys, prefix + "\uffff", lo)
+            numbers = self._best(lo, hi)
+        return [self.entries[number] for number in numbers[:limit]]
+
+
+class AutocompleteService:
+    """
+    Serves the suggestions of an AutocompleteIndex of the localities and dispositions of the flats, built from the
+    flats table at startup (build) and rebuilt in a background thread (start_refresh) whenever the scraper
+    notifies that a crawl wrote flats (database.services.notifications.FLATS_UPDATED_CHANNEL). A rebuilt index
+    replaces the current one at once, lookups never wait for a rebuild.
+    """
+
+    COLUMNS = ("locality", "disposition")
+
+    def __init__(self, session_factory: SQLAlchemySessionFactory, retry_interval: float = 30.0):
+        self.session_factory = session_factory
+        self.reader = FlatDataReader(session_factory)
+        self.retry_interval = retry_interval
+        self.index = AutocompleteIndex([])
+        self._stopped = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def search(self, query: str, limit: int = AutocompleteIndex.MAX_LIMIT) -> List[AutocompleteEntry]:
+        return self.index.search(query, limit)
+
+    def build(self) -> AutocompleteIndex:
+        started_at = time.perf_counter()
+        entries = [
+            AutocompleteEntry(kind=column_name, value=value, count=count)
+            for column_name in self.COLUMNS
+            for value, count in self.reader.retrieve_value_counts(column_name)
+        ]
+        self.index = AutocompleteIndex(entries)
+        logger.info(
+            "Built the autocomplete index of %s values in %.3f s", len(entries), time.perf_counter() - started_at
+        )
+        return self.index
+
+    def start_refresh(self) -> None:
+        self._thread = threading.Thread(target=self._refresh_loop, name="autocomplete-refresh", daemon=True)
+        self._thread.start()
+
+    def stop_refresh(self) -> None:
+        self._stopped.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+
+    def _refresh_loop(self) -> None:
+        reconnected = False
+        while not self._stopped.is_set():
+            try:
+                with NotificationListener(self.session_factory, FLATS_UPDATED_CHANNEL) as listener:
+                    if reconnected:
+                        # Flats may have been written while the listener was disconnected
+                        self.build()
+                    while not self._stopped.is_set():
+                        if listener.poll(timeout=1.0):
+                            self.build()
+            except Exception as e:
+                logger.error("Autocomplete index refresh failed, retrying in %s s: %s", self.retry_interval, e)
+                reconnected = True
+                self._stopped.wait(self.retry_interval)
@@ -1,5 +1,6 @@
 from abc import ABC, abstractmethod
-from typing import Sized
+from html import escape
+from typing import Callable, Optional, Sequence
 
 
 class HTMLPageGenerator(ABC):
@@ -35,28 +36,63 @@ class SimpleHTMLPageGenerator(HTMLPageGenerator):
 
     <a href="/page/1">Previous Page</a>
     <a href="/page/3">Next Page</a>
+
+    Without total_items, items are all the items and the page is sliced from them. With total_items, items are
+    the items of the page already (e.g. a LIMIT / OFFSET query) and page_url(page_number) builds the links to the
+    previous and next pages, or previous_url / next_url are the links themselves (e.g. the cursors of a keyset
+    pagination). more_items tells that total_items is only a lower bound of the number of items
+    (see CappedCountProvider), approximate that it is an estimate ("about N",
+    see database.services.row_count.EstimatedCountProvider).
+
+    The images are loaded lazily by the browser. image_src builds the src of an item's image, the remote
+    image_url by default (e.g. lambda item: f"/img/{item.id}" to serve thumbnails through the image proxy).
     """
 
-    def generate_page(self, items: Sized, page_number: int) -> str:
-        total_items = len(items)
-        total_pages = (total_items + self.items_per_page - 1) // self.items_per_page
+    def __init__(self, items_per_page: int, image_src: Optional[Callable] = None):
+        super().__init__(items_per_page)
+        self.image_src = image_src or (lambda item: item.image_url)
 
-        start_idx = (page_number - 1) * self.items_per_page
-        end_idx = start_idx + self.items_per_page
-        items_to_display = items[start_idx:end_idx]
+    def generate_page(
+        self,
+        items: Sequence,
+        page_number: int,
+        total_items: Optional[int] = None,
+        page_url: Optional[Callable[[int], str]] = None,
+        more_items: bool = False,
+        approximate: bool = False,
+        previous_url: Optional[str] = None,
+        next_url: Optional[str] = None,
+    ) -> str:
+        if total_items is None:
+            total_items = len(items)
+            start_idx = (page_number - 1) * self.items_per_page
+            items_to_display = items[start_idx : start_idx + self.items_per_page]
+        else:
+            items_to_display = items
+        total_pages = (total_items + self.items_per_page - 1) // self.items_per_page
+        more = "+" if more_items else ""
+        about = "about " if approximate else ""
 
         if not items_to_display:
             return "<html><body>🕵️ No items to display.</body></html>"
 
         html = "<html><body>"
         current_page = page_number
-        html += f"<h1>🏠 Flats for Sale (Page {current_page} of {total_pages})</h1>"
-        html += f"<h2>#️⃣ Total Items: {total_items} | Items per Page: {self.items_per_page}</h2>"
+        html += f"<h1>🏠 Flats for Sale (Page {current_page} of {about}{total_pages}{more})</h1>"
+        html += f"<h2>#️⃣ Total Items: {about}{total_items}{more} | Items per Page: {self.items_per_page}</h2>"
         html += "<hr>"
 
         for item in items_to_display:
             html += f"<h3>🏠 {item.title}</h3>"
-            html += f'<img src="{item.image_url}" alt="{item.title}" width="250"><br><br>'
+            html += f'<img src="{self.image_src(item)}" alt="{item.title}" width="250" loading="lazy"><br><br>'
+
+        if page_url is not None:
+            previous_url = page_url(page_number - 1) if page_number > 1 else None
+            next_url = page_url(page_number + 1) if page_number < total_pages or more_items else None
+        if previous_url is not None:
+            html += f'<a href="{escape(previous_url)}">👈Previous Page</a> '
+        if next_url is not None:
+            html += f'<a href="{escape(next_url)}">👉Next Page</a>'
 
         html += "</body></html>"
         return html
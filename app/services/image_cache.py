@@ -0,0 +1,66 @@
+import urllib.request
+from typing import Callable, Tuple
+
+from database.services.image_cache import DiskLRUCache, ImageCacheConfig, build_thumbnail_url
+
+
+def sniff_content_type(content: bytes) -> str:
+    if content.startswith(b"\xff\xd8\xff"):
+        return "image/jpeg"
+    if content.startswith(b"\x89PNG\r\n\x1a\n"):
+        return "image/png"
+    if content[:4] == b"RIFF" and content[8:12] == b"WEBP":
+        return "image/webp"
+    if content.startswith((b"GIF87a", b"GIF89a")):
+        return "image/gif"
+    return "application/octet-stream"
+
+
+def fetch_url(url: str, timeout: float) -> bytes:
+    request = urllib.request.Request(url, headers={"User-Agent": "sreality-scraper-image-proxy"})
+    with urllib.request.urlopen(request, timeout=timeout) as response:
+        return response.read()
+
+
+class ImageProxy:
+    """
+    Serves thumbnails of the listings' images from a DiskLRUCache, fetching them from the image CDN on a miss.
+    The cache key is the thumbnail URL, so the server and the crawl-time prefetch find the same entries.
+    """
+
+    def __init__(
+        self,
+        cache: DiskLRUCache,
+        width: int = 400,
+        height: int = 300,
+        timeout: float = 5.0,
+        fetch: Callable[[str, float], bytes] = fetch_url,
+    ):
+        self.cache = cache
+        self.width = width
+        self.height = height
+        self.timeout = timeout
+        self.fetch = fetch
+
+    @classmethod
+    def from_config(cls, config: ImageCacheConfig) -> "ImageProxy":
+        return cls(DiskLRUCache(config.directory, config.max_bytes), config.width, config.height, config.timeout)
+
+    def thumbnail_url(self, image_url: str) -> str:
+        return build_thumbnail_url(image_url, self.width, self.height)
+
+    def is_cached(self, image_url: str) -> bool:
+        return self.thumbnail_url(image_url) in self.cache
+
+    def get_thumbnail(self, image_url: str) -> Tuple[bytes, str]:
+        """
+        :param image_url: URL of the listing's image.
+        :return: The thumbnail and its content type.
+        :raises OSError: The thumbnail is not cached and could not be fetched (urllib.error.URLError).
+        """
+        thumbnail_url = self.thumbnail_url(image_url)
+        content = self.cache.get(thumbnail_url)
+        if content is None:
+            content = self.fetch(thumbnail_url, self.timeout)
+            self.cache.put(thumbnail_url, content)
+        return content, sniff_content_type(content)
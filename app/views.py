@@ -1,22 +1,49 @@
+import json
 import logging
+import uuid
 from abc import ABC, abstractmethod
+from html import escape
 from http import HTTPStatus
-from typing import List, Type, Tuple
+from typing import Callable, List, Optional, Type, Tuple, Union
+from urllib.parse import parse_qs, urlencode, urlsplit
 
 from database.sql_schema import Flat
+from database.services.flat_filter import FlatFilter
+from database.services.flat_map import FlatMapReader
+from database.services.flat_search import FlatSearch
 from database.services.pagination import QueryPaginationService
+from database.services.row_count import CappedCountProvider, CountProvider, ItemCount
 from database.factory import SQLAlchemySessionFactory, get_session
+from app.services.autocomplete import AutocompleteIndex, AutocompleteService
 from app.services.html_generator import SimpleHTMLPageGenerator
+from app.services.image_cache import ImageProxy
 
 logger = logging.getLogger(__name__)
 
 
 class HTMLItemView(ABC):
-    def __init__(self, session_factory: SQLAlchemySessionFactory, items_per_page: int):
+    def __init__(
+        self,
+        session_factory: SQLAlchemySessionFactory,
+        items_per_page: int,
+        image_src: Callable = None,
+        count_provider: Optional[CountProvider] = None,
+    ):
         self.session_factory = session_factory
         self.items_per_page = items_per_page
-        self.page_generator = SimpleHTMLPageGenerator(items_per_page)
-        self.pagination_service = QueryPaginationService(session_factory, items_per_page)
+        self.page_generator = SimpleHTMLPageGenerator(items_per_page, image_src=image_src)
+        self.pagination_service = QueryPaginationService(session_factory, items_per_page, count_provider)
+
+    @staticmethod
+    def count_arguments(item_count: ItemCount) -> dict:
+        """
+        :return: The arguments of SimpleHTMLPageGenerator.generate_page showing the count: "N", "about N" or "N+".
+        """
+        return {
+            "total_items": item_count.value,
+            "approximate": item_count.kind == ItemCount.ESTIMATE,
+            "more_items": item_count.kind == ItemCount.AT_LEAST,
+        }
 
     @abstractmethod
     def render_template(self, items, page_number: int, total_pages: int) -> str:
@@ -36,8 +63,18 @@ class FlatsForSalePaginatedListView(HTMLItemView):
     We show 100 flats per page by default.
     """
 
-    def __init__(self, session_factory: SQLAlchemySessionFactory, items_per_page: int):
-        super().__init__(session_factory, items_per_page)
+    PATH = "/"
+    # Keyset of the pages, the primary key
+    SORT_COLUMNS = (Flat.id,)
+
+    def __init__(
+        self,
+        session_factory: SQLAlchemySessionFactory,
+        items_per_page: int,
+        image_src: Callable = None,
+        count_provider: Optional[CountProvider] = None,
+    ):
+        super().__init__(session_factory, items_per_page, image_src=image_src, count_provider=count_provider)
         self.items_per_page = items_per_page
 
     def render_template(self, items: List[Type[Flat]], page_number: int, total_pages: int) -> str:
@@ -50,23 +87,320 @@ class FlatsForSalePaginatedListView(HTMLItemView):
         """
         return self.page_generator.generate_page(items, page_number)
 
-    def render(self, page_number: int = 1) -> Tuple[str, HTTPStatus]:
+    def render(self, path: str = PATH) -> Tuple[str, HTTPStatus]:
         """
-        Render flats for sale on an HTML page with pagination. The page number is optional and defaults to 1.
-        The page number is passed as a query parameter in the URL.
+        Render flats for sale on an HTML page with pagination, ordered by id. The pages are linked by keyset cursors
+        on the id (/?cursor=..., see QueryPaginationService.paginate_query_by_keyset): a deep page is as fast as the
+        first one and a flat inserted meanwhile does not shift the following pages.
 
-        The pagination service is used to paginate the query by page number. The session factory is used to create
-        a session for querying the database.
+        The flats are counted on the first page only, with the count provider of the pagination service (an
+        estimate is shown as "about N"); the cursors carry the count to the next pages.
 
-        :param page_number: Page number to render. - Optional[int] = 1 by default
-        :return:
+        :param path: Request path with the query string, "/" for the first page.
+        :return: The HTML page and the status, 400 Bad Request for an invalid cursor.
         """
+        params = parse_qs(urlsplit(path).query)
+        cursor = params["cursor"][0] if params.get("cursor") else None
+        try:
+            if cursor is not None:
+                QueryPaginationService.decode_cursor(cursor, self.SORT_COLUMNS)
+        except ValueError as e:
+            return f"<html><body>Bad Request: {escape(str(e))}</body></html>", HTTPStatus.BAD_REQUEST
+
         try:
             with get_session(self.session_factory) as session:
-                flats, total_pages = self.pagination_service.paginate_query(
-                    query=session.query(Flat), page_number=page_number
+                query = session.query(Flat)
+                count_provider = self.pagination_service.count_provider
+                item_count = None if cursor else count_provider.count(query)
+                page = self.pagination_service.paginate_query_by_keyset(
+                    query, self.SORT_COLUMNS, cursor=cursor, item_count=item_count
+                )
+                item_count = page.item_count or count_provider.count(query)
+                return (
+                    self.page_generator.generate_page(
+                        page.items,
+                        page.page_number,
+                        previous_url=page.previous_cursor and self.page_url(page.previous_cursor),
+                        next_url=page.next_cursor and self.page_url(page.next_cursor),
+                        **self.count_arguments(item_count),
+                    ),
+                    HTTPStatus.OK,
                 )
-                return self.render_template(flats, page_number, total_pages), HTTPStatus.OK
         except Exception as e:
             logger.error("Failed to render the items: %s", e)
             raise
+
+    def page_url(self, cursor: str) -> str:
+        return f"{self.PATH}?{urlencode({'cursor': cursor})}"
+
+
+class FlatsFilteredListView(HTMLItemView):
+    """
+    The FlatsFilteredListView renders the flats matching the filters of the query string (see FlatFilter), sorted
+    and paginated in the database:
+        /flats?disposition=2%2Bkk&min_price=3000000&max_price=6000000&locality=Praha&sort=price
+    Invalid parameters are answered with 400 Bad Request.
+
+    The pages are linked by keyset cursors (&cursor=..., see QueryPaginationService.paginate_query_by_keyset) on
+    the sort key of the listing, so a deep page is as fast as the first one and a flat inserted meanwhile does not
+    shift the following pages. A page number (&page=2000) is still served with OFFSET. The flats are counted on the
+    first page only, the cursors carry the count to the next pages.
+    """
+
+    PATH = "/flats"
+    # Matching flats counted at most, None counts all of them
+    MAX_COUNT: Optional[int] = None
+    KEYSET_PAGINATION = True
+
+    def render_template(self, items: List[Type[Flat]], page_number: int, total_pages: int) -> str:
+        return self.page_generator.generate_page(items, page_number)
+
+    @property
+    def count_provider(self) -> CountProvider:
+        """
+        :return: A count capped at MAX_COUNT, the count provider of the pagination service if there is no cap.
+        """
+        if self.MAX_COUNT is None:
+            return self.pagination_service.count_provider
+        return CappedCountProvider(self.MAX_COUNT)
+
+    def build_listing(self, params: dict) -> Union[FlatFilter, FlatSearch]:
+        """
+        :param params: Query parameters as parsed by urllib.parse.parse_qs.
+        :return: The conditions and the ordering of the listing (apply them to a query of Flats).
+        :raises ValueError: A parameter has an invalid value.
+        """
+        return FlatFilter.from_query_params(params)
+
+    def listing_url(self, params: dict, **page) -> str:
+        query = [
+            (name, value) for name, values in params.items() if name not in ("page", "cursor") for value in values
+        ]
+        return f"{self.PATH}?{urlencode(query + list(page.items()))}"
+
+    def render(self, path: str) -> Tuple[str, HTTPStatus]:
+        """
+        :param path: Request path with the query string.
+        :return: The HTML page and the status.
+        """
+        params = parse_qs(urlsplit(path).query)
+        try:
+            listing = self.build_listing(params)
+            page_number = int(params.get("page", ["1"])[0])
+            if page_number < 1:
+                raise ValueError("page must be a positive integer")
+            cursor = params["cursor"][0] if params.get("cursor") and self.KEYSET_PAGINATION else None
+            if cursor is not None:
+                QueryPaginationService.decode_cursor(cursor, listing.sort_key()[0])
+        except ValueError as e:
+            return f"<html><body>Bad Request: {escape(str(e))}</body></html>", HTTPStatus.BAD_REQUEST
+
+        if self.KEYSET_PAGINATION and "page" not in params:
+            return self.render_keyset_page(params, listing, cursor), HTTPStatus.OK
+
+        with get_session(self.session_factory) as session:
+            flats, item_count = self.pagination_service.paginate_query(
+                listing.apply(session.query(Flat)), page_number, self.count_provider
+            )
+            return (
+                self.page_generator.generate_page(
+                    flats,
+                    page_number,
+                    page_url=lambda page: self.listing_url(params, page=page),
+                    **self.count_arguments(item_count),
+                ),
+                HTTPStatus.OK,
+            )
+
+    def render_keyset_page(self, params: dict, listing: FlatFilter, cursor: Optional[str]) -> str:
+        sort_columns, descending = listing.sort_key()
+        with get_session(self.session_factory) as session:
+            query = listing.apply(session.query(Flat))
+            # A cursor page shows the count of the first page, carried by its cursor
+            item_count = None if cursor else self.count_provider.count(query)
+            page = self.pagination_service.paginate_query_by_keyset(
+                query, sort_columns, descending, cursor, item_count
+            )
+            item_count = page.item_count or self.count_provider.count(query)
+            return self.page_generator.generate_page(
+                page.items,
+                page.page_number,
+                previous_url=page.previous_cursor and self.listing_url(params, cursor=page.previous_cursor),
+                next_url=page.next_cursor and self.listing_url(params, cursor=page.next_cursor),
+                **self.count_arguments(item_count),
+            )
+
+
+class FlatsSearchView(FlatsFilteredListView):
+    """
+    The FlatsSearchView renders the flats matching a full-text search of their title and locality (see FlatSearch),
+    the best matches first:
+        /search?q=2%2Bkk+bubenec&page=2
+    A missing or invalid q is answered with 400 Bad Request.
+
+    A common word matches a large share of the catalog, the results are counted up to MAX_COUNT ("10000+").
+    """
+
+    PATH = "/search"
+    MAX_COUNT = 10000
+    # Ordered by ts_rank, computed for every match: there is no index to seek in, pages are numbered
+    KEYSET_PAGINATION = False
+
+    def build_listing(self, params: dict) -> FlatSearch:
+        return FlatSearch.from_query_params(params)
+
+
+class ImageThumbnailView:
+    """
+    The ImageThumbnailView serves the thumbnail of a flat's image on /img/<flat id> through the ImageProxy:
+    from its disk cache, or fetched from the image CDN on a miss. Browsers may cache the thumbnail for a week.
+    """
+
+    PATH_PREFIX = "/img/"
+    CACHE_CONTROL = "public, max-age=604800"
+
+    def __init__(self, session_factory: SQLAlchemySessionFactory, image_proxy: ImageProxy):
+        self.session_factory = session_factory
+        self.image_proxy = image_proxy
+
+    @classmethod
+    def image_src(cls, flat: Flat) -> str:
+        return f"{cls.PATH_PREFIX}{flat.id}"
+
+    def render(self, path: str) -> Tuple[Optional[bytes], HTTPStatus, dict]:
+        """
+        :param path: Request path: /img/<flat id>
+        :return: The thumbnail, the status and the response headers.
+        """
+        try:
+            flat_id = uuid.UUID(path[len(self.PATH_PREFIX) :].split("?", 1)[0])
+        except ValueError:
+            return None, HTTPStatus.NOT_FOUND, {}
+
+        with get_session(self.session_factory) as session:
+            image_url = session.query(Flat.image_url).filter(Flat.id == flat_id).scalar()
+        if image_url is None:
+            return None, HTTPStatus.NOT_FOUND, {}
+
+        try:
+            content, content_type = self.image_proxy.get_thumbnail(image_url)
+        except OSError as e:
+            logger.warning("Failed to fetch the image of flat %s from %s: %s", flat_id, image_url, e)
+            return None, HTTPStatus.BAD_GATEWAY, {}
+        return content, HTTPStatus.OK, {"Content-Type": content_type, "Cache-Control": self.CACHE_CONTROL}
+
+
+class FlatsMapView:
+    """
+    The FlatsMapView serves the flats of a map view as JSON (see FlatMapReader), bbox=min_lon,min_lat,max_lon,max_lat:
+    - /map/flats?bbox=...&limit=1000: the flats inside the bounding box, at most limit of them ("truncated" tells
+      whether there were more)
+    - /map/clusters?bbox=...&zoom=12: the flats inside the bounding box aggregated by geohash prefix on the server,
+      so the browser gets one point per cluster whatever the number of flats
+    Invalid parameters are answered with 400 Bad Request.
+    """
+
+    FLATS_PATH = "/map/flats"
+    CLUSTERS_PATH = "/map/clusters"
+    DEFAULT_LIMIT = 1000
+    MAX_LIMIT = 5000
+    JSON_HEADERS = {"Content-Type": "application/json"}
+
+    def __init__(self, session_factory: SQLAlchemySessionFactory):
+        self.map_reader = FlatMapReader(session_factory)
+
+    @classmethod
+    def json_response(cls, content: dict, status: HTTPStatus = HTTPStatus.OK) -> Tuple[str, HTTPStatus, dict]:
+        return json.dumps(content, default=str), status, cls.JSON_HEADERS
+
+    @staticmethod
+    def int_param(params: dict, name: str, default: Optional[int] = None) -> int:
+        if not params.get(name):
+            if default is None:
+                raise ValueError(f"{name} is required")
+            return default
+        try:
+            return int(params[name][0])
+        except ValueError:
+            raise ValueError(f"{name} must be an integer")
+
+    def render_flats(self, path: str) -> Tuple[str, HTTPStatus, dict]:
+        """
+        :param path: Request path with the query string.
+        :return: The JSON response, the status and the response headers.
+        """
+        params = parse_qs(urlsplit(path).query)
+        try:
+            bbox = self.map_reader.parse_bbox(params.get("bbox", [None])[0])
+            limit = self.int_param(params, "limit", self.DEFAULT_LIMIT)
+            if not 1 <= limit <= self.MAX_LIMIT:
+                raise ValueError(f"limit must be between 1 and {self.MAX_LIMIT}")
+        except ValueError as e:
+            return self.json_response({"error": str(e)}, HTTPStatus.BAD_REQUEST)
+
+        flats = self.map_reader.retrieve_flats(bbox, limit + 1)
+        return self.json_response({"flats": flats[:limit], "truncated": len(flats) > limit})
+
+    def render_clusters(self, path: str) -> Tuple[str, HTTPStatus, dict]:
+        """
+        :param path: Request path with the query string.
+        :return: The JSON response, the status and the response headers.
+        """
+        params = parse_qs(urlsplit(path).query)
+        try:
+            bbox = self.map_reader.parse_bbox(params.get("bbox", [None])[0])
+            zoom = self.int_param(params, "zoom")
+            if not 0 <= zoom <= FlatMapReader.MAX_ZOOM:
+                raise ValueError(f"zoom must be between 0 and {FlatMapReader.MAX_ZOOM}")
+        except ValueError as e:
+            return self.json_response({"error": str(e)}, HTTPStatus.BAD_REQUEST)
+
+        clusters = self.map_reader.retrieve_clusters(bbox, zoom)
+        return self.json_response(
+            {"zoom": zoom, "precision": FlatMapReader.cluster_precision(zoom), "clusters": clusters}
+        )
+
+
+class AutocompleteView:
+    """
+    The AutocompleteView suggests localities and dispositions for the beginning of a word, from the in-memory
+    index of the AutocompleteService (no database query):
+        /autocomplete?q=bube&limit=5 -> {"suggestions": [{"kind": "locality", "value": "Praha 6 - Bubeneč", ...}]}
+    """
+
+    PATH = "/autocomplete"
+
+    def __init__(self, autocomplete_service: AutocompleteService):
+        self.autocomplete_service = autocomplete_service
+
+    def render(self, path: str) -> Tuple[str, HTTPStatus, dict]:
+        """
+        :param path: Request path with the query string.
+        :return: The JSON response, the status and the response headers.
+        """
+        params = parse_qs(urlsplit(path).query)
+        try:
+            limit = FlatsMapView.int_param(params, "limit", AutocompleteIndex.MAX_LIMIT)
+            if not 1 <= limit <= AutocompleteIndex.MAX_LIMIT:
+                raise ValueError(f"limit must be between 1 and {AutocompleteIndex.MAX_LIMIT}")
+        except ValueError as e:
+            return FlatsMapView.json_response({"error": str(e)}, HTTPStatus.BAD_REQUEST)
+
+        suggestions = self.autocomplete_service.search(params.get("q", [""])[0], limit)
+        return FlatsMapView.json_response({"suggestions": [entry._asdict() for entry in suggestions]})
+
+
+class PoolStatsView:
+    """
+    The PoolStatsView reports the state of the connection pool of the session factory as JSON
+    (SQLAlchemySessionFactory.pool_stats): connections checked out, idle and in overflow, checkouts, waits for a
+    connection, timeouts and the checkout latency histogram.
+    """
+
+    PATH = "/stats/pool"
+
+    def __init__(self, session_factory: SQLAlchemySessionFactory):
+        self.session_factory = session_factory
+
+    def render(self) -> Tuple[str, HTTPStatus, dict]:
+        return FlatsMapView.json_response(self.session_factory.pool_stats())
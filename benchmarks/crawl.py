@@ -0,0 +1,177 @@
+"""
+End-to-end benchmark of a crawl: the real SrealitySpider and database pipelines against the local stand-in of the
+sreality API (benchmarks.fake_api), writing into a local Postgres.
+
+For every catalog size the benchmark starts the fake API and runs a full-catalog crawl (max_items=all) in a separate
+process, then reports:
+- items/sec: listings saved to flats per second of crawl (start of the crawl to the last batch committed)
+- peak RSS of the crawl process, which should stay flat as the catalog grows
+- DB write time: time spent by the pipeline writer threads in batch writes (metrics/database/write/total), and
+  its share of the crawl duration
+- the download, decode and validate time per page from CrawlMetricsExtension
+
+A separate database (<POSTGRES_DB>_benchmark) is created, migrated and dropped.
+
+Usage:
+    python -m benchmarks.crawl --items 10000 100000 1000000 --latency 0 --jitter 0 --writer copy
+    python -m benchmarks.crawl --items 10000 --latency 0.05 --error-rate 0.02 --writer copy --details
+"""
+import argparse
+import json
+import logging
+import os
+import resource
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+from typing import List
+
+from sqlalchemy import text
+from sqlalchemy_utils import create_database, database_exists, drop_database
+
+from database.apply_migrations import AlembicMigrationManager
+from database.config import db_config
+from database.factory import SQLAlchemySessionFactory, get_session
+from benchmarks.fake_api import API_PATH
+
+
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def wait_for_port(port: int, timeout: float = 10.0) -> None:
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            socket.create_connection(("127.0.0.1", port), timeout=0.2).close()
+            return
+        except OSError:
+            time.sleep(0.05)
+    raise TimeoutError(f"The fake API did not start listening on port {port}")
+
+
+def run_crawl_worker(writer: str, details: bool, result_file: str) -> None:
+    """
+    Crawl process: run SrealitySpider over the whole catalog with CrawlerProcess and write its stats and peak RSS
+    to result_file. SREALITY_API_URL and POSTGRES_DB are set by the parent process.
+    """
+    from scrapy.crawler import CrawlerProcess
+    from scraper.spiders.sreality_spider import SrealitySpider
+
+    process = CrawlerProcess(
+        {
+            "LOG_LEVEL": "WARNING",
+            "TELNETCONSOLE_ENABLED": False,
+            "REQUEST_FINGERPRINTER_IMPLEMENTATION": "2.7",
+            "DATABASE_WRITER": writer,
+            "RETRY_TIMES": 5,
+        }
+    )
+    crawler = process.create_crawler(SrealitySpider)
+    process.crawl(crawler, details=details, max_items="all")
+    process.start()
+
+    stats = crawler.stats.get_stats()
+    elapsed = (stats["finish_time"] - stats["start_time"]).total_seconds()
+    result = {
+        "elapsed": elapsed,
+        "peak_rss_mb": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024,
+        "stats": {key: value for key, value in stats.items() if isinstance(value, (int, float))},
+    }
+    with open(result_file, "w", encoding="utf-8") as file:
+        json.dump(result, file)
+
+
+def run(database_url: str, sizes: List[int], args: argparse.Namespace) -> None:
+    session_factory = SQLAlchemySessionFactory(database_url)
+
+    print(
+        f"{'items':>9} {'saved':>9} {'seconds':>8} {'items/sec':>10} {'peak RSS':>9} {'DB write s':>11} "
+        f"{'DB %':>5} {'download p90':>13} {'decode mean':>12} {'validate mean':>14}"
+    )
+    for size in sizes:
+        with get_session(session_factory) as session:
+            session.execute(text("TRUNCATE flats, price_history, flat_details"))
+
+        port = free_port()
+        fake_api = subprocess.Popen(
+            [
+                sys.executable,
+                "-m",
+                "benchmarks.fake_api",
+                f"--port={port}",
+                f"--result-size={size}",
+                f"--seed={args.seed}",
+                f"--latency={args.latency}",
+                f"--jitter={args.jitter}",
+                f"--error-rate={args.error_rate}",
+                f"--throttle-rate={args.throttle_rate}",
+            ],
+            stderr=subprocess.DEVNULL,
+        )
+        try:
+            wait_for_port(port)
+            with tempfile.NamedTemporaryFile(suffix=".json") as result_file:
+                env = {
+                    **os.environ,
+                    "SREALITY_API_URL": f"http://127.0.0.1:{port}{API_PATH}",
+                    "POSTGRES_DB": database_url.rsplit("/", 1)[1],
+                }
+                command = [sys.executable, "-m", "benchmarks.crawl", "--worker", result_file.name]
+                command += [f"--writer={args.writer}"] + (["--details"] if args.details else [])
+                subprocess.run(command, env=env, check=True, stdout=subprocess.DEVNULL)
+                with open(result_file.name, encoding="utf-8") as file:
+                    result = json.load(file)
+        finally:
+            fake_api.terminate()
+            fake_api.wait()
+
+        with get_session(session_factory) as session:
+            saved = session.execute(text("SELECT count(*) FROM flats")).scalar()
+        stats, elapsed = result["stats"], result["elapsed"]
+        write_seconds = stats.get("metrics/database/write/total", 0.0)
+        print(
+            f"{size:>9} {saved:>9} {elapsed:>8.1f} {saved / elapsed:>10.0f} {result['peak_rss_mb']:>7.0f}MB "
+            f"{write_seconds:>11.2f} {100 * write_seconds / elapsed:>4.0f}% "
+            f"{stats.get('metrics/download/p90', 0) * 1000:>11.1f}ms "
+            f"{stats.get('metrics/decode/mean', 0) * 1000:>10.2f}ms "
+            f"{stats.get('metrics/validate/mean', 0) * 1000:>12.2f}ms"
+        )
+    session_factory.engine.dispose()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--items", type=int, nargs="+", default=[10000], help="Catalog sizes to crawl")
+    parser.add_argument("--writer", choices=["upsert", "copy"], default="upsert", help="DATABASE_WRITER")
+    parser.add_argument("--details", action="store_true", help="Also crawl the detail of every listing")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--latency", type=float, default=0.02, help="Response delay of the fake API in seconds")
+    parser.add_argument("--jitter", type=float, default=0.01)
+    parser.add_argument("--error-rate", type=float, default=0.0, help="Share of 503 responses")
+    parser.add_argument("--throttle-rate", type=float, default=0.0, help="Share of 429 responses")
+    parser.add_argument("--worker", metavar="RESULT_FILE", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.worker:
+        run_crawl_worker(args.writer, args.details, args.worker)
+        return
+
+    logging.basicConfig(level=logging.WARNING)
+    database_url = f"{db_config.url}_benchmark"
+    if database_exists(database_url):
+        drop_database(database_url)
+    create_database(database_url)
+    try:
+        AlembicMigrationManager(database_url).apply_migrations()
+        run(database_url, args.items, args)
+    finally:
+        drop_database(database_url)
+
+
+if __name__ == "__main__":
+    main()
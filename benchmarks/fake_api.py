@@ -0,0 +1,137 @@
+"""
+Local stand-in of the sreality API, so the real SrealitySpider can be run and measured offline.
+
+Serves the list endpoint (/api/cs/v2/estates?page=&per_page=) and the detail endpoint (/api/cs/v2/estates/<id>)
+of a generated catalog of --result-size listings (benchmarks.sreality_pages): the same seed always produces the
+same catalog. Every response can be delayed (--latency, --jitter), and a share of the requests can fail with
+503 Service Unavailable (--error-rate) or be throttled with 429 Too Many Requests and a Retry-After header
+(--throttle-rate). The error injection is seeded as well.
+
+Usage:
+    python -m benchmarks.fake_api --port 8765 --result-size 100000 --latency 0.05 --error-rate 0.01
+    SREALITY_API_URL=http://127.0.0.1:8765/api/cs/v2/estates scrapy runspider scraper/spiders/sreality_spider.py
+"""
+import argparse
+import json
+import logging
+import random
+from urllib.parse import parse_qs, urlparse
+
+from twisted.internet import reactor
+from twisted.web.resource import Resource
+from twisted.web.server import NOT_DONE_YET, Site
+
+from benchmarks.sreality_pages import generate_detail, generate_page, listing_index
+
+API_PATH = "/api/cs/v2/estates"
+
+logger = logging.getLogger(__name__)
+
+
+class FakeSrealityApi(Resource):
+    """
+    twisted.web resource answering like the sreality API, without blocking the reactor while it waits.
+    """
+
+    isLeaf = True
+
+    def __init__(
+        self,
+        result_size: int = 10000,
+        seed: int = 0,
+        latency: float = 0.0,
+        jitter: float = 0.0,
+        error_rate: float = 0.0,
+        throttle_rate: float = 0.0,
+        retry_after: int = 1,
+    ):
+        super().__init__()
+        self.result_size = result_size
+        self.seed = seed
+        self.latency = latency
+        self.jitter = jitter
+        self.error_rate = error_rate
+        self.throttle_rate = throttle_rate
+        self.retry_after = retry_after
+        self.rng = random.Random(seed)
+        self.requests_served = 0
+
+    def render_GET(self, request):
+        self.requests_served += 1
+        status, headers, body = self.respond(request.uri.decode("utf-8"))
+        disconnected = []
+        request.notifyFinish().addErrback(disconnected.append)
+
+        def finish():
+            if disconnected:
+                return
+            request.setResponseCode(status)
+            for name, value in headers.items():
+                request.setHeader(name, value)
+            request.write(body)
+            request.finish()
+
+        delay = max(0.0, self.latency + self.rng.uniform(-self.jitter, self.jitter))
+        if delay:
+            reactor.callLater(delay, finish)
+        else:
+            finish()
+        return NOT_DONE_YET
+
+    def respond(self, uri: str):
+        """
+        :return: (status, headers, body) of the response to the request URI.
+        """
+        chance = self.rng.random()
+        if chance < self.throttle_rate:
+            return 429, {"Retry-After": str(self.retry_after)}, b""
+        if chance < self.throttle_rate + self.error_rate:
+            return 503, {}, b""
+
+        parsed_uri = urlparse(uri)
+        if parsed_uri.path == API_PATH:
+            query_params = parse_qs(parsed_uri.query)
+            page = int(query_params.get("page", ["1"])[0])
+            per_page = int(query_params.get("per_page", ["60"])[0])
+            payload = generate_page(page, per_page=per_page, result_size=self.result_size, seed=self.seed)
+        elif parsed_uri.path.startswith(f"{API_PATH}/") and parsed_uri.path.rsplit("/", 1)[1].isdigit():
+            hash_id = int(parsed_uri.path.rsplit("/", 1)[1])
+            if not 0 <= listing_index(hash_id, self.seed) < self.result_size:
+                return 404, {}, b'{"logged_in": false, "error": "Not Found"}'
+            payload = generate_detail(hash_id, seed=self.seed)
+        else:
+            return 404, {}, b""
+        body = json.dumps(payload, ensure_ascii=False).encode("utf-8")
+        return 200, {"Content-Type": "application/json; charset=utf-8"}, body
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--result-size", type=int, default=10000, help="Number of listings in the catalog")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--latency", type=float, default=0.0, help="Response delay in seconds")
+    parser.add_argument("--jitter", type=float, default=0.0, help="Random +- variation of the delay in seconds")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="Share of requests failing with 503")
+    parser.add_argument("--throttle-rate", type=float, default=0.0, help="Share of requests throttled with 429")
+    parser.add_argument("--retry-after", type=int, default=1, help="Retry-After of throttled responses (seconds)")
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO)
+
+    api = FakeSrealityApi(
+        result_size=args.result_size,
+        seed=args.seed,
+        latency=args.latency,
+        jitter=args.jitter,
+        error_rate=args.error_rate,
+        throttle_rate=args.throttle_rate,
+        retry_after=args.retry_after,
+    )
+    reactor.listenTCP(args.port, Site(api), interface=args.host)
+    logger.info("Serving %s listings on http://%s:%s%s", args.result_size, args.host, args.port, API_PATH)
+    reactor.run()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,104 @@
+"""
+Benchmark of the flat writers (database.services.flat): rows/sec of FlatDataWriter (INSERT ... ON CONFLICT) against
+FlatCopyWriter (COPY FROM STDIN, through the staging table and straight into flats).
+
+Every writer is run twice on the same rows: the first run inserts into an empty table, the second run re-writes
+the same listings with changed titles, one in ten of them with a changed price (the update and price history
+path). The rows are fed in chunks of --chunk-size, the way the pipeline hands them over. A separate database
+(<POSTGRES_DB>_benchmark) is created, migrated and dropped.
+
+Usage:
+    python -m benchmarks.flat_writer --rows 10000 1000000
+"""
+import argparse
+import logging
+import time
+from typing import Callable, List
+
+from sqlalchemy import text
+from sqlalchemy_utils import create_database, database_exists, drop_database
+
+from database.apply_migrations import AlembicMigrationManager
+from database.config import db_config
+from database.factory import SQLAlchemySessionFactory, get_session
+from database.services.base import BaseDatabaseWriter
+from database.services.flat import FlatCopyWriter, FlatDataWriter
+from scraper.services.parser import ApiResponseParser
+from scraper.services.schema import FlatItemModel
+
+WRITERS = {
+    "upsert": lambda session_factory: FlatDataWriter(session_factory, bulk_insert_size=1000),
+    "copy-staging": lambda session_factory: FlatCopyWriter(session_factory, use_staging=True),
+    "copy-direct": lambda session_factory: FlatCopyWriter(session_factory, use_staging=False),
+}
+
+
+def generate_items(count: int, revision: int = 0) -> List[FlatItemModel]:
+    return [
+        FlatItemModel(
+            id=ApiResponseParser.build_flat_id(hash_id),
+            hash_id=hash_id,
+            title=f"Prodej bytu 2+kk {50 + hash_id % 60} m² (revision {revision})",
+            image_url=f"https://d18-a.sdn.cz/d_18/c_img_QM_Kc/{hash_id:x}.jpeg",
+            price=3_000_000 + hash_id % 100 * 10_000 - (revision * 50_000 if hash_id % 10 == 0 else 0),
+        )
+        for hash_id in range(1, count + 1)
+    ]
+
+
+def measure(writer: BaseDatabaseWriter, items: List[FlatItemModel], chunk_size: int) -> float:
+    """
+    :return: Rows per second.
+    """
+    started_at = time.perf_counter()
+    for i in range(0, len(items), chunk_size):
+        writer.insert_items(items[i : i + chunk_size])
+    return len(items) / (time.perf_counter() - started_at)
+
+
+def truncate_flats(session_factory: SQLAlchemySessionFactory) -> None:
+    with get_session(session_factory) as session:
+        session.execute(text("TRUNCATE flats, price_history"))
+
+
+def run(database_url: str, rows: List[int], chunk_size: int, writers: List[str]) -> None:
+    session_factory = SQLAlchemySessionFactory(database_url)
+
+    print(f"{'rows':>9} {'writer':>13} {'insert rows/s':>14} {'update rows/s':>14}")
+    for count in rows:
+        first_run, second_run = generate_items(count), generate_items(count, revision=1)
+        for name in writers:
+            truncate_flats(session_factory)
+            writer: Callable = WRITERS[name]
+            insert_rate = measure(writer(session_factory), first_run, chunk_size)
+            # COPY straight into flats cannot update existing rows, its second run is skipped
+            if name == "copy-direct":
+                update_rate = "-"
+            else:
+                update_rate = f"{measure(writer(session_factory), second_run, chunk_size):.0f}"
+            print(f"{count:>9} {name:>13} {insert_rate:>14.0f} {update_rate:>14}")
+    truncate_flats(session_factory)
+    session_factory.engine.dispose()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rows", type=int, nargs="+", default=[10000, 1000000])
+    parser.add_argument("--chunk-size", type=int, default=10000, help="Rows handed to the writer per call")
+    parser.add_argument("--writers", nargs="+", choices=list(WRITERS), default=list(WRITERS))
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.WARNING)
+
+    database_url = f"{db_config.url}_benchmark"
+    if database_exists(database_url):
+        drop_database(database_url)
+    create_database(database_url)
+    try:
+        AlembicMigrationManager(database_url).apply_migrations()
+        run(database_url, args.rows, args.chunk_size, args.writers)
+    finally:
+        drop_database(database_url)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,77 @@
+"""
+Benchmark of the RedisCrawlFrontier: items/sec as the number of spider workers grows.
+
+Every worker process pulls page URLs from the shared frontier, simulates the download round trip with a sleep
+(--latency) and claims the page's items from the shared max_items budget, the same way SrealitySpider does in
+distributed mode. Needs a reachable redis-server.
+
+Usage:
+    python -m benchmarks.frontier --redis-url redis://localhost:6379/15 --pages 200 --workers 1 2 4 8
+"""
+import argparse
+import multiprocessing
+import time
+import uuid
+
+from scraper.services.configuration import ApiUrlConfigService
+from scraper.services.frontier import RedisCrawlFrontier
+
+ITEMS_PER_PAGE = 60
+
+
+def run_worker(redis_url: str, key_prefix: str, latency: float, max_items: int) -> None:
+    frontier = RedisCrawlFrontier.from_url(redis_url, key_prefix=key_prefix, max_items=max_items)
+    while not frontier.is_finished():
+        urls = frontier.pop(1)
+        if not urls:
+            continue
+        time.sleep(latency)
+        frontier.claim_items(ITEMS_PER_PAGE)
+
+
+def run_crawl(redis_url: str, workers: int, pages: int, latency: float) -> float:
+    """
+    Run one simulated crawl with the given number of workers.
+    :return: Items per second.
+    """
+    max_items = pages * ITEMS_PER_PAGE
+    key_prefix = f"benchmark:{uuid.uuid4()}"
+    frontier = RedisCrawlFrontier.from_url(redis_url, key_prefix=key_prefix, max_items=max_items)
+    start_url = ApiUrlConfigService.get_start_url()
+    frontier.push(ApiUrlConfigService.build_page_url(start_url, page) for page in range(1, pages + 1))
+    frontier.mark_seeded()
+
+    processes = [
+        multiprocessing.Process(target=run_worker, args=(redis_url, key_prefix, latency, max_items))
+        for _ in range(workers)
+    ]
+    started_at = time.perf_counter()
+    for process in processes:
+        process.start()
+    for process in processes:
+        process.join()
+    elapsed = time.perf_counter() - started_at
+
+    items = frontier.items_claimed()
+    frontier.reset()
+    return items / elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--redis-url", default="redis://localhost:6379/15")
+    parser.add_argument("--pages", type=int, default=200)
+    parser.add_argument("--latency", type=float, default=0.05, help="Simulated page round trip in seconds")
+    parser.add_argument("--workers", type=int, nargs="+", default=[1, 2, 4, 8])
+    args = parser.parse_args()
+
+    print(f"{'workers':>8} {'items/sec':>12} {'speedup':>8}")
+    baseline = None
+    for workers in args.workers:
+        items_per_second = run_crawl(args.redis_url, workers, args.pages, args.latency)
+        baseline = baseline or items_per_second
+        print(f"{workers:>8} {items_per_second:>12.0f} {items_per_second / baseline:>7.1f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,60 @@
+"""
+Benchmark of the API page decoders (scraper.services.decoder) on 60-item pages.
+
+By default the pages are generated by benchmarks.sreality_pages; pass pages recorded from the live API with
+--pages (see `python -m benchmarks.sreality_pages --help`). For every installed decoder the benchmark reports
+the time to decode a page and the time to extract PageItems from it (JsonDataExtractor).
+
+Usage:
+    python -m benchmarks.json_decoding
+    python -m benchmarks.json_decoding --pages benchmarks/data/*.json --repeat 200
+"""
+import argparse
+import time
+from typing import Callable, List
+
+from benchmarks.sreality_pages import generate_pages, load_pages
+from scraper.services.decoder import DECODERS
+from scraper.services.extractor import JsonDataExtractor
+
+
+def measure(function: Callable[[bytes], object], pages: List[bytes], repeat: int) -> float:
+    """
+    :return: Mean time per page in microseconds.
+    """
+    started_at = time.perf_counter()
+    for _ in range(repeat):
+        for page in pages:
+            function(page)
+    return (time.perf_counter() - started_at) / (repeat * len(pages)) * 1e6
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--pages", nargs="*", help="Recorded API pages (JSON files)")
+    parser.add_argument("--generated-pages", type=int, default=10, help="Number of generated pages")
+    parser.add_argument("--repeat", type=int, default=100)
+    args = parser.parse_args()
+
+    pages = load_pages(args.pages) if args.pages else generate_pages(args.generated_pages)
+    average_size = sum(len(page) for page in pages) / len(pages)
+    print(f"{len(pages)} pages, {average_size / 1024:.0f} KiB per page on average")
+    print(f"{'decoder':>8} {'decode µs/page':>15} {'extract µs/page':>16} {'speedup':>8}")
+
+    baseline = None
+    for name, decoder_cls in reversed(DECODERS.items()):
+        try:
+            decoder = decoder_cls()
+            decoder.decode(pages[0])
+        except ImportError:
+            print(f"{name:>8} {'not installed':>15}")
+            continue
+        extractor = JsonDataExtractor(decoder=decoder)
+        decode_time = measure(decoder.decode, pages, args.repeat)
+        extract_time = measure(extractor.extract_items_from_response, pages, args.repeat)
+        baseline = baseline or extract_time
+        print(f"{name:>8} {decode_time:>15.0f} {extract_time:>16.0f} {baseline / extract_time:>7.1f}x")
+
+
+if __name__ == "__main__":
+    main()
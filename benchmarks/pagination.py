@@ -0,0 +1,114 @@
+"""
+Benchmark of the pagination of a listing of flats: LIMIT / OFFSET pages (QueryPaginationService.paginate_query)
+against keyset pages (QueryPaginationService.paginate_query_by_keyset), on a catalog of generated listings.
+
+For every ordering of the listing (FlatFilter sort) and every page number it reports the median time of the
+query of the page over --repeat runs. The keyset page is requested with the cursor of the previous page, the way
+the "Next Page" links of /flats do. The count of the listing does not depend on the page and is left out.
+A separate database (<POSTGRES_DB>_benchmark) is created, migrated and dropped.
+
+Usage:
+    python -m benchmarks.pagination --rows 1000000 --pages 1 200 2000
+"""
+import argparse
+import logging
+import statistics
+import time
+from typing import Callable, List
+
+from sqlalchemy import text
+from sqlalchemy_utils import create_database, database_exists, drop_database
+
+from benchmarks.search import load_flats
+from database.apply_migrations import AlembicMigrationManager
+from database.config import db_config
+from database.factory import SQLAlchemySessionFactory, get_session
+from database.services.flat_filter import FlatFilter
+from database.services.pagination import QueryPaginationService
+from database.sql_schema import Flat
+
+SORTS = [None, "price", "-price"]
+
+
+def median_seconds(session_factory: SQLAlchemySessionFactory, fetch_page: Callable, repeat: int) -> float:
+    timings = []
+    for _ in range(repeat):
+        with get_session(session_factory) as session:
+            started_at = time.perf_counter()
+            items = fetch_page(session)
+            timings.append(time.perf_counter() - started_at)
+            assert items
+    return statistics.median(timings)
+
+
+def keyset_cursor(session_factory: SQLAlchemySessionFactory, flat_filter: FlatFilter, page: int, page_size: int):
+    """
+    :return: Cursor of the page, as the "Next Page" link of the previous page carries it (None for page 1).
+    """
+    if page == 1:
+        return None
+    sort_columns, _ = flat_filter.sort_key()
+    with get_session(session_factory) as session:
+        last_row = flat_filter.apply(session.query(*sort_columns)).offset((page - 1) * page_size - 1).first()
+    return QueryPaginationService.encode_cursor(tuple(last_row), page)
+
+
+def run(database_url: str, rows: List[int], args: argparse.Namespace) -> None:
+    session_factory = SQLAlchemySessionFactory(database_url)
+    pagination = QueryPaginationService(session_factory, args.page_size)
+
+    print(f"{'rows':>9} {'sort':>6} {'page':>6} {'OFFSET ms':>10} {'keyset ms':>10}")
+    for count in rows:
+        with get_session(session_factory) as session:
+            session.execute(text("TRUNCATE flats, price_history"))
+        load_flats(session_factory, count, args.seed)
+        for sort in SORTS:
+            flat_filter = FlatFilter(sort=sort)
+            sort_columns, descending = flat_filter.sort_key()
+            for page in args.pages:
+                offset_seconds = median_seconds(
+                    session_factory,
+                    lambda session: flat_filter.apply(session.query(Flat))
+                    .offset((page - 1) * args.page_size)
+                    .limit(args.page_size)
+                    .all(),
+                    args.repeat,
+                )
+                cursor = keyset_cursor(session_factory, flat_filter, page, args.page_size)
+                keyset_seconds = median_seconds(
+                    session_factory,
+                    lambda session: pagination.paginate_query_by_keyset(
+                        flat_filter.apply(session.query(Flat)), sort_columns, descending, cursor
+                    ).items,
+                    args.repeat,
+                )
+                print(
+                    f"{count:>9} {sort or 'id':>6} {page:>6} {offset_seconds * 1000:>10.1f} "
+                    f"{keyset_seconds * 1000:>10.1f}"
+                )
+    session_factory.engine.dispose()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rows", type=int, nargs="+", default=[1000000])
+    parser.add_argument("--pages", type=int, nargs="+", default=[1, 200, 2000])
+    parser.add_argument("--page-size", type=int, default=100)
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.WARNING)
+
+    database_url = f"{db_config.url}_benchmark"
+    if database_exists(database_url):
+        drop_database(database_url)
+    create_database(database_url)
+    try:
+        AlembicMigrationManager(database_url).apply_migrations()
+        run(database_url, args.rows, args)
+    finally:
+        drop_database(database_url)
+
+
+if __name__ == "__main__":
+    main()
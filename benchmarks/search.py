@@ -0,0 +1,129 @@
+"""
+Benchmark of the full-text search of the flats (database.services.flat_search.FlatSearch) against an ILIKE scan of
+the titles, on a catalog of generated listings ("Prodej bytu 2+kk 54 m², Praha 6 - Bubeneč, 6490000 CZK").
+
+For every query it reports the median time of the first page of results (--page-size rows, with the number of
+matches counted up to FlatsSearchView.MAX_COUNT, the way /search renders it) over --repeat runs, for the search
+and for the ILIKE scan of the same words.
+A separate database (<POSTGRES_DB>_benchmark) is created, migrated and dropped.
+
+Usage:
+    python -m benchmarks.search --rows 1000000
+"""
+import argparse
+import csv
+import io
+import logging
+import random
+import statistics
+import time
+import uuid
+from typing import Callable, List
+
+from sqlalchemy import and_, text
+from sqlalchemy.orm import Query
+from sqlalchemy_utils import create_database, database_exists, drop_database
+
+from app.views import FlatsSearchView
+from benchmarks.sreality_pages import DISPOSITIONS, LOCALITIES
+from database.apply_migrations import AlembicMigrationManager
+from database.config import db_config
+from database.factory import SQLAlchemySessionFactory, get_session
+from database.services.flat_search import FlatSearch
+from database.services.pagination import QueryPaginationService
+from database.services.row_count import CappedCountProvider
+from database.sql_schema import Flat
+
+# (search text, ILIKE patterns of the same words)
+QUERIES = [
+    ("praha", ["%praha%"]),
+    ("bubenec", ["%bubeneč%"]),
+    ("3+kk zabovresky", ["%3+kk%", "%žabovřesky%"]),
+    ("6490000", ["%6490000%"]),
+]
+
+
+def load_flats(session_factory: SQLAlchemySessionFactory, count: int, seed: int, chunk_size: int = 100000) -> None:
+    rng = random.Random(seed)
+    with get_session(session_factory) as session:
+        cursor = session.connection().connection.cursor()
+        for start in range(0, count, chunk_size):
+            buffer = io.StringIO()
+            writer = csv.writer(buffer)
+            for hash_id in range(start + 1, min(start + chunk_size, count) + 1):
+                locality = rng.choice(LOCALITIES)[0]
+                price = rng.randint(15, 300) * 50000
+                title = f"Prodej bytu {rng.choice(DISPOSITIONS)} {rng.randint(18, 160)} m², {locality}, {price} CZK"
+                writer.writerow((uuid.uuid4(), hash_id, title, price, locality))
+            buffer.seek(0)
+            cursor.copy_expert("COPY flats (id, hash_id, title, price, locality) FROM STDIN WITH (FORMAT csv)", buffer)
+        cursor.close()
+        session.execute(text("ANALYZE flats"))
+
+
+def measure(session_factory: SQLAlchemySessionFactory, build: Callable[[Query], Query], page_size: int, repeat: int):
+    """
+    :return: Median seconds of a first page of results with the number of matches, and the number of matches.
+    """
+    pagination = QueryPaginationService(session_factory, page_size)
+    timings, counted = [], ""
+    for _ in range(repeat):
+        with get_session(session_factory) as session:
+            started_at = time.perf_counter()
+            _, item_count = pagination.paginate_query(
+                build(session.query(Flat.id, Flat.title)), 1, CappedCountProvider(FlatsSearchView.MAX_COUNT)
+            )
+            timings.append(time.perf_counter() - started_at)
+            counted = f"{item_count.value}" if item_count.is_exact else f"{item_count.value}+"
+    return statistics.median(timings), counted
+
+
+def run(database_url: str, rows: List[int], args: argparse.Namespace) -> None:
+    session_factory = SQLAlchemySessionFactory(database_url)
+
+    print(f"{'rows':>9} {'query':>17} {'matches':>9} {'search ms':>10} {'ILIKE ms':>9}")
+    for count in rows:
+        with get_session(session_factory) as session:
+            session.execute(text("TRUNCATE flats, price_history"))
+        load_flats(session_factory, count, args.seed)
+        for search_text, patterns in QUERIES:
+            search_seconds, matches = measure(
+                session_factory, FlatSearch(search_text).apply, args.page_size, args.repeat
+            )
+            ilike_seconds, _ = measure(
+                session_factory,
+                lambda query: query.filter(and_(*(Flat.title.ilike(pattern) for pattern in patterns))).order_by(
+                    Flat.id
+                ),
+                args.page_size,
+                args.repeat,
+            )
+            print(
+                f"{count:>9} {search_text:>17} {matches:>9} {search_seconds * 1000:>10.1f} "
+                f"{ilike_seconds * 1000:>9.1f}"
+            )
+    session_factory.engine.dispose()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rows", type=int, nargs="+", default=[1000000])
+    parser.add_argument("--page-size", type=int, default=100)
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.WARNING)
+
+    database_url = f"{db_config.url}_benchmark"
+    if database_exists(database_url):
+        drop_database(database_url)
+    create_database(database_url)
+    try:
+        AlembicMigrationManager(database_url).apply_migrations()
+        run(database_url, args.rows, args)
+    finally:
+        drop_database(database_url)
+
+
+if __name__ == "__main__":
+    main()
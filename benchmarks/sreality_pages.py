@@ -0,0 +1,184 @@
+"""
+Generator of realistic, seedable sreality API list pages (/api/cs/v2/estates).
+
+The generated estates have the same shape as the live API: besides the fields the scraper uses (hash_id, name,
+locality, price_czk, _links.images) they carry gps, labels, seo, the other _links and _embedded blocks, so
+decoding benchmarks see a realistic amount of data. A catalog is identified by (seed, result_size); the same
+page of the same catalog is always generated identically.
+
+Pages recorded from the live API can be saved with:
+    python -m benchmarks.sreality_pages --record benchmarks/data --pages 5
+"""
+import argparse
+import json
+import os
+import random
+import urllib.request
+from typing import List
+
+from scraper.services.configuration import ApiUrlConfigService
+
+DISPOSITIONS = ["1+kk", "1+1", "2+kk", "2+1", "3+kk", "3+1", "4+kk", "4+1", "5+kk"]
+LOCALITIES = [
+    ("Praha 1 - Staré Město", 50.087, 14.421),
+    ("Praha 6 - Bubeneč", 50.100, 14.403),
+    ("Praha 10 - Vršovice", 50.069, 14.450),
+    ("Brno - Žabovřesky", 49.212, 16.578),
+    ("Ostrava - Poruba", 49.830, 18.170),
+    ("Plzeň - Bory", 49.731, 13.373),
+    ("Olomouc - Nová Ulice", 49.590, 17.245),
+    ("České Budějovice - Suché Vrbné", 48.965, 14.490),
+    ("Liberec - Ruprechtice", 50.785, 15.060),
+    ("Hradec Králové - Nový Hradec Králové", 50.189, 15.857),
+]
+LABELS = ["Sklep", "Balkon", "Výtah", "Parkování", "Terasa", "Novostavba", "Po rekonstrukci", "Lodžie"]
+IMAGE_HOST = "https://d18-a.sdn.cz/d_18/c_img_QM_Kc"
+
+
+def generate_estate(rng: random.Random, hash_id: int) -> dict:
+    disposition = rng.choice(DISPOSITIONS)
+    area = rng.randint(18, 160)
+    locality, lat, lon = rng.choice(LOCALITIES)
+    price = rng.randint(15, 300) * 50000
+    images = [
+        {"href": f"{IMAGE_HOST}/{hash_id:x}{index}.jpeg?fl=res,400,300,3|shr,,20|jpg,90"}
+        for index in range(rng.randint(3, 15))
+    ]
+    dynamic_images = [{"href": image["href"].replace("res,400,300", "res,{width},{height}")} for image in images]
+    labels = rng.sample(LABELS, rng.randint(0, 4))
+    return {
+        "labelsReleased": [labels, []],
+        "has_panorama": rng.randint(0, 1),
+        "labels": labels,
+        "is_auction": False,
+        "labelsAll": [labels, ["metro", "tram", "shop", "school"]],
+        "seo": {
+            "category_main_cb": 1,
+            "category_sub_cb": 2 + DISPOSITIONS.index(disposition),
+            "category_type_cb": 1,
+            "locality": locality.lower().replace(" ", "-"),
+        },
+        "exclusively_at_rk": rng.randint(0, 1),
+        "category": 1,
+        "has_floor_plan": rng.randint(0, 1),
+        "_embedded": {
+            "favourite": {"is_favourite": False, "_links": {"self": {"profile": "/doc/favourite", "href": "/"}}},
+            "note": {"note": "", "_links": {"self": {"profile": "/doc/note", "href": "/"}}, "has_note": False},
+        },
+        "paid_logo": 0,
+        "locality": locality,
+        "has_video": rng.random() < 0.2,
+        "advert_images_count": len(images),
+        "new": rng.random() < 0.1,
+        "auctionPrice": 0,
+        "type": 1,
+        "hash_id": hash_id,
+        "attractive_offer": 0,
+        "price": price,
+        "price_czk": {"value_raw": price, "unit": "", "name": "Celková cena"},
+        "_links": {
+            "dynamicDown": dynamic_images,
+            "dynamicUp": dynamic_images,
+            "iterator": {"href": f"/cs/v2/estates/{hash_id}?iterator=1"},
+            "self": {"href": f"/cs/v2/estates/{hash_id}"},
+            "images": images,
+            "image_middle2": images[:1],
+        },
+        "rus": False,
+        "name": f"Prodej bytu {disposition} {area} m²",
+        "region_tip": 0,
+        "gps": {"lat": lat + rng.uniform(-0.03, 0.03), "lon": lon + rng.uniform(-0.05, 0.05)},
+        "has_matterport_url": False,
+    }
+
+
+def generate_page(page: int, per_page: int = 60, result_size: int = 10000, seed: int = 0) -> dict:
+    """
+    Generate one API page of a catalog of result_size listings, newest listing first.
+    """
+    first_index = (page - 1) * per_page
+    estates = []
+    for index in range(first_index, min(first_index + per_page, result_size)):
+        rng = random.Random(f"{seed}:{index}")
+        estates.append(generate_estate(rng, hash_id=listing_hash_id(index, seed)))
+    return {
+        "meta_description": "Byty na prodej",
+        "result_size": result_size,
+        "_embedded": {"estates": estates, "is_saved": {"is_saved": False}, "not_precise_location_count": {}},
+        "filterLabels": {},
+        "title": "Byty na prodej",
+        "filter": {"category_main_cb": "1", "category_type_cb": "1"},
+        "_links": {"self": {"href": f"/cs/v2/estates?page={page}&per_page={per_page}"}},
+        "locality": "Česká republika",
+        "page": page,
+        "per_page": per_page,
+    }
+
+
+def listing_hash_id(index: int, seed: int = 0) -> int:
+    """
+    hash_id of the listing at position index of a catalog, hash_ids decrease with the index so that page 1 holds
+    the newest listings.
+    """
+    return 4_000_000_000 - seed * 10_000_000 - index
+
+
+def listing_index(hash_id: int, seed: int = 0) -> int:
+    return 4_000_000_000 - seed * 10_000_000 - hash_id
+
+
+def generate_detail(hash_id: int, seed: int = 0) -> dict:
+    """
+    Generate the detail (/api/cs/v2/estates/<hash_id>) of a listing, consistent with its list page entry.
+    """
+    rng = random.Random(f"{seed}:{listing_index(hash_id, seed)}")
+    estate = generate_estate(rng, hash_id=hash_id)
+    return {
+        "name": {"name": "Name", "value": estate["name"]},
+        "locality": {"name": "Locality", "value": estate["locality"]},
+        "price_czk": estate["price_czk"],
+        "text": {"name": "Popis", "value": " ".join(rng.choice(LABELS) for _ in range(rng.randint(40, 120)))},
+        "items": [{"name": label, "value": True, "type": "boolean"} for label in estate["labels"]],
+        "map": {"lat": estate["gps"]["lat"], "lon": estate["gps"]["lon"], "zoom": 15, "type": "zoom"},
+        "seo": estate["seo"],
+        "_links": {"self": estate["_links"]["self"]},
+        "_embedded": {"images": [{"_links": {"view": image}} for image in estate["_links"]["images"]]},
+    }
+
+
+def generate_pages(count: int, per_page: int = 60, seed: int = 0) -> List[bytes]:
+    return [json.dumps(generate_page(page, per_page, seed=seed)).encode("utf-8") for page in range(1, count + 1)]
+
+
+def load_pages(paths: List[str]) -> List[bytes]:
+    pages = []
+    for path in paths:
+        with open(path, "rb") as file:
+            pages.append(file.read())
+    return pages
+
+
+def record_pages(directory: str, count: int) -> None:
+    """
+    Download `count` pages from the live API and save them as <directory>/page_<n>.json.
+    """
+    os.makedirs(directory, exist_ok=True)
+    for page in range(1, count + 1):
+        url = ApiUrlConfigService.get_start_url({"page": page})
+        with urllib.request.urlopen(url, timeout=30) as response:
+            body = response.read()
+        with open(os.path.join(directory, f"page_{page}.json"), "wb") as file:
+            file.write(body)
+        print(f"Recorded {url}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--record", metavar="DIRECTORY", required=True, help="Where to save the recorded pages")
+    parser.add_argument("--pages", type=int, default=5)
+    args = parser.parse_args()
+    record_pages(args.record, args.pages)
+
+
+if __name__ == "__main__":
+    main()
@@ -47,6 +47,74 @@ class DatabaseConfig:
         return self.url
 
 
+class PoolConfig:
+    """
+    Connection pool configuration of the SQLAlchemy engines (database.factory.SQLAlchemySessionFactory):
+    - pool_size: Connections kept open in the pool: 5 by default (POSTGRES_POOL_SIZE).
+    - max_overflow: Connections opened on top of pool_size under load and closed when returned: 10 by default
+      (POSTGRES_POOL_MAX_OVERFLOW), -1 for no limit.
+    - pool_timeout: Seconds to wait for a connection when pool_size + max_overflow are checked out, before
+      failing: 30 by default (POSTGRES_POOL_TIMEOUT).
+    - pool_pre_ping: Test a connection with a round trip before handing it out, so connections closed by the
+      server are replaced instead of failing the query: true by default (POSTGRES_POOL_PRE_PING).
+    - pool_recycle: Seconds after which a connection is closed and replaced on checkout, -1 never: 1800 by
+      default (POSTGRES_POOL_RECYCLE).
+    - echo: Log every SQL statement: false by default (POSTGRES_ECHO).
+    """
+
+    TRUE_VALUES = ("1", "true", "yes")
+
+    def __init__(
+        self,
+        pool_size: int = 5,
+        max_overflow: int = 10,
+        pool_timeout: float = 30.0,
+        pool_pre_ping: bool = True,
+        pool_recycle: int = 1800,
+        echo: bool = False,
+    ):
+        self.pool_size = pool_size
+        self.max_overflow = max_overflow
+        self.pool_timeout = pool_timeout
+        self.pool_pre_ping = pool_pre_ping
+        self.pool_recycle = pool_recycle
+        self.echo = echo
+        self.validate_config()
+
+    def validate_config(self):
+        if self.pool_size < 1:
+            raise ValueError("Pool size must be a positive integer")
+        if self.max_overflow < -1 or self.pool_timeout <= 0:
+            raise ValueError("Pool overflow must be -1 (no limit) or more and the pool timeout must be positive")
+
+    @classmethod
+    def from_env(cls) -> "PoolConfig":
+        try:
+            return cls(
+                pool_size=int(os.environ.get("POSTGRES_POOL_SIZE", "5")),
+                max_overflow=int(os.environ.get("POSTGRES_POOL_MAX_OVERFLOW", "10")),
+                pool_timeout=float(os.environ.get("POSTGRES_POOL_TIMEOUT", "30")),
+                pool_pre_ping=os.environ.get("POSTGRES_POOL_PRE_PING", "true").lower() in cls.TRUE_VALUES,
+                pool_recycle=int(os.environ.get("POSTGRES_POOL_RECYCLE", "1800")),
+                echo=os.environ.get("POSTGRES_ECHO", "false").lower() in cls.TRUE_VALUES,
+            )
+        except Exception as e:
+            raise RuntimeError(f"Failed to initialize connection pool configuration: {e}")
+
+    def to_engine_arguments(self) -> dict:
+        """
+        :return: The keyword arguments of sqlalchemy.create_engine.
+        """
+        return {
+            "pool_size": self.pool_size,
+            "max_overflow": self.max_overflow,
+            "pool_timeout": self.pool_timeout,
+            "pool_pre_ping": self.pool_pre_ping,
+            "pool_recycle": self.pool_recycle,
+            "echo": self.echo,
+        }
+
+
 try:
     db_config = DatabaseConfig.from_env()
 except Exception as err:
@@ -1,20 +1,117 @@
+import bisect
 import logging
+import threading
+import time
 from contextlib import contextmanager
+from typing import List, Optional, Tuple
+
 from sqlalchemy import create_engine
+from sqlalchemy.exc import TimeoutError as PoolTimeoutError
 from sqlalchemy.orm import Session, sessionmaker
+from sqlalchemy.pool import PoolProxiedConnection, QueuePool
 
+from database.config import PoolConfig
 
 logger = logging.getLogger(__name__)
 
+# Upper bounds (seconds) of the checkout latency buckets, from an idle pooled connection to a wait for a full pool
+CHECKOUT_BUCKETS = (0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.1, 0.5, 1.0, 5.0, 30.0, float("inf"))
+
+
+class PoolStatistics:
+    """
+    Thread-safe checkout statistics of a connection pool:
+    - checkouts: connections handed out, and the latency of every checkout (a connection from the pool, a new
+      connection, or a wait for a returned one, including the pre-ping) counted in the CHECKOUT_BUCKETS
+    - waits / wait_seconds: checkouts that found the pool exhausted (pool_size + max_overflow checked out) and
+      the time they waited for a connection to be returned
+    - timeouts: checkouts that gave up after pool_timeout
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.bucket_counts = [0] * len(CHECKOUT_BUCKETS)
+        self.checkouts = 0
+        self.checkout_seconds = 0.0
+        self.waits = 0
+        self.wait_seconds = 0.0
+        self.timeouts = 0
+
+    def checked_out(self, seconds: float, waited: bool) -> None:
+        with self.lock:
+            self.bucket_counts[bisect.bisect_left(CHECKOUT_BUCKETS, seconds)] += 1
+            self.checkouts += 1
+            self.checkout_seconds += seconds
+            if waited:
+                self.waits += 1
+                self.wait_seconds += seconds
+
+    def timed_out(self, seconds: float) -> None:
+        with self.lock:
+            self.timeouts += 1
+            self.waits += 1
+            self.wait_seconds += seconds
+
+    def quantile(self, q: float) -> float:
+        """
+        :return: Upper bound (seconds) of the bucket holding the q quantile of the checkout latency, 0.0 without
+            checkouts. Checkouts slower than the last finite bound are reported as that bound.
+        """
+        rank, seen = q * self.checkouts, 0
+        for bound, bucket_count in zip(CHECKOUT_BUCKETS, self.bucket_counts):
+            seen += bucket_count
+            if bucket_count and seen >= rank:
+                return min(bound, CHECKOUT_BUCKETS[-2])
+        return 0.0
+
+    def cumulative_counts(self) -> List[Tuple[float, int]]:
+        cumulative, total = [], 0
+        for bound, bucket_count in zip(CHECKOUT_BUCKETS, self.bucket_counts):
+            total += bucket_count
+            cumulative.append((bound, total))
+        return cumulative
+
+
+class InstrumentedQueuePool(QueuePool):
+    """
+    QueuePool (the default pool of the Postgres engines) that records the latency of every checkout in its
+    PoolStatistics. The statistics are carried over to the pool that replaces it on engine.dispose().
+    """
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.statistics = PoolStatistics()
+
+    def connect(self) -> PoolProxiedConnection:
+        # A negative max_overflow means no limit: the pool is never exhausted
+        exhausted = self.checkedin() == 0 and 0 <= self._max_overflow <= self.overflow()
+        started_at = time.perf_counter()
+        try:
+            connection = super().connect()
+        except PoolTimeoutError:
+            self.statistics.timed_out(time.perf_counter() - started_at)
+            raise
+        self.statistics.checked_out(time.perf_counter() - started_at, exhausted)
+        return connection
+
+    def recreate(self) -> "InstrumentedQueuePool":
+        pool = super().recreate()
+        pool.statistics = self.statistics
+        return pool
+
 
 class SQLAlchemySessionFactory:
     """
     The SQLAlchemySessionFactory is responsible for creating a new session.
     The session is then used in the database services to execute queries.
+
+    The engine's connection pool is configured by pool_config (PoolConfig.from_env() by default: the
+    POSTGRES_POOL_* and POSTGRES_ECHO environment variables) and reports its state with pool_stats().
     """
 
-    def __init__(self, db_url: str):
-        self.engine = create_engine(db_url, echo=True)
+    def __init__(self, db_url: str, pool_config: Optional[PoolConfig] = None):
+        self.pool_config = pool_config or PoolConfig.from_env()
+        self.engine = create_engine(db_url, poolclass=InstrumentedQueuePool, **self.pool_config.to_engine_arguments())
         self.Session = sessionmaker(
             bind=self.engine,
             expire_on_commit=False,
@@ -24,6 +121,36 @@ class SQLAlchemySessionFactory:
     def create_session(self):
         return self.Session()
 
+    def pool_stats(self) -> dict:
+        """
+        :return: The live state of the connection pool: its configuration, the connections checked out and idle,
+            the overflow connections open, and the checkout statistics (latencies in milliseconds).
+        """
+        pool = self.engine.pool
+        statistics: PoolStatistics = pool.statistics
+        with statistics.lock:
+            return {
+                "pool_size": pool.size(),
+                "max_overflow": self.pool_config.max_overflow,
+                "checked_out": pool.checkedout(),
+                "checked_in": pool.checkedin(),
+                "overflow": max(pool.overflow(), 0),
+                "checkouts": statistics.checkouts,
+                "waits": statistics.waits,
+                "wait_seconds": round(statistics.wait_seconds, 6),
+                "timeouts": statistics.timeouts,
+                "checkout_ms": {
+                    "mean": round(statistics.checkout_seconds / max(statistics.checkouts, 1) * 1000, 3),
+                    "p50": round(statistics.quantile(0.5) * 1000, 3),
+                    "p95": round(statistics.quantile(0.95) * 1000, 3),
+                    "p99": round(statistics.quantile(0.99) * 1000, 3),
+                    "buckets": [
+                        {"le": "+Inf" if bound == float("inf") else bound * 1000, "count": count}
+                        for bound, count in statistics.cumulative_counts()
+                    ],
+                },
+            }
+
 
 @contextmanager
 def get_session(session_factory: SQLAlchemySessionFactory) -> Session:
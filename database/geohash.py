@@ -0,0 +1,105 @@
+"""
+Geohash encoding (https://en.wikipedia.org/wiki/Geohash) of the flats' GPS coordinates.
+
+A geohash interleaves the bits of the longitude and the latitude and writes them in base 32, so every prefix of a
+geohash is a cell of the grid that contains it: "u2fk" contains "u2fkb", "u2fkc", ... and the flats of a cell are
+the rows whose geohash starts with its prefix. In a B-tree index on a column with the "C" collation a prefix match
+(LIKE 'u2fk%') is a single range scan, which is what the bounding-box and clustering queries are built on
+(see database.services.flat_map).
+"""
+import math
+from typing import List, NamedTuple, Tuple
+
+BASE32 = "0123456789bcdefghjkmnpqrstuvwxyz"
+# Precision of the stored geohashes: cells of about 4.8 x 4.8 m
+PRECISION = 9
+
+
+class BoundingBox(NamedTuple):
+    min_lat: float
+    min_lon: float
+    max_lat: float
+    max_lon: float
+
+
+def encode(lat: float, lon: float, precision: int = PRECISION) -> str:
+    lat_range, lon_range = [-90.0, 90.0], [-180.0, 180.0]
+    geohash = []
+    bits, bit_count, even = 0, 0, True
+    while len(geohash) < precision:
+        value, interval = (lon, lon_range) if even else (lat, lat_range)
+        middle = (interval[0] + interval[1]) / 2
+        if value >= middle:
+            bits = bits * 2 + 1
+            interval[0] = middle
+        else:
+            bits = bits * 2
+            interval[1] = middle
+        even = not even
+        bit_count += 1
+        if bit_count == 5:
+            geohash.append(BASE32[bits])
+            bits, bit_count = 0, 0
+    return "".join(geohash)
+
+
+def decode_bbox(geohash: str) -> BoundingBox:
+    """
+    :return: The cell of the geohash.
+    """
+    lat_range, lon_range = [-90.0, 90.0], [-180.0, 180.0]
+    even = True
+    for char in geohash:
+        bits = BASE32.index(char)
+        for shift in range(4, -1, -1):
+            interval = lon_range if even else lat_range
+            middle = (interval[0] + interval[1]) / 2
+            if bits >> shift & 1:
+                interval[0] = middle
+            else:
+                interval[1] = middle
+            even = not even
+    return BoundingBox(lat_range[0], lon_range[0], lat_range[1], lon_range[1])
+
+
+def cell_size(precision: int) -> Tuple[float, float]:
+    """
+    :return: Height (latitude) and width (longitude) of the cells of a precision, in degrees.
+    """
+    lon_bits = math.ceil(5 * precision / 2)
+    lat_bits = 5 * precision // 2
+    return 180.0 / 2**lat_bits, 360.0 / 2**lon_bits
+
+
+def cover(bbox: BoundingBox, precision: int) -> List[str]:
+    """
+    :return: The geohash cells of the precision that intersect the bounding box.
+    """
+    min_lat, min_lon, max_lat, max_lon = bbox
+    height, width = cell_size(precision)
+    lat_cells = range(math.floor((min_lat + 90) / height), math.floor((max_lat + 90) / height) + 1)
+    lon_cells = range(math.floor((min_lon + 180) / width), math.floor((max_lon + 180) / width) + 1)
+    cells = []
+    for lat_index in lat_cells:
+        for lon_index in lon_cells:
+            lat = min(-90 + (lat_index + 0.5) * height, 90.0)
+            lon = min(-180 + (lon_index + 0.5) * width, 180.0)
+            cells.append(encode(lat, lon, precision))
+    return sorted(set(cells))
+
+
+def cover_precision(bbox: BoundingBox, max_cells: int) -> int:
+    """
+    :return: The finest precision at which at most max_cells cells cover the bounding box (at least 1).
+    """
+    min_lat, min_lon, max_lat, max_lon = bbox
+    precision = 1
+    while precision < PRECISION:
+        height, width = cell_size(precision + 1)
+        cells = (math.floor((max_lat + 90) / height) - math.floor((min_lat + 90) / height) + 1) * (
+            math.floor((max_lon + 180) / width) - math.floor((min_lon + 180) / width) + 1
+        )
+        if cells > max_cells:
+            break
+        precision += 1
+    return precision
@@ -0,0 +1,46 @@
+"""add generated flat search vector with gin index
+
+Revision ID: 0a7e3c9d4b26
+Revises: f2b8d5e1a9c7
+Create Date: 2026-10-18 21:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+
+# revision identifiers, used by Alembic.
+revision: str = "0a7e3c9d4b26"
+down_revision: Union[str, None] = "f2b8d5e1a9c7"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+UNACCENT_FROM = "áäčďéěíĺľňóôöŕřšťúůüýžÁÄČĎÉĚÍĹĽŇÓÔÖŔŘŠŤÚŮÜÝŽ"
+UNACCENT_TO = "aacdeeillnooorrstuuuyzAACDEEILLNOOORRSTUUUYZ"
+
+
+def upgrade() -> None:
+    # Generated from the unaccented title and locality: adding the column computes it for the stored flats
+    op.add_column(
+        "flats",
+        sa.Column(
+            "search_vector",
+            postgresql.TSVECTOR(),
+            sa.Computed(
+                f"setweight(to_tsvector('simple', translate(coalesce(title, ''), '{UNACCENT_FROM}', '{UNACCENT_TO}')), "
+                f"'A') || setweight(to_tsvector('simple', translate(coalesce(locality, ''), '{UNACCENT_FROM}', "
+                f"'{UNACCENT_TO}')), 'B')",
+                persisted=True,
+            ),
+            nullable=True,
+        ),
+    )
+    op.create_index("ix_flats_search_vector", "flats", ["search_vector"], postgresql_using="gin")
+
+
+def downgrade() -> None:
+    op.drop_index("ix_flats_search_vector", table_name="flats")
+    op.drop_column("flats", "search_vector")
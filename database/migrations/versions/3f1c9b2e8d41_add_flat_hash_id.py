@@ -0,0 +1,28 @@
+"""add flat hash_id
+
+Revision ID: 3f1c9b2e8d41
+Revises: 7aa62226dcd8
+Create Date: 2026-10-18 12:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = "3f1c9b2e8d41"
+down_revision: Union[str, None] = "7aa62226dcd8"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.add_column("flats", sa.Column("hash_id", sa.BigInteger(), nullable=True))
+    op.create_index(op.f("ix_flats_hash_id"), "flats", ["hash_id"], unique=False)
+
+
+def downgrade() -> None:
+    op.drop_index(op.f("ix_flats_hash_id"), table_name="flats")
+    op.drop_column("flats", "hash_id")
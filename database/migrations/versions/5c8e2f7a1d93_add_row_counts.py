@@ -0,0 +1,33 @@
+"""add row counts
+
+Revision ID: 5c8e2f7a1d93
+Revises: 0a7e3c9d4b26
+Create Date: 2026-10-18 23:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = "5c8e2f7a1d93"
+down_revision: Union[str, None] = "0a7e3c9d4b26"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.create_table(
+        "row_counts",
+        sa.Column("table_name", sa.String(length=63), nullable=False),
+        sa.Column("row_count", sa.BigInteger(), server_default="0", nullable=False),
+        sa.PrimaryKeyConstraint("table_name"),
+    )
+    # The writers only add the rows they insert from now on, the counter starts from the stored flats
+    op.execute("INSERT INTO row_counts (table_name, row_count) SELECT 'flats', count(*) FROM flats")
+
+
+def downgrade() -> None:
+    op.drop_table("row_counts")
@@ -0,0 +1,36 @@
+"""unique flat hash_id
+
+Revision ID: 9b6e0d5a27c3
+Revises: 3f1c9b2e8d41
+Create Date: 2026-10-18 13:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision: str = "9b6e0d5a27c3"
+down_revision: Union[str, None] = "3f1c9b2e8d41"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    # Keep a single row per listing before the unique constraint is created: earlier crawls inserted
+    # every listing again on each run.
+    op.execute(
+        """
+        DELETE FROM flats AS duplicate
+        USING flats AS kept
+        WHERE duplicate.hash_id = kept.hash_id AND duplicate.ctid < kept.ctid
+        """
+    )
+    op.drop_index("ix_flats_hash_id", table_name="flats")
+    op.create_unique_constraint("uq_flats_hash_id", "flats", ["hash_id"])
+
+
+def downgrade() -> None:
+    op.drop_constraint("uq_flats_hash_id", "flats", type_="unique")
+    op.create_index("ix_flats_hash_id", "flats", ["hash_id"], unique=False)
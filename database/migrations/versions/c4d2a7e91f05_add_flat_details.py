@@ -0,0 +1,36 @@
+"""add flat fingerprint and flat_details
+
+Revision ID: c4d2a7e91f05
+Revises: 9b6e0d5a27c3
+Create Date: 2026-10-18 15:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+
+# revision identifiers, used by Alembic.
+revision: str = "c4d2a7e91f05"
+down_revision: Union[str, None] = "9b6e0d5a27c3"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.add_column("flats", sa.Column("fingerprint", sa.String(length=16), nullable=True))
+    op.create_table(
+        "flat_details",
+        sa.Column("hash_id", sa.BigInteger(), nullable=False),
+        sa.Column("list_fingerprint", sa.String(length=16), nullable=True),
+        sa.Column("payload", postgresql.JSONB(astext_type=sa.Text()), nullable=False),
+        sa.Column("fetched_at", sa.DateTime(timezone=True), server_default=sa.text("now()"), nullable=False),
+        sa.PrimaryKeyConstraint("hash_id"),
+    )
+
+
+def downgrade() -> None:
+    op.drop_table("flat_details")
+    op.drop_column("flats", "fingerprint")
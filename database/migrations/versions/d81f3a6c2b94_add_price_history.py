@@ -0,0 +1,40 @@
+"""add flat price and monthly partitioned price_history
+
+Revision ID: d81f3a6c2b94
+Revises: c4d2a7e91f05
+Create Date: 2026-10-18 16:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = "d81f3a6c2b94"
+down_revision: Union[str, None] = "c4d2a7e91f05"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.add_column("flats", sa.Column("price", sa.BigInteger(), nullable=True))
+    op.create_table(
+        "price_history",
+        sa.Column("hash_id", sa.BigInteger(), nullable=False),
+        sa.Column("observed_at", sa.DateTime(timezone=True), nullable=False),
+        sa.Column("price", sa.BigInteger(), nullable=False),
+        sa.PrimaryKeyConstraint("hash_id", "observed_at", name="pk_price_history"),
+        postgresql_partition_by="RANGE (observed_at)",
+    )
+
+    # The monthly partitions (price_history_y<YYYY>m<MM>) are created on demand by PriceHistoryWriter.prepare(),
+    # the default partition only catches rows written without it
+    op.execute("CREATE TABLE price_history_default PARTITION OF price_history DEFAULT")
+
+
+def downgrade() -> None:
+    # Dropping the partitioned table drops all its partitions
+    op.drop_table("price_history")
+    op.drop_column("flats", "price")
@@ -0,0 +1,57 @@
+"""add typed flat listing columns with filter indexes
+
+Revision ID: e6a4c0b7f312
+Revises: d81f3a6c2b94
+Create Date: 2026-10-18 18:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = "e6a4c0b7f312"
+down_revision: Union[str, None] = "d81f3a6c2b94"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.add_column("flats", sa.Column("area", sa.Integer(), nullable=True))
+    op.add_column("flats", sa.Column("disposition", sa.String(length=16), nullable=True))
+    op.add_column("flats", sa.Column("locality", sa.String(), nullable=True))
+
+    # Backfill from the title ("<name>, <locality>, <price> CZK", the name usually ends with the area). Areas with
+    # a thousands separator are not recognised here, the next crawl of a listing writes the values extracted by
+    # JsonDataExtractor.
+    # substring() returns the first parenthesized group; no (?:...) groups, ":name" is a bind parameter in text().
+    op.execute(
+        r"""
+        UPDATE flats SET
+            disposition = substring(title from '(\d\+(kk|\d))'),
+            area = substring(regexp_replace(title, '\d\+(kk|\d)', '') from '(\d+)\s*m²')::integer,
+            locality = coalesce(
+                substring(title from '^.*m², (.*?)(, \d+ CZK)?$'),
+                substring(title from '^[^,]*, (.*?)(, \d+ CZK)?$')
+            )
+        """
+    )
+
+    op.create_index("ix_flats_price", "flats", ["price", "id"])
+    op.create_index("ix_flats_area", "flats", ["area", "id"])
+    op.create_index("ix_flats_disposition_price", "flats", ["disposition", "price", "id"])
+    op.create_index(
+        "ix_flats_locality_price", "flats", ["locality", "price"], postgresql_ops={"locality": "varchar_pattern_ops"}
+    )
+
+
+def downgrade() -> None:
+    op.drop_index("ix_flats_locality_price", table_name="flats")
+    op.drop_index("ix_flats_disposition_price", table_name="flats")
+    op.drop_index("ix_flats_area", table_name="flats")
+    op.drop_index("ix_flats_price", table_name="flats")
+    op.drop_column("flats", "locality")
+    op.drop_column("flats", "disposition")
+    op.drop_column("flats", "area")
@@ -0,0 +1,34 @@
+"""add flat gps coordinates and geohash index
+
+Revision ID: f2b8d5e1a9c7
+Revises: e6a4c0b7f312
+Create Date: 2026-10-18 20:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = "f2b8d5e1a9c7"
+down_revision: Union[str, None] = "e6a4c0b7f312"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    # The coordinates are not part of the title, so there is nothing to backfill: the next crawl of a listing
+    # writes them.
+    op.add_column("flats", sa.Column("lat", sa.Float(), nullable=True))
+    op.add_column("flats", sa.Column("lon", sa.Float(), nullable=True))
+    op.add_column("flats", sa.Column("geohash", sa.String(length=12, collation="C"), nullable=True))
+    op.create_index("ix_flats_geohash", "flats", ["geohash"])
+
+
+def downgrade() -> None:
+    op.drop_index("ix_flats_geohash", table_name="flats")
+    op.drop_column("flats", "geohash")
+    op.drop_column("flats", "lon")
+    op.drop_column("flats", "lat")
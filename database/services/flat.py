@@ -1,9 +1,17 @@
+import csv
+import io
 import logging
-from typing import List, Type
+from dataclasses import dataclass
+from datetime import datetime, timezone
+from typing import Iterable, Iterator, List, Set, Tuple, Type
+from sqlalchemy import column, func, literal_column, or_, select, table, text
+from sqlalchemy.dialects.postgresql import Insert, insert
 from sqlalchemy.orm import Session
 
 from database.sql_schema import Flat
 from database.services.base import BaseDatabaseRetriever, BaseDatabaseWriter
+from database.services.price_history import PriceHistoryWriter
+from database.services.row_count import RowCounter
 from database.factory import SQLAlchemySessionFactory, get_session
 from scraper.services.schema import FlatItemModel
 
@@ -14,6 +22,9 @@ class FlatDataReader(BaseDatabaseRetriever):
     """
     The database service is responsible for handling retrieval of all the flats from the database.
     - retrieve_all_items: retrieves all the flats from the database
+    - retrieve_existing_hash_ids: retrieves which of the given sreality ids are already stored
+    - retrieve_hash_id_count / iterate_hash_ids: count and stream all the stored sreality ids
+    - retrieve_value_counts: retrieves the distinct values of a column with their number of flats
     """
 
     def __init__(self, session_factory: SQLAlchemySessionFactory):
@@ -23,29 +34,281 @@ class FlatDataReader(BaseDatabaseRetriever):
         with get_session(session_factory=self.session_factory) as session:
             return session.query(Flat).all()
 
+    def retrieve_existing_hash_ids(self, hash_ids: Iterable[int]) -> Set[int]:
+        hash_ids = list(hash_ids)
+        if not hash_ids:
+            return set()
+        with get_session(session_factory=self.session_factory) as session:
+            rows = session.query(Flat.hash_id).filter(Flat.hash_id.in_(hash_ids)).distinct()
+            return {hash_id for (hash_id,) in rows}
+
+    def retrieve_hash_id_count(self) -> int:
+        with get_session(session_factory=self.session_factory) as session:
+            return session.query(func.count(Flat.hash_id)).scalar()
+
+    def iterate_hash_ids(self, batch_size: int = 10000) -> Iterator[int]:
+        """
+        :return: The stored sreality ids, fetched through a server-side cursor batch_size rows at a time.
+        """
+        with get_session(session_factory=self.session_factory) as session:
+            rows = session.execute(
+                select(Flat.hash_id).where(Flat.hash_id.isnot(None)).execution_options(yield_per=batch_size)
+            )
+            for (hash_id,) in rows:
+                yield hash_id
+
+    def retrieve_value_counts(self, column_name: str) -> List[Tuple[str, int]]:
+        """
+        :param column_name: Column of flats, e.g. "locality".
+        :return: The distinct non-null values of the column and the number of flats with each of them.
+        """
+        column = Flat.__table__.c[column_name]
+        with get_session(session_factory=self.session_factory) as session:
+            rows = session.query(column, func.count()).filter(column.isnot(None)).group_by(column)
+            return [(value, count) for value, count in rows]
+
+
+@dataclass
+class UpsertResult:
+    """
+    Number of rows inserted, updated and left unchanged by an upsert, and number of price changes recorded.
+    """
+
+    inserted: int = 0
+    updated: int = 0
+    unchanged: int = 0
+    price_changes: int = 0
+
+    def __add__(self, other: "UpsertResult") -> "UpsertResult":
+        return UpsertResult(
+            inserted=self.inserted + other.inserted,
+            updated=self.updated + other.updated,
+            unchanged=self.unchanged + other.unchanged,
+            price_changes=self.price_changes + other.price_changes,
+        )
+
 
 class FlatDataWriter(BaseDatabaseWriter):
     """
     The database service is responsible for handling the database operations for the Flat model.
-    - insert_items: inserts a list of Flat objects to the database
+    - insert_items: upserts a list of Flat objects to the database and returns an UpsertResult
     - handle_error: handles database errors
 
-    For optimization purposes, we are using bulk_insert_mappings() method to save all the items at once:
-    https://docs.sqlalchemy.org/en/20/orm/session_api.html#sqlalchemy.orm.session.Session.bulk_insert_mappings
+    Listings are keyed on the sreality hash_id, so re-scraping a listing never duplicates it. Each batch is written
+    with a single INSERT ... ON CONFLICT (hash_id) DO UPDATE statement; the update only touches rows whose
+    listing columns actually changed. The statement returns (xmax = 0) for every written row,
+    which is true for freshly inserted rows and false for updated ones:
+    https://www.postgresql.org/docs/current/sql-insert.html#SQL-ON-CONFLICT
+
+    Before the upsert, the price changes of the batch are appended to price_history (PriceHistoryWriter). The
+    inserted rows are added to the row counter of flats (RowCounter) in the same transaction.
     """
 
+    # Columns written by the scraper and columns overwritten when an already stored listing changes
+    INSERTED_COLUMNS = (
+        "id",
+        "hash_id",
+        "title",
+        "image_url",
+        "price",
+        "area",
+        "disposition",
+        "locality",
+        "lat",
+        "lon",
+        "geohash",
+        "fingerprint",
+    )
+    UPDATED_COLUMNS = (
+        "title",
+        "image_url",
+        "price",
+        "area",
+        "disposition",
+        "locality",
+        "lat",
+        "lon",
+        "geohash",
+        "fingerprint",
+    )
+
     def __init__(self, session_factory: SQLAlchemySessionFactory, bulk_insert_size=100):
         super().__init__(session_factory=session_factory)
         self.bulk_insert_size = bulk_insert_size
+        self.price_history = PriceHistoryWriter(session_factory)
 
-    def insert_items(self, items_to_insert: List[FlatItemModel]):
+    def insert_items(self, items_to_insert: List[FlatItemModel]) -> UpsertResult:
+        observed_at = datetime.now(timezone.utc)
+        self.price_history.prepare(observed_at)
         with get_session(self.session_factory) as session:
-            self._insert_items_batched(session, items_to_insert)
+            result = self._insert_items_batched(session, items_to_insert, observed_at)
+            RowCounter.increment(session, Flat.__tablename__, result.inserted)
+            return result
 
-    def _insert_items_batched(self, session: Session, items_to_insert: List[FlatItemModel]):
+    def _insert_items_batched(
+        self, session: Session, items_to_insert: List[FlatItemModel], observed_at: datetime
+    ) -> UpsertResult:
         batch_size = self.bulk_insert_size
+        result = UpsertResult()
         for i in range(0, len(items_to_insert), batch_size):
             batch = items_to_insert[i : i + batch_size]
-            mappings = [item.model_dump() for item in batch]
-            session.bulk_insert_mappings(Flat, mappings)
-            logger.info("Inserted %s items to the database", len(batch))
+            batch_result = self._upsert_batch(session, batch, observed_at)
+            logger.info(
+                "Upserted %s items to the database: %s inserted, %s updated, %s unchanged, %s price changes",
+                len(batch),
+                batch_result.inserted,
+                batch_result.updated,
+                batch_result.unchanged,
+                batch_result.price_changes,
+            )
+            result += batch_result
+        return result
+
+    @classmethod
+    def build_upsert(cls, statement: Insert) -> Insert:
+        """
+        Turn an INSERT INTO flats statement into an upsert keyed on hash_id that only updates changed rows
+        and returns (xmax = 0) AS inserted for every inserted or updated row.
+        """
+        excluded = statement.excluded
+        return statement.on_conflict_do_update(
+            constraint="uq_flats_hash_id",
+            set_={name: excluded[name] for name in cls.UPDATED_COLUMNS},
+            where=or_(*(Flat.__table__.c[name].is_distinct_from(excluded[name]) for name in cls.UPDATED_COLUMNS)),
+        ).returning(literal_column("xmax = 0").label("inserted"))
+
+    @staticmethod
+    def _deduplicate(batch: List[FlatItemModel]) -> List[dict]:
+        """
+        A single INSERT ... ON CONFLICT statement cannot update the same row twice, so only the last
+        occurrence of a hash_id within a batch is kept.
+
+        The rows are returned in hash_id order, so that concurrent writers (the pipeline's writer threads) lock
+        the rows of overlapping batches in the same order instead of deadlocking.
+        """
+        mappings_by_hash_id = {}
+        mappings_without_hash_id = []
+        for item in batch:
+            mapping = item.model_dump()
+            if mapping["hash_id"] is None:
+                mappings_without_hash_id.append(mapping)
+            else:
+                mappings_by_hash_id[mapping["hash_id"]] = mapping
+        return [mappings_by_hash_id[hash_id] for hash_id in sorted(mappings_by_hash_id)] + mappings_without_hash_id
+
+    def _upsert_batch(self, session: Session, batch: List[FlatItemModel], observed_at: datetime) -> UpsertResult:
+        mappings = self._deduplicate(batch)
+        if not mappings:
+            return UpsertResult()
+
+        price_changes = self.price_history.record_changes(
+            session,
+            PriceHistoryWriter.build_batch_source(
+                [mapping["hash_id"] for mapping in mappings], [mapping["price"] for mapping in mappings]
+            ),
+            observed_at,
+        )
+        statement = self.build_upsert(insert(Flat).values(mappings))
+        written = session.execute(statement).scalars().all()
+        inserted = sum(1 for is_inserted in written if is_inserted)
+        updated = len(written) - inserted
+        return UpsertResult(
+            inserted=inserted, updated=updated, unchanged=len(mappings) - len(written), price_changes=price_changes
+        )
+
+
+class FlatCopyWriter(BaseDatabaseWriter):
+    """
+    Bulk loader for the Flat model that streams the items to Postgres with COPY ... FROM STDIN (psycopg2),
+    which avoids the per-statement overhead of INSERTs for large batches:
+    https://www.postgresql.org/docs/current/sql-copy.html
+
+    - use_staging=True (default): every batch is copied into a temporary staging table and merged into flats with
+      the same upsert as FlatDataWriter (one INSERT ... SELECT ... ON CONFLICT statement per batch).
+    - use_staging=False: the batch is copied straight into flats. This is the fastest way to fill an empty table,
+      but the COPY fails if a listing is already stored.
+
+    In both modes the price changes are appended to price_history (PriceHistoryWriter) before the batch is merged,
+    and the inserted rows are added to the row counter of flats (RowCounter).
+    """
+
+    STAGING_TABLE = "flats_staging"
+
+    def __init__(self, session_factory: SQLAlchemySessionFactory, bulk_insert_size=10000, use_staging=True):
+        super().__init__(session_factory=session_factory)
+        self.bulk_insert_size = bulk_insert_size
+        self.use_staging = use_staging
+        self.price_history = PriceHistoryWriter(session_factory)
+
+    def insert_items(self, items_to_insert: List[FlatItemModel]) -> UpsertResult:
+        result = UpsertResult()
+        observed_at = datetime.now(timezone.utc)
+        self.price_history.prepare(observed_at)
+        with get_session(self.session_factory) as session:
+            for i in range(0, len(items_to_insert), self.bulk_insert_size):
+                batch = items_to_insert[i : i + self.bulk_insert_size]
+                if self.use_staging:
+                    batch_result = self._copy_and_merge(session, batch, observed_at)
+                else:
+                    batch_result = self._copy_into_flats(session, batch, observed_at)
+                logger.info(
+                    "Copied %s items to the database: %s inserted, %s updated, %s unchanged, %s price changes",
+                    len(batch),
+                    batch_result.inserted,
+                    batch_result.updated,
+                    batch_result.unchanged,
+                    batch_result.price_changes,
+                )
+                result += batch_result
+            RowCounter.increment(session, Flat.__tablename__, result.inserted)
+        return result
+
+    @staticmethod
+    def _copy(session: Session, mappings: List[dict], table_name: str) -> None:
+        columns = FlatDataWriter.INSERTED_COLUMNS
+        buffer = io.StringIO()
+        writer = csv.writer(buffer)
+        for mapping in mappings:
+            writer.writerow(mapping[name] for name in columns)
+        buffer.seek(0)
+
+        cursor = session.connection().connection.cursor()
+        try:
+            cursor.copy_expert(f"COPY {table_name} ({', '.join(columns)}) FROM STDIN WITH (FORMAT csv)", buffer)
+        finally:
+            cursor.close()
+
+    def _copy_into_flats(self, session: Session, batch: List[FlatItemModel], observed_at: datetime) -> UpsertResult:
+        mappings = FlatDataWriter._deduplicate(batch)
+        price_changes = self.price_history.record_changes(
+            session,
+            PriceHistoryWriter.build_batch_source(
+                [mapping["hash_id"] for mapping in mappings], [mapping["price"] for mapping in mappings]
+            ),
+            observed_at,
+        )
+        self._copy(session, mappings, Flat.__tablename__)
+        return UpsertResult(inserted=len(mappings), price_changes=price_changes)
+
+    def _copy_and_merge(self, session: Session, batch: List[FlatItemModel], observed_at: datetime) -> UpsertResult:
+        session.execute(
+            text(
+                f"CREATE TEMP TABLE IF NOT EXISTS {self.STAGING_TABLE} (LIKE flats INCLUDING DEFAULTS) ON COMMIT DROP"
+            )
+        )
+        session.execute(text(f"TRUNCATE {self.STAGING_TABLE}"))
+        mappings = FlatDataWriter._deduplicate(batch)
+        self._copy(session, mappings, self.STAGING_TABLE)
+
+        columns = FlatDataWriter.INSERTED_COLUMNS
+        staging = table(self.STAGING_TABLE, *(column(name) for name in columns))
+        price_changes = self.price_history.record_changes(session, staging, observed_at)
+        # In hash_id order, like FlatDataWriter, so that concurrent merges lock the rows in the same order
+        rows = select(*staging.c).order_by(staging.c.hash_id)
+        written = FlatDataWriter.build_upsert(insert(Flat).from_select(columns, rows)).cte("written")
+        inserted, total = session.execute(
+            select(func.count().filter(written.c.inserted), func.count()).select_from(written)
+        ).one()
+        return UpsertResult(
+            inserted=inserted, updated=total - inserted, unchanged=len(mappings) - total, price_changes=price_changes
+        )
@@ -0,0 +1,76 @@
+import logging
+from typing import Dict, Iterable, List, Type
+
+from sqlalchemy import func, literal_column
+from sqlalchemy.dialects.postgresql import insert
+
+from database.sql_schema import FlatDetail
+from database.services.base import BaseDatabaseRetriever, BaseDatabaseWriter
+from database.services.flat import UpsertResult
+from database.factory import SQLAlchemySessionFactory, get_session
+from scraper.services.schema import FlatDetailItemModel
+
+logger = logging.getLogger(__name__)
+
+
+class FlatDetailReader(BaseDatabaseRetriever):
+    """
+    The database service is responsible for handling retrieval of the flat details from the database.
+    - retrieve_all_items: retrieves all the flat details from the database
+    - retrieve_list_fingerprints: retrieves the list fingerprint each of the given listings had when its detail
+      was fetched
+    """
+
+    def __init__(self, session_factory: SQLAlchemySessionFactory):
+        super().__init__(session_factory)
+
+    def retrieve_all_items(self) -> List[Type[FlatDetail]]:
+        with get_session(session_factory=self.session_factory) as session:
+            return session.query(FlatDetail).all()
+
+    def retrieve_list_fingerprints(self, hash_ids: Iterable[int]) -> Dict[int, str]:
+        hash_ids = list(hash_ids)
+        if not hash_ids:
+            return {}
+        with get_session(session_factory=self.session_factory) as session:
+            rows = session.query(FlatDetail.hash_id, FlatDetail.list_fingerprint).filter(
+                FlatDetail.hash_id.in_(hash_ids)
+            )
+            return {hash_id: list_fingerprint for hash_id, list_fingerprint in rows}
+
+
+class FlatDetailWriter(BaseDatabaseWriter):
+    """
+    The database service is responsible for saving the flat details:
+    - insert_items: upserts a list of FlatDetailItemModels keyed on hash_id and returns an UpsertResult
+    """
+
+    def __init__(self, session_factory: SQLAlchemySessionFactory, bulk_insert_size=100):
+        super().__init__(session_factory=session_factory)
+        self.bulk_insert_size = bulk_insert_size
+
+    def insert_items(self, items_to_insert: List[FlatDetailItemModel]) -> UpsertResult:
+        result = UpsertResult()
+        with get_session(self.session_factory) as session:
+            for i in range(0, len(items_to_insert), self.bulk_insert_size):
+                # The last payload of a listing wins, a statement cannot update the same row twice
+                mappings = {item.hash_id: item.model_dump() for item in items_to_insert[i : i + self.bulk_insert_size]}
+                statement = insert(FlatDetail).values(list(mappings.values()))
+                statement = statement.on_conflict_do_update(
+                    index_elements=[FlatDetail.hash_id],
+                    set_={
+                        "list_fingerprint": statement.excluded.list_fingerprint,
+                        "payload": statement.excluded.payload,
+                        "fetched_at": func.now(),
+                    },
+                ).returning(literal_column("xmax = 0").label("inserted"))
+                written = session.execute(statement).scalars().all()
+                inserted = sum(1 for is_inserted in written if is_inserted)
+                result += UpsertResult(inserted=inserted, updated=len(written) - inserted)
+            logger.info(
+                "Upserted %s flat details: %s inserted, %s updated",
+                len(items_to_insert),
+                result.inserted,
+                result.updated,
+            )
+        return result
@@ -0,0 +1,104 @@
+from typing import Dict, List, Optional, Tuple
+
+from sqlalchemy import Column
+from sqlalchemy.orm import Query
+
+from database.sql_schema import Flat
+
+
+class FlatFilter:
+    """
+    Filter and ordering of a listing of flats, built from the query parameters of a request:
+    - disposition: one or more layouts (disposition=2+kk&disposition=3+kk)
+    - min_price / max_price: price range in CZK
+    - min_area / max_area: floor area range in m²
+    - locality: locality prefix (e.g. "Praha" matches "Praha 6 - Bubeneč"), case-sensitive
+    - sort: price, area, -price or -area (descending)
+
+    The filters and orderings map onto the composite indexes of Flat: ix_flats_disposition_price serves
+    "disposition=... sorted by price", ix_flats_price / ix_flats_area the ranges and orderings on their own and
+    ix_flats_locality_price the locality prefix. Every ordering ends with id, so the pages of a listing are stable.
+
+    Flats without a value of the sort column (e.g. price on request) are left out of a sorted listing: they have no
+    place in the order, and leaving them out lets both directions of the ordering use the same index.
+    """
+
+    SORT_COLUMNS = {"price": Flat.price, "area": Flat.area}
+    RANGE_PARAMETERS = {
+        "min_price": (Flat.price, ">="),
+        "max_price": (Flat.price, "<="),
+        "min_area": (Flat.area, ">="),
+        "max_area": (Flat.area, "<="),
+    }
+
+    def __init__(
+        self,
+        dispositions: Optional[List[str]] = None,
+        ranges: Optional[Dict[str, int]] = None,
+        locality: Optional[str] = None,
+        sort: Optional[str] = None,
+    ):
+        self.dispositions = dispositions or []
+        self.ranges = ranges or {}
+        self.locality = locality
+        self.sort = sort
+        self.validate()
+
+    def validate(self):
+        unknown = set(self.ranges) - set(self.RANGE_PARAMETERS)
+        if unknown:
+            raise ValueError(f"Unknown range filter: {', '.join(sorted(unknown))}")
+        if any(value < 0 for value in self.ranges.values()):
+            raise ValueError("Price and area filters must not be negative")
+        if self.sort is not None and self.sort.lstrip("-") not in self.SORT_COLUMNS:
+            raise ValueError(f"Unknown sort {self.sort!r}, expected one of: {', '.join(self.sort_values())}")
+
+    @classmethod
+    def sort_values(cls) -> List[str]:
+        return [prefix + name for name in cls.SORT_COLUMNS for prefix in ("", "-")]
+
+    @classmethod
+    def from_query_params(cls, params: Dict[str, List[str]]) -> "FlatFilter":
+        """
+        :param params: Query parameters as parsed by urllib.parse.parse_qs.
+        :return: The filter.
+        :raises ValueError: A parameter has an invalid value.
+        """
+        ranges = {}
+        for name in cls.RANGE_PARAMETERS:
+            if params.get(name):
+                try:
+                    ranges[name] = int(params[name][0])
+                except ValueError:
+                    raise ValueError(f"{name} must be an integer")
+        # An unescaped "+" in a query string is decoded as a space, dispositions never contain spaces
+        dispositions = [value.strip().replace(" ", "+") for value in params.get("disposition", []) if value.strip()]
+        locality = params["locality"][0].strip() if params.get("locality") else None
+        sort = params["sort"][0] if params.get("sort") else None
+        return cls(dispositions=dispositions, ranges=ranges, locality=locality or None, sort=sort)
+
+    def apply(self, query: Query) -> Query:
+        """
+        Add the filters and the ordering to a query of Flats.
+        """
+        if self.dispositions:
+            query = query.filter(Flat.disposition.in_(self.dispositions))
+        for name, value in self.ranges.items():
+            column, operator = self.RANGE_PARAMETERS[name]
+            query = query.filter(column >= value if operator == ">=" else column <= value)
+        if self.locality:
+            query = query.filter(Flat.locality.startswith(self.locality, autoescape=True))
+
+        sort_columns, descending = self.sort_key()
+        if len(sort_columns) > 1:
+            query = query.filter(sort_columns[0].isnot(None))
+        return query.order_by(*(column.desc() if descending else column for column in sort_columns))
+
+    def sort_key(self) -> Tuple[List[Column], bool]:
+        """
+        :return: The columns the listing is ordered by, a unique key matching an index, and whether it is
+            descending (for QueryPaginationService.paginate_query_by_keyset).
+        """
+        if self.sort is None:
+            return [Flat.id], False
+        return [self.SORT_COLUMNS[self.sort.lstrip("-")], Flat.id], self.sort.startswith("-")
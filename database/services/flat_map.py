@@ -0,0 +1,98 @@
+import math
+from typing import Dict, List, Optional
+
+from sqlalchemy import func, or_
+from sqlalchemy.orm import Query, Session
+
+from database import geohash
+from database.factory import SQLAlchemySessionFactory, get_session
+from database.geohash import BoundingBox
+from database.services.base import BaseDatabaseRetriever
+from database.sql_schema import Flat
+
+
+class FlatMapReader(BaseDatabaseRetriever):
+    """
+    Map queries over the GPS coordinates of the flats, served by the geohash index (ix_flats_geohash):
+    - retrieve_flats: the flats inside a bounding box, at most limit of them
+    - retrieve_clusters: the flats inside a bounding box aggregated by geohash prefix, one cluster per cell of
+      about 64 x 64 pixels at the zoom level of the map, with the number of flats, their centroid and lowest price
+
+    The bounding box is covered by at most MAX_COVER_CELLS geohash cells and every cell is one range scan of the
+    index (geohash LIKE 'u2fk%'). The exact bounds are checked on the rows found, so flats in the part of a cell
+    outside the bounding box are left out.
+    """
+
+    MAX_COVER_CELLS = 32
+    MAX_ZOOM = 22
+
+    def __init__(self, session_factory: SQLAlchemySessionFactory):
+        super().__init__(session_factory)
+
+    def retrieve_all_items(self) -> List[Flat]:
+        with get_session(session_factory=self.session_factory) as session:
+            return session.query(Flat).filter(Flat.geohash.isnot(None)).all()
+
+    @staticmethod
+    def parse_bbox(value: Optional[str]) -> BoundingBox:
+        """
+        :param value: "min_lon,min_lat,max_lon,max_lat", the order of GeoJSON and of Leaflet's toBBoxString().
+        :return: The bounding box.
+        :raises ValueError: The value is missing or is not a valid bounding box.
+        """
+        if not value:
+            raise ValueError("bbox is required: bbox=min_lon,min_lat,max_lon,max_lat")
+        try:
+            min_lon, min_lat, max_lon, max_lat = (float(part) for part in value.split(","))
+        except ValueError:
+            raise ValueError("bbox must be four numbers: min_lon,min_lat,max_lon,max_lat")
+        if not all(math.isfinite(part) for part in (min_lon, min_lat, max_lon, max_lat)):
+            raise ValueError("bbox must be four numbers: min_lon,min_lat,max_lon,max_lat")
+        if not (-90 <= min_lat <= max_lat <= 90 and -180 <= min_lon <= max_lon <= 180):
+            raise ValueError("bbox must satisfy -180 <= min_lon <= max_lon <= 180 and -90 <= min_lat <= max_lat <= 90")
+        return BoundingBox(min_lat, min_lon, max_lat, max_lon)
+
+    @staticmethod
+    def cluster_precision(zoom: int) -> int:
+        """
+        Geohash precision of the clusters at a zoom level of a web map: the world is 256 * 2^zoom pixels wide, so
+        cells 2^(zoom + 2) to a world width are about 64 pixels wide.
+        """
+        if zoom < 0:
+            raise ValueError("zoom must not be negative")
+        precision = 1
+        while precision < geohash.PRECISION and math.ceil(5 * precision / 2) < zoom + 2:
+            precision += 1
+        return precision
+
+    def filter_bbox(self, query: Query, bbox: BoundingBox) -> Query:
+        precision = geohash.cover_precision(bbox, self.MAX_COVER_CELLS)
+        cells = geohash.cover(bbox, precision)
+        return query.filter(
+            or_(*(Flat.geohash.like(f"{cell}%") for cell in cells)),
+            Flat.lat.between(bbox.min_lat, bbox.max_lat),
+            Flat.lon.between(bbox.min_lon, bbox.max_lon),
+        )
+
+    def query_flats(self, session: Session, bbox: BoundingBox, limit: int) -> Query:
+        columns = (Flat.id, Flat.hash_id, Flat.title, Flat.price, Flat.lat, Flat.lon)
+        return self.filter_bbox(session.query(*columns), bbox).limit(limit)
+
+    def query_clusters(self, session: Session, bbox: BoundingBox, zoom: int) -> Query:
+        cell = func.substr(Flat.geohash, 1, self.cluster_precision(zoom))
+        query = session.query(
+            cell.label("geohash"),
+            func.count().label("count"),
+            func.avg(Flat.lat).label("lat"),
+            func.avg(Flat.lon).label("lon"),
+            func.min(Flat.price).label("min_price"),
+        )
+        return self.filter_bbox(query, bbox).group_by(cell).order_by(cell)
+
+    def retrieve_flats(self, bbox: BoundingBox, limit: int) -> List[Dict]:
+        with get_session(session_factory=self.session_factory) as session:
+            return [row._asdict() for row in self.query_flats(session, bbox, limit)]
+
+    def retrieve_clusters(self, bbox: BoundingBox, zoom: int) -> List[Dict]:
+        with get_session(session_factory=self.session_factory) as session:
+            return [row._asdict() for row in self.query_clusters(session, bbox, zoom)]
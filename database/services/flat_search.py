@@ -0,0 +1,53 @@
+from typing import Dict, List
+
+from sqlalchemy import func
+from sqlalchemy.orm import Query
+
+from database.sql_schema import UNACCENT_FROM, UNACCENT_TO, Flat
+
+
+class FlatSearch:
+    """
+    Full-text search of the flats by title and locality, built from the q query parameter of a request:
+        /search?q=2+kk bubenec
+    The search text is parsed by websearch_to_tsquery: the words must all match, "quoted words" must match as a
+    phrase, "or" separates alternatives and -word excludes a word. Letters are compared without accents and case
+    ("Bubenec" matches "Bubeneč"), like the search_vector column they are matched against.
+
+    The matches are found in the GIN index ix_flats_search_vector and ordered by ts_rank (matches in the title
+    weigh more than matches in the locality), then by id, so the pages of the results are stable.
+    """
+
+    CONFIG = "simple"
+    MAX_QUERY_LENGTH = 200
+
+    def __init__(self, text: str):
+        self.text = text.strip()
+        self.validate()
+
+    def validate(self):
+        if not self.text:
+            raise ValueError("q is required")
+        if len(self.text) > self.MAX_QUERY_LENGTH:
+            raise ValueError(f"q must not be longer than {self.MAX_QUERY_LENGTH} characters")
+
+    @classmethod
+    def from_query_params(cls, params: Dict[str, List[str]]) -> "FlatSearch":
+        """
+        :param params: Query parameters as parsed by urllib.parse.parse_qs.
+        :return: The search.
+        :raises ValueError: The q parameter is missing or invalid.
+        """
+        return cls(params.get("q", [""])[0])
+
+    def ts_query(self):
+        return func.websearch_to_tsquery(self.CONFIG, func.translate(self.text, UNACCENT_FROM, UNACCENT_TO))
+
+    def apply(self, query: Query) -> Query:
+        """
+        Add the search condition and the ranking to a query of Flats.
+        """
+        ts_query = self.ts_query()
+        return query.filter(Flat.search_vector.op("@@")(ts_query)).order_by(
+            func.ts_rank(Flat.search_vector, ts_query).desc(), Flat.id
+        )
@@ -0,0 +1,175 @@
+import hashlib
+import logging
+import os
+import tempfile
+import threading
+from collections import OrderedDict
+from typing import Optional
+from urllib.parse import parse_qsl, urlencode, urlparse, urlunparse
+
+from dotenv import load_dotenv
+
+load_dotenv()
+
+logger = logging.getLogger(__name__)
+
+
+class ImageCacheConfig:
+    """
+    Configuration of the image proxy (/img/<id>) and its disk cache:
+    - enabled: the HTML pages link the thumbnails served by the proxy instead of the remote images, False by default
+    - directory: cache directory, .image_cache by default
+    - max_bytes: size bound of the cache, the least recently used thumbnails are evicted above it: 512 MB by default
+    - width / height: thumbnail size requested from the image CDN, 400x300 by default
+    - timeout: timeout of a fetch from the image CDN in seconds, 5 by default
+    """
+
+    def __init__(self, enabled: bool, directory: str, max_bytes: int, width: int, height: int, timeout: float):
+        self.enabled = enabled
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.width = width
+        self.height = height
+        self.timeout = timeout
+        self.validate_config()
+
+    def validate_config(self):
+        if self.max_bytes <= 0 or self.width <= 0 or self.height <= 0:
+            raise ValueError("Image cache size and thumbnail size must be positive")
+
+    @classmethod
+    def from_env(cls) -> "ImageCacheConfig":
+        enabled = os.environ.get("IMAGE_PROXY_ENABLED", "false").lower() in ("1", "true", "yes")
+        directory = os.environ.get("IMAGE_CACHE_DIR", ".image_cache")
+        max_bytes = int(float(os.environ.get("IMAGE_CACHE_MAX_MB", "512")) * 1024 * 1024)
+        width, height = (int(value) for value in os.environ.get("IMAGE_THUMBNAIL_SIZE", "400x300").split("x"))
+        timeout = float(os.environ.get("IMAGE_FETCH_TIMEOUT", "5"))
+        return cls(enabled, directory, max_bytes, width, height, timeout)
+
+    def thumbnail_url(self, image_url: str) -> str:
+        """
+        :return: URL of the thumbnail of the configured size, the key of the image in the cache.
+        """
+        return build_thumbnail_url(image_url, self.width, self.height)
+
+
+def build_thumbnail_url(image_url: str, width: int, height: int) -> str:
+    """
+    URL of a thumbnail of the image. The sreality image CDN resizes images itself with the fl query parameter
+    (fl=res,<width>,<height>,...), other image URLs are returned unchanged.
+    :param image_url: URL of the listing's image.
+    :return: URL of the thumbnail.
+    """
+    parsed_url = urlparse(image_url)
+    query_params = parse_qsl(parsed_url.query, keep_blank_values=True)
+    if not any(key == "fl" for key, _ in query_params):
+        return image_url
+    resize = f"res,{width},{height},3|shr,,20|jpg,90"
+    query = urlencode([(key, resize if key == "fl" else value) for key, value in query_params], safe=",|")
+    return urlunparse(parsed_url._replace(query=query))
+
+
+class DiskLRUCache:
+    """
+    Size-bounded cache of blobs on disk. A blob is stored under the SHA-256 of its key:
+        <directory>/<hash[:2]>/<hash>
+    and written atomically (temporary file + os.replace), so several processes can share the directory
+    (the HTTP server reads it, the scraper's prefetch warms it).
+
+    Least recently used blobs are evicted once the cache grows above max_bytes. The last use of a blob is its file
+    modification time, touched on every hit, so the LRU order survives restarts: the index is rebuilt from the
+    directory when the cache is created. Blobs written by another process are adopted into the index on their
+    first hit.
+    """
+
+    def __init__(self, directory: str, max_bytes: int):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.total_bytes = 0
+        self._lock = threading.Lock()
+        # hash -> size, least recently used first
+        self._entries: "OrderedDict[str, int]" = OrderedDict()
+        self._load_index()
+
+    @staticmethod
+    def hash_key(key: str) -> str:
+        return hashlib.sha256(key.encode("utf-8")).hexdigest()
+
+    def path(self, key: str) -> str:
+        digest = self.hash_key(key)
+        return os.path.join(self.directory, digest[:2], digest)
+
+    def __contains__(self, key: str) -> bool:
+        return self.hash_key(key) in self._entries or os.path.exists(self.path(key))
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def get(self, key: str) -> Optional[bytes]:
+        digest, path = self.hash_key(key), self.path(key)
+        try:
+            with open(path, "rb") as file:
+                content = file.read()
+            os.utime(path)
+        except FileNotFoundError:
+            with self._lock:
+                self._forget(digest)
+            return None
+        with self._lock:
+            if digest in self._entries:
+                self._entries.move_to_end(digest)
+            else:
+                self._add(digest, len(content))
+        return content
+
+    def put(self, key: str, content: bytes) -> None:
+        digest, path = self.hash_key(key), self.path(key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), prefix=".tmp-")
+        try:
+            with os.fdopen(fd, "wb") as file:
+                file.write(content)
+            os.replace(tmp_path, path)
+        except BaseException:
+            os.unlink(tmp_path)
+            raise
+        with self._lock:
+            self._forget(digest)
+            self._add(digest, len(content))
+
+    def _add(self, digest: str, size: int) -> None:
+        self._entries[digest] = size
+        self.total_bytes += size
+        self._evict()
+
+    def _forget(self, digest: str) -> None:
+        size = self._entries.pop(digest, None)
+        if size is not None:
+            self.total_bytes -= size
+
+    def _evict(self) -> None:
+        while self.total_bytes > self.max_bytes and len(self._entries) > 1:
+            digest, size = self._entries.popitem(last=False)
+            self.total_bytes -= size
+            try:
+                os.remove(os.path.join(self.directory, digest[:2], digest))
+            except FileNotFoundError:
+                pass
+            logger.debug("Evicted %s (%s bytes) from the image cache", digest, size)
+
+    def _load_index(self) -> None:
+        if not os.path.isdir(self.directory):
+            return
+        entries = []
+        for subdirectory in os.scandir(self.directory):
+            if not subdirectory.is_dir():
+                continue
+            for entry in os.scandir(subdirectory.path):
+                if entry.is_file() and not entry.name.startswith(".tmp-"):
+                    stat = entry.stat()
+                    entries.append((stat.st_mtime, entry.name, stat.st_size))
+        for _, digest, size in sorted(entries):
+            self._entries[digest] = size
+            self.total_bytes += size
+        with self._lock:
+            self._evict()
@@ -0,0 +1,71 @@
+import logging
+import select
+from typing import List
+
+from sqlalchemy import text
+
+from database.factory import SQLAlchemySessionFactory, get_session
+
+logger = logging.getLogger(__name__)
+
+# Sent by the scraper after a crawl wrote flats (scraper.pipelines.SaveToDatabasePipeline)
+FLATS_UPDATED_CHANNEL = "flats_updated"
+
+
+def notify(session_factory: SQLAlchemySessionFactory, channel: str, payload: str = "") -> None:
+    """
+    Send a notification to the listeners of a channel (NOTIFY), delivered when the session commits:
+    https://www.postgresql.org/docs/current/sql-notify.html
+    """
+    with get_session(session_factory) as session:
+        session.execute(text("SELECT pg_notify(:channel, :payload)"), {"channel": channel, "payload": payload})
+
+
+class NotificationListener:
+    """
+    Listens to Postgres notifications (LISTEN) on a dedicated psycopg2 connection of the session factory's engine,
+    detached from its pool: the connection must stay open and in autocommit mode for the notifications to be
+    delivered.
+
+        with NotificationListener(session_factory, FLATS_UPDATED_CHANNEL) as listener:
+            while running:
+                if listener.poll(timeout=1.0):
+                    ...
+
+    poll returns the payloads of the notifications received together, so a burst of notifications is handled once.
+    """
+
+    def __init__(self, session_factory: SQLAlchemySessionFactory, channel: str):
+        self.session_factory = session_factory
+        self.channel = channel
+        self.connection = None
+
+    def __enter__(self) -> "NotificationListener":
+        pooled_connection = self.session_factory.engine.raw_connection()
+        self.connection = pooled_connection.driver_connection
+        pooled_connection.detach()
+        self.connection.autocommit = True
+        with self.connection.cursor() as cursor:
+            cursor.execute(f'LISTEN "{self.channel}"')
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self.close()
+
+    def close(self) -> None:
+        if self.connection is not None:
+            self.connection.close()
+            self.connection = None
+
+    def poll(self, timeout: float) -> List[str]:
+        """
+        Wait up to timeout seconds for notifications.
+        :return: Payloads of the notifications received, empty on timeout.
+        """
+        if not self.connection.notifies:
+            readable, _, _ = select.select([self.connection], [], [], timeout)
+            if readable:
+                self.connection.poll()
+        payloads = [notification.payload for notification in self.connection.notifies]
+        self.connection.notifies.clear()
+        return payloads
@@ -1,26 +1,167 @@
-from typing import List, Tuple
+import base64
+import binascii
+import json
+from typing import List, NamedTuple, Optional, Sequence, Tuple
+
+from sqlalchemy import Column, tuple_
+
 from database.factory import SQLAlchemySessionFactory
+from database.services.row_count import CountProvider, ExactCountProvider, ItemCount
+
+
+class KeysetPage(NamedTuple):
+    """
+    A page of a keyset pagination: its items, its number, the cursors of the previous and next pages (None on
+    the first / last page) and the item count of the listing carried by the cursors (None if it was not given).
+    """
+
+    items: List
+    page_number: int
+    previous_cursor: Optional[str]
+    next_cursor: Optional[str]
+    item_count: Optional[ItemCount] = None
 
 
 class QueryPaginationService:
     """
     The QueryPaginationService class provides a way to paginate database queries.
+
+    By page number (paginate_query), with LIMIT / OFFSET: any page can be requested, but Postgres reads and
+    discards all the rows of the previous pages, so a page costs more the deeper it is.
+
+    By keyset (paginate_query_by_keyset): the query is ordered by a unique sort key (e.g. price, id) and a page
+    starts right after the key of the last row of the previous page, WHERE (price, id) > (:price, :id). With an
+    index on the sort key every page is an index range scan of items_per_page rows, page 2000 costs as much as
+    page 1. Pages are reached through the opaque cursors of their neighbours only. The count of the listing, taken
+    on its first page, is carried by the cursors, so the next pages are not counted again.
+
+    The total number of items of a listing is counted by the count_provider (see CountProvider), an exact
+    SELECT count(*) by default.
     """
 
-    def __init__(self, session_factory: SQLAlchemySessionFactory, items_per_page: int):
+    def __init__(
+        self,
+        session_factory: SQLAlchemySessionFactory,
+        items_per_page: int,
+        count_provider: Optional[CountProvider] = None,
+    ):
         self.session_factory = session_factory
         self.items_per_page = items_per_page
+        self.count_provider = count_provider or ExactCountProvider()
 
-    def paginate_query(self, query, page_number: int) -> Tuple[List, int]:
+    def paginate_query(
+        self, query, page_number: int, count_provider: Optional[CountProvider] = None
+    ) -> Tuple[List, ItemCount]:
         """
         Paginate a query by page number.
-        We calculate the total number of pages and return the items for the given page.
-        :param query:
-        :param page_number:
-        :return:
-        """
-        total_items = query.count()
-        total_pages = (total_items + self.items_per_page - 1) // self.items_per_page
-        offset = query.offset((page_number - 1) * self.items_per_page)
-        items = offset.limit(self.items_per_page).all()
-        return items, total_pages
+        :param count_provider: Counts the items, the count provider of the service by default.
+        :return: The items of the given page and the number of items matching the query. A count that is not exact
+            is corrected on the last page (one row past the page tells whether it is the last one): the items before
+            it and on it are all the items. A lower bound is raised to the items up to the given page.
+        """
+        offset = (page_number - 1) * self.items_per_page
+        rows = query.offset(offset).limit(self.items_per_page + 1).all()
+        items = rows[: self.items_per_page]
+        item_count = (count_provider or self.count_provider).count(query)
+        if not item_count.is_exact:
+            if len(rows) <= self.items_per_page and (items or page_number == 1):
+                item_count = ItemCount(offset + len(items))
+            elif item_count.kind == ItemCount.AT_LEAST and item_count.value < offset + len(items):
+                item_count = ItemCount(offset + len(items), ItemCount.AT_LEAST)
+        return items, item_count
+
+    @staticmethod
+    def encode_cursor(
+        key: Sequence, page_number: int, before: bool = False, item_count: Optional[ItemCount] = None
+    ) -> str:
+        """
+        :param key: Sort key of the row the page starts after (or ends before).
+        :param page_number: Number of the page the cursor leads to.
+        :param before: The page ends before key (a cursor to the previous page).
+        :param item_count: Count of the listing, shown on the page without counting it again.
+        :return: The cursor, URL-safe.
+        """
+        state = {"k": [value if isinstance(value, (int, float)) else str(value) for value in key], "p": page_number}
+        if before:
+            state["b"] = 1
+        if item_count is not None:
+            state["c"] = list(item_count)
+        return base64.urlsafe_b64encode(json.dumps(state, separators=(",", ":")).encode()).decode().rstrip("=")
+
+    @staticmethod
+    def decode_cursor(cursor: str, sort_columns: Sequence[Column]) -> Tuple[tuple, int, bool, Optional[ItemCount]]:
+        """
+        :return: The sort key, the page number, whether the page ends before the key and the item count (None if
+            the cursor carries none).
+        :raises ValueError: The cursor is not a cursor of this sort key.
+        """
+        try:
+            state = json.loads(base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)))
+            values, page_number = state["k"], int(state["p"])
+            if len(values) != len(sort_columns) or page_number < 1:
+                raise ValueError
+            key = tuple(column.type.python_type(value) for column, value in zip(sort_columns, values))
+            item_count = None
+            if "c" in state:
+                value, kind = state["c"]
+                if kind not in (ItemCount.EXACT, ItemCount.ESTIMATE, ItemCount.AT_LEAST):
+                    raise ValueError
+                item_count = ItemCount(int(value), kind)
+        except (binascii.Error, KeyError, TypeError, ValueError, UnicodeDecodeError):
+            raise ValueError("invalid cursor")
+        return key, page_number, bool(state.get("b")), item_count
+
+    def paginate_query_by_keyset(
+        self,
+        query,
+        sort_columns: Sequence[Column],
+        descending: bool = False,
+        cursor: Optional[str] = None,
+        item_count: Optional[ItemCount] = None,
+    ) -> KeysetPage:
+        """
+        Paginate a query by keyset. Rows with a NULL in the sort key must be filtered out of the query.
+        :param query: Query selecting the sort columns (e.g. a query of the mapped class), its ordering is replaced.
+        :param sort_columns: Unique sort key, e.g. (Flat.price, Flat.id), ideally the columns of an index.
+        :param descending: Order by the sort key descending.
+        :param cursor: Cursor of a KeysetPage, None for the first page.
+        :param item_count: Count of the listing to carry in the cursors, if the cursor carries none.
+        :return: The page.
+        :raises ValueError: The cursor is invalid.
+        """
+        key, page_number, before, cursor_count = (
+            (None, 1, False, None) if cursor is None else self.decode_cursor(cursor, sort_columns)
+        )
+        item_count = cursor_count or item_count
+        # A page before the key is read in the reverse order and reversed
+        reverse = descending != before
+        sort_key = tuple_(*sort_columns)
+        if key is not None:
+            query = query.filter(sort_key < tuple_(*key) if reverse else sort_key > tuple_(*key))
+        ordering = [column.desc() if reverse else column for column in sort_columns]
+        rows = query.order_by(None).order_by(*ordering).limit(self.items_per_page + 1).all()
+        has_more = len(rows) > self.items_per_page
+        items = rows[: self.items_per_page]
+        if before:
+            items.reverse()
+
+        def key_of(item) -> tuple:
+            return tuple(getattr(item, column.key) for column in sort_columns)
+
+        has_previous = has_more if before else key is not None
+        has_next = key is not None if before else has_more
+        return KeysetPage(
+            items=items,
+            page_number=page_number,
+            previous_cursor=(
+                self.encode_cursor(key_of(items[0]), max(page_number - 1, 1), before=True, item_count=item_count)
+                if has_previous and items
+                else None
+            ),
+            next_cursor=(
+                self.encode_cursor(key_of(items[-1]), page_number + 1, item_count=item_count)
+                if has_next and items
+                else None
+            ),
+            item_count=item_count,
+        )
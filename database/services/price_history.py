@@ -0,0 +1,108 @@
+import logging
+from datetime import date, datetime
+from typing import List, Optional, Set
+
+from sqlalchemy import BigInteger, bindparam, func, literal, select, text
+from sqlalchemy.dialects.postgresql import ARRAY, insert
+from sqlalchemy.orm import Session
+from sqlalchemy.sql import FromClause
+
+from database.factory import SQLAlchemySessionFactory
+from database.sql_schema import Flat, PriceHistory
+
+logger = logging.getLogger(__name__)
+
+
+def month_start(value: date) -> date:
+    return date(value.year, value.month, 1)
+
+
+def next_month_start(value: date) -> date:
+    return date(value.year + 1, 1, 1) if value.month == 12 else date(value.year, value.month + 1, 1)
+
+
+def partition_name(month: date) -> str:
+    return f"{PriceHistory.__tablename__}_y{month.year:04d}m{month.month:02d}"
+
+
+def create_partition_sql(month: date) -> str:
+    """
+    :param month: Any day of the month.
+    :return: CREATE TABLE statement of the price_history partition holding that month (UTC bounds).
+    """
+    month = month_start(month)
+    return (
+        f"CREATE TABLE IF NOT EXISTS {partition_name(month)} PARTITION OF {PriceHistory.__tablename__} "
+        f"FOR VALUES FROM ('{month.isoformat()} 00:00+00') TO ('{next_month_start(month).isoformat()} 00:00+00')"
+    )
+
+
+class PriceHistoryWriter:
+    """
+    Appends the price changes of a batch of listings to the price_history table in one set-based
+    INSERT ... SELECT statement: the incoming (hash_id, price) pairs are joined with the prices currently stored
+    in flats, and only listings whose price is new or differs get a row. It must run before the batch is
+    upserted into flats, in the same transaction.
+
+    price_history is partitioned by month. prepare() creates the partition of the observed month on first use
+    (CREATE TABLE IF NOT EXISTS ... PARTITION OF) in its own committed transaction, before the write transaction
+    starts, and the partition is remembered for the lifetime of the process. The migration creates no monthly
+    partition, only price_history_default for rows written without prepare(); a month with rows in the default
+    partition cannot get its own partition until they are moved out.
+    """
+
+    _known_partitions: Set[date] = set()
+
+    def __init__(self, session_factory: SQLAlchemySessionFactory):
+        self.session_factory = session_factory
+
+    def prepare(self, observed_at: datetime) -> None:
+        """
+        Make sure the partition for observed_at exists. Call it before opening the write transaction.
+        """
+        month = month_start(observed_at.date())
+        if month in self._known_partitions:
+            return
+        with self.session_factory.engine.begin() as connection:
+            connection.execute(text(create_partition_sql(month)))
+        self._known_partitions.add(month)
+
+    def record_changes(self, session: Session, source: FromClause, observed_at: datetime) -> int:
+        """
+        :param session: Session of the transaction that upserts the batch into flats afterwards.
+        :param source: Selectable with hash_id and price columns (e.g. unnest() of the batch or a staging table).
+        :param observed_at: Timestamp of the new history rows.
+        :return: Number of price changes recorded.
+        """
+        flats = Flat.__table__
+        changed = (
+            select(source.c.hash_id, literal(observed_at, PriceHistory.observed_at.type), source.c.price)
+            .select_from(source.outerjoin(flats, flats.c.hash_id == source.c.hash_id))
+            .where(
+                source.c.hash_id.isnot(None),
+                source.c.price.isnot(None),
+                flats.c.price.is_distinct_from(source.c.price),
+            )
+        )
+        statement = (
+            insert(PriceHistory)
+            .from_select(["hash_id", "observed_at", "price"], changed)
+            .on_conflict_do_nothing(index_elements=["hash_id", "observed_at"])
+        )
+        recorded = session.execute(statement).rowcount
+        logger.debug("Recorded %s price changes", recorded)
+        return recorded
+
+    @staticmethod
+    def build_batch_source(hash_ids: List[Optional[int]], prices: List[Optional[int]]) -> FromClause:
+        """
+        :return: unnest(hash_ids, prices) AS batch(hash_id, price), the whole batch as two array parameters.
+        """
+        return (
+            func.unnest(
+                bindparam("batch_hash_ids", hash_ids, type_=ARRAY(BigInteger)),
+                bindparam("batch_prices", prices, type_=ARRAY(BigInteger)),
+            )
+            .table_valued("hash_id", "price")
+            .render_derived(name="batch")
+        )
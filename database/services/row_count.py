@@ -0,0 +1,188 @@
+import logging
+from abc import ABC, abstractmethod
+from typing import NamedTuple, Optional
+
+from sqlalchemy import Table, text
+from sqlalchemy.dialects.postgresql import insert
+from sqlalchemy.orm import Query, Session
+
+from database.sql_schema import RowCount
+
+logger = logging.getLogger(__name__)
+
+
+class RowCounter:
+    """
+    Row counters of the row_counts table. A writer calls increment() in the transaction that inserts the rows,
+    so the counter commits (or rolls back) with them. The increment is a single-row update: concurrent writers
+    of the table queue on its row lock, call it last, right before the commit.
+
+    Rows deleted outside of the writers (or written before the counter existed) are not counted: refresh()
+    counts the table again.
+    """
+
+    @staticmethod
+    def increment(session: Session, table_name: str, delta: int) -> None:
+        if not delta:
+            return
+        statement = insert(RowCount).values(table_name=table_name, row_count=delta)
+        session.execute(
+            statement.on_conflict_do_update(
+                index_elements=[RowCount.table_name], set_={"row_count": RowCount.row_count + delta}
+            )
+        )
+
+    @staticmethod
+    def retrieve(session: Session, table_name: str) -> Optional[int]:
+        """
+        :return: The counter of the table, None if the table has none.
+        """
+        return session.query(RowCount.row_count).filter(RowCount.table_name == table_name).scalar()
+
+    @staticmethod
+    def refresh(session: Session, table_name: str) -> int:
+        """
+        Set the counter of the table to its number of rows.
+        :return: The number of rows.
+        """
+        row_count = session.execute(text(f'SELECT count(*) FROM "{table_name}"')).scalar()
+        statement = insert(RowCount).values(table_name=table_name, row_count=row_count)
+        session.execute(
+            statement.on_conflict_do_update(index_elements=[RowCount.table_name], set_={"row_count": row_count})
+        )
+        return row_count
+
+
+class ItemCount(NamedTuple):
+    """
+    Number of items of a listing: the exact number, an estimate (about value) or a lower bound (value or more, a
+    count stopped at value).
+    """
+
+    EXACT = "exact"
+    ESTIMATE = "estimate"
+    AT_LEAST = "at_least"
+
+    value: int
+    kind: str = EXACT
+
+    @property
+    def is_exact(self) -> bool:
+        return self.kind == self.EXACT
+
+
+def counted_table(query: Query) -> Optional[Table]:
+    """
+    :return: The table of a query of all the rows of a single table (no WHERE), None for any other query.
+    """
+    statement = query.statement
+    froms = statement.get_final_froms()
+    if statement.whereclause is not None or len(froms) != 1 or not isinstance(froms[0], Table):
+        return None
+    return froms[0]
+
+
+class CountProvider(ABC):
+    """
+    Counts the items of a query for the pagination of a listing (QueryPaginationService):
+    - ExactCountProvider: SELECT count(*), reads every matching row
+    - EstimatedCountProvider: the estimate of the planner, from the table statistics
+    - CachedCountProvider: the row counter of the table kept by its writers (RowCounter), for unfiltered listings
+    - CappedCountProvider: an exact count that stops after max_count rows
+    """
+
+    @abstractmethod
+    def count(self, query: Query) -> ItemCount:
+        """
+        :param query: Query of the items, executed with its session.
+        """
+        raise NotImplementedError
+
+
+class ExactCountProvider(CountProvider):
+    def count(self, query: Query) -> ItemCount:
+        return ItemCount(query.order_by(None).count())
+
+
+class EstimatedCountProvider(CountProvider):
+    """
+    The number of rows the planner expects the query to return: pg_class.reltuples (scaled to the current size of
+    the table) for all the rows of a table, the row estimate of EXPLAIN for a filtered query. Both come from the
+    statistics that ANALYZE (and autovacuum) collect, they cost a catalog lookup or a plan whatever the size of
+    the table.
+
+    Below exact_below rows the estimate is replaced by an exact count, which is cheap at that size.
+    """
+
+    def __init__(self, exact_below: int = 10000):
+        self.exact_below = exact_below
+
+    def count(self, query: Query) -> ItemCount:
+        estimate = self.estimate(query)
+        if estimate < self.exact_below:
+            return ExactCountProvider().count(query)
+        return ItemCount(estimate, ItemCount.ESTIMATE)
+
+    @staticmethod
+    def estimate(query: Query) -> int:
+        session = query.session
+        table = counted_table(query)
+        if table is not None:
+            # Rows per page at the last ANALYZE times the current number of pages, like the planner does
+            reltuples = session.execute(
+                text(
+                    "SELECT CASE WHEN relpages > 0 THEN reltuples / relpages * "
+                    "(pg_relation_size(oid) / current_setting('block_size')::int) ELSE reltuples END::bigint "
+                    "FROM pg_class WHERE oid = to_regclass(:table_name)"
+                ),
+                {"table_name": table.name},
+            ).scalar()
+            # -1 until the table is analyzed for the first time
+            if reltuples is not None and reltuples >= 0:
+                return reltuples
+
+        statement = query.order_by(None).statement.compile(
+            dialect=session.bind.dialect, compile_kwargs={"render_postcompile": True}
+        )
+        (plan,) = session.connection().exec_driver_sql(f"EXPLAIN (FORMAT JSON) {statement}", statement.params).one()
+        return int(plan[0]["Plan"]["Plan Rows"])
+
+
+class CappedCountProvider(CountProvider):
+    """
+    Counts the items exactly up to max_count, "at least max_count" above: an exact count of a large result set
+    costs as much as reading all of it, the capped count reads max_count + 1 rows at most.
+    """
+
+    def __init__(self, max_count: int):
+        self.max_count = max_count
+
+    def count(self, query: Query) -> ItemCount:
+        counted = query.order_by(None).limit(self.max_count + 1).count()
+        if counted > self.max_count:
+            return ItemCount(self.max_count, ItemCount.AT_LEAST)
+        return ItemCount(counted)
+
+
+class CachedCountProvider(CountProvider):
+    """
+    The counter of the table (RowCounter) for a query of all its rows, the fallback provider for a filtered
+    query or a table without a counter.
+    """
+
+    def __init__(self, fallback: Optional[CountProvider] = None):
+        self.fallback = fallback or ExactCountProvider()
+
+    def count(self, query: Query) -> ItemCount:
+        table = counted_table(query)
+        row_count = RowCounter.retrieve(query.session, table.name) if table is not None else None
+        if row_count is None:
+            return self.fallback.count(query)
+        return ItemCount(row_count)
+
+
+COUNT_PROVIDERS = {
+    "exact": ExactCountProvider,
+    "estimate": EstimatedCountProvider,
+    "cached": CachedCountProvider,
+}
@@ -1,17 +1,123 @@
-from sqlalchemy.dialects.postgresql import UUID
-from sqlalchemy import Column, String
-from sqlalchemy.orm import declarative_base
+from sqlalchemy.dialects.postgresql import JSONB, TSVECTOR, UUID
+from sqlalchemy import (
+    BigInteger,
+    Column,
+    Computed,
+    DateTime,
+    Float,
+    Index,
+    Integer,
+    PrimaryKeyConstraint,
+    String,
+    UniqueConstraint,
+    func,
+)
+from sqlalchemy.orm import declarative_base, deferred
 
 
 Base = declarative_base()
 
+# Accented letters of Czech and Slovak and their unaccented forms, for translate(): the unaccent extension is not
+# available everywhere, and translate() is immutable, so it can be used by a generated column
+UNACCENT_FROM = "áäčďéěíĺľňóôöŕřšťúůüýžÁÄČĎÉĚÍĹĽŇÓÔÖŔŘŠŤÚŮÜÝŽ"
+UNACCENT_TO = "aacdeeillnooorrstuuuyzAACDEEILLNOOORRSTUUUYZ"
+SEARCH_VECTOR_EXPRESSION = (
+    f"setweight(to_tsvector('simple', translate(coalesce(title, ''), '{UNACCENT_FROM}', '{UNACCENT_TO}')), 'A') || "
+    f"setweight(to_tsvector('simple', translate(coalesce(locality, ''), '{UNACCENT_FROM}', '{UNACCENT_TO}')), 'B')"
+)
+
 
 class Flat(Base):
+    """
+    A listing. price, area, disposition and locality are typed copies of what the title shows, for filtering and
+    sorting (see database.services.flat_filter.FlatFilter): every index ends with id, the tie-breaker of the
+    orderings, and locality is indexed with varchar_pattern_ops for prefix matches (LIKE 'Praha%').
+
+    lat / lon are the GPS coordinates of the listing and geohash their geohash (database.geohash). geohash has the
+    "C" collation, so its index serves the prefix matches of the map queries (database.services.flat_map).
+
+    search_vector is generated by Postgres from the unaccented title and locality and indexed with GIN for the
+    full-text search (database.services.flat_search).
+    """
+
     __tablename__ = "flats"
+    __table_args__ = (
+        UniqueConstraint("hash_id", name="uq_flats_hash_id"),
+        Index("ix_flats_price", "price", "id"),
+        Index("ix_flats_area", "area", "id"),
+        Index("ix_flats_disposition_price", "disposition", "price", "id"),
+        Index("ix_flats_locality_price", "locality", "price", postgresql_ops={"locality": "varchar_pattern_ops"}),
+        Index("ix_flats_geohash", "geohash"),
+        Index("ix_flats_search_vector", "search_vector", postgresql_using="gin"),
+    )
 
     id = Column(UUID, primary_key=True)
+    hash_id = Column(BigInteger, nullable=True)
     title = Column(String, nullable=False)
     image_url = Column(String, nullable=True)
+    price = Column(BigInteger, nullable=True)
+    area = Column(Integer, nullable=True)
+    disposition = Column(String(16), nullable=True)
+    locality = Column(String, nullable=True)
+    lat = Column(Float, nullable=True)
+    lon = Column(Float, nullable=True)
+    geohash = Column(String(12, collation="C"), nullable=True)
+    fingerprint = Column(String(16), nullable=True)
+    # Deferred: only the search queries need it, the pages of flats do not load it
+    search_vector = deferred(Column(TSVECTOR, Computed(SEARCH_VECTOR_EXPRESSION, persisted=True)))
 
     def __repr__(self):
         return f"<Flat(title={self.title}, image_url={self.image_url})>"
+
+
+class FlatDetail(Base):
+    """
+    Payload of the per-estate detail endpoint (/api/cs/v2/estates/<hash_id>), keyed on the sreality hash_id.
+    list_fingerprint is the fingerprint of the listing on the list endpoint when the detail was fetched.
+    """
+
+    __tablename__ = "flat_details"
+
+    hash_id = Column(BigInteger, primary_key=True)
+    list_fingerprint = Column(String(16), nullable=True)
+    payload = Column(JSONB, nullable=False)
+    fetched_at = Column(DateTime(timezone=True), nullable=False, server_default=func.now())
+
+    def __repr__(self):
+        return f"<FlatDetail(hash_id={self.hash_id}, fetched_at={self.fetched_at})>"
+
+
+class PriceHistory(Base):
+    """
+    Append-only history of listing prices: a row is added only when the price of a listing changes.
+    The table is range-partitioned by month on observed_at (price_history_y<YYYY>m<MM> partitions), see
+    database.services.price_history.PriceHistoryWriter.
+    """
+
+    __tablename__ = "price_history"
+    __table_args__ = (
+        PrimaryKeyConstraint("hash_id", "observed_at", name="pk_price_history"),
+        {"postgresql_partition_by": "RANGE (observed_at)"},
+    )
+
+    hash_id = Column(BigInteger, nullable=False)
+    observed_at = Column(DateTime(timezone=True), nullable=False)
+    price = Column(BigInteger, nullable=False)
+
+    def __repr__(self):
+        return f"<PriceHistory(hash_id={self.hash_id}, observed_at={self.observed_at}, price={self.price})>"
+
+
+class RowCount(Base):
+    """
+    Number of rows of a table, kept up to date by the writers of the table in the transactions that insert the
+    rows (database.services.row_count.RowCounter), so listings can show a total without counting the table.
+    """
+
+    __tablename__ = "row_counts"
+
+    table_name = Column(String(63), primary_key=True)
+    row_count = Column(BigInteger, nullable=False, server_default="0")
+
+    def __repr__(self):
+        return f"<RowCount(table_name={self.table_name}, row_count={self.row_count})>"
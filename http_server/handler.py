@@ -9,13 +9,16 @@ logger = logging.getLogger(__name__)
 class SimpleHTTPRequestHandler(BaseHTTPRequestHandler):
     """
     A simple HTTP request handler that routes requests to the appropriate handler based on the path.
+
+    A view function receives the request handler and returns (content, status) for an HTML response, or
+    (content, status, headers) to set the headers of the response itself (e.g. Content-Type of an image).
     """
 
     router = Router()
 
     @classmethod
-    def add_route(cls, path, view_func):
-        cls.router.add_route(path, view_func)
+    def add_route(cls, path, view_func, prefix=False):
+        cls.router.add_route(path, view_func, prefix=prefix)
 
     def do_GET(self):
         try:
@@ -39,18 +42,22 @@ class SimpleHTTPRequestHandler(BaseHTTPRequestHandler):
 
     def _process_handler(self, handler):
         try:
-            content, status = handler(self)
-            self._send_http_response(content, status=status)
+            content, status, *headers = handler(self)
+            self._send_http_response(content, status=status, headers=headers[0] if headers else None)
         except Exception as e:
             logger.exception("Error processing view function at path %s: %s", self.path, e)
             self._send_http_error(HTTPStatus.INTERNAL_SERVER_ERROR, "Internal Server Error")
 
-    def _send_http_response(self, content, status=HTTPStatus.OK, content_type="text/html"):
+    def _send_http_response(self, content, status=HTTPStatus.OK, content_type="text/html", headers=None):
+        body = content.encode("utf-8") if isinstance(content, str) else content
+        headers = dict(headers or {})
         self.send_response(status)
-        self.send_header("Content-type", f"{content_type}; charset=utf-8")
+        self.send_header("Content-type", headers.pop("Content-Type", f"{content_type}; charset=utf-8"))
+        for name, value in headers.items():
+            self.send_header(name, value)
         self.end_headers()
-        if content:
-            self.wfile.write(content.encode("utf-8") if isinstance(content, str) else content)
+        if body:
+            self.wfile.write(body)
 
     def _send_http_error(self, status, message=""):
         self.send_error(status, message)
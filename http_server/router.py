@@ -1,17 +1,32 @@
-from typing import Callable, Dict
+from typing import Callable, Dict, Optional
+from urllib.parse import urlsplit
 
 
 class Router:
     """
     A simple router that maps paths to handlers. The router is used by the RequestHandler
     to find the appropriate handler for a given path.
+
+    Routes match the path without its query string. A prefix route (e.g. "/img/") matches every path that starts
+    with the prefix, exact routes take precedence and the longest matching prefix wins.
     """
 
     def __init__(self):
         self.routes: Dict[str, Callable] = {}
+        self.prefix_routes: Dict[str, Callable] = {}
 
-    def add_route(self, path: str, handler: Callable) -> None:
-        self.routes[path] = handler
+    def add_route(self, path: str, handler: Callable, prefix: bool = False) -> None:
+        if prefix:
+            self.prefix_routes[path] = handler
+        else:
+            self.routes[path] = handler
 
-    def get_handler(self, path: str) -> Callable:
-        return self.routes.get(path, None)
+    def get_handler(self, path: str) -> Optional[Callable]:
+        path = urlsplit(path).path
+        handler = self.routes.get(path)
+        if handler is not None:
+            return handler
+        for prefix in sorted(self.prefix_routes, key=len, reverse=True):
+            if path.startswith(prefix):
+                return self.prefix_routes[prefix]
+        return None
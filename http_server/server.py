@@ -1,7 +1,7 @@
 import logging
 import signal
 import threading
-from http.server import HTTPServer
+from http.server import ThreadingHTTPServer
 from typing import Type
 
 from http_server.config import ServerConfig
@@ -10,17 +10,17 @@ from http_server.handler import SimpleHTTPRequestHandler
 logger = logging.getLogger(__name__)
 
 
-class SimpleHTTPServer(HTTPServer):
+class SimpleHTTPServer(ThreadingHTTPServer):
     """
     A simple HTTP server that runs on a given host and port and uses a given request handler class.
-    Based on the HTTPServer class from the Python standard library.
+    Based on the ThreadingHTTPServer class from the Python standard library.
 
     - host: The host to listen on.
     - port: The port to listen on.
     - handler_cls: The request handler class to use. - RequestHandler
 
-    HTTPServer handles requests synchronously.
-    SimpleHTTPServer handles multiple requests simultaneously via threading.
+    Every request is handled in its own (daemon) thread, so a slow request (e.g. an /img/ thumbnail fetched from
+    the image CDN) does not hold back the others. The views therefore must be thread-safe.
     """
 
     def __init__(self, config: ServerConfig, handler_cls: Type[SimpleHTTPRequestHandler], handle_signals: bool = True):
@@ -1,4 +1,9 @@
+import uuid
+
 SPIDER_NAME = "sreality"
 SREALITY_DOMAIN_NAME = "sreality.cz"
 SREALITY_DOMAIN = "https://www.sreality.cz"
 SREALITY_API_URL = "https://www.sreality.cz/api/cs/v2/estates"
+
+# Namespace for deterministic flat ids: uuid5(FLAT_ID_NAMESPACE, str(hash_id))
+FLAT_ID_NAMESPACE = uuid.uuid5(uuid.NAMESPACE_DNS, SREALITY_DOMAIN_NAME)
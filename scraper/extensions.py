@@ -0,0 +1,170 @@
+import logging
+import time
+from typing import Optional
+
+from scrapy import signals
+from scrapy.exceptions import NotConfigured
+from twisted.internet import task
+from twisted.web.resource import Resource
+from twisted.web.server import Site
+
+from scraper.pipelines import SaveToDatabasePipeline
+from scraper.services.metrics import CRAWL_METRICS, CrawlMetrics
+
+logger = logging.getLogger(__name__)
+
+
+class PrometheusMetricsResource(Resource):
+    """
+    twisted.web resource serving a CrawlMetrics registry in the Prometheus text format.
+    """
+
+    isLeaf = True
+
+    def __init__(self, metrics: CrawlMetrics):
+        super().__init__()
+        self.metrics = metrics
+
+    def render_GET(self, request) -> bytes:
+        request.setHeader(b"Content-Type", b"text/plain; version=0.0.4; charset=utf-8")
+        return self.metrics.render_prometheus().encode("utf-8")
+
+
+class CrawlMetricsExtension:
+    """
+    Extension that measures where the time of a crawl goes, to find the bottleneck before tuning anything:
+    - latency histograms per stage (see CrawlMetrics): download, decode, extract, validate and the batch writes
+      of the database pipelines
+    - throughput: items/sec and response bytes/sec, over the last interval and over the whole crawl
+    - queue depths: requests in the scheduler, downloads in progress, responses waiting for the spider, items in
+      the item pipelines, and items buffered / batches pending in every SaveToDatabasePipeline
+
+    Every CRAWL_METRICS_INTERVAL seconds and when the spider closes, the figures are written to the crawl stats
+    (metrics/*: count, total, mean, p50, p90 and p99 in seconds per stage). With CRAWL_METRICS_PORT set, the
+    metrics are also served in the Prometheus text format on http://CRAWL_METRICS_HOST:CRAWL_METRICS_PORT/metrics.
+
+    Settings:
+    - CRAWL_METRICS_ENABLED: True by default
+    - CRAWL_METRICS_INTERVAL: seconds between two updates of the stats and the gauges, 10.0 by default
+    - CRAWL_METRICS_PORT: port of the Prometheus endpoint, 0 (no endpoint) by default
+    - CRAWL_METRICS_HOST: interface of the Prometheus endpoint, 127.0.0.1 by default
+    """
+
+    STAGE_QUANTILES = {"p50": 0.5, "p90": 0.9, "p99": 0.99}
+
+    def __init__(self, crawler, interval=10.0, port=0, host="127.0.0.1", metrics: CrawlMetrics = CRAWL_METRICS):
+        self.crawler = crawler
+        self.stats = crawler.stats
+        self.interval = interval
+        self.port = port
+        self.host = host
+        self.metrics = metrics
+        self.loop: Optional[task.LoopingCall] = None
+        self.listening_port = None
+        self.started_at: Optional[float] = None
+        self.last_tick: Optional[float] = None
+        self.last_items = 0
+        self.last_bytes = 0
+
+    @classmethod
+    def from_crawler(cls, crawler):
+        settings = crawler.settings
+        if not settings.getbool("CRAWL_METRICS_ENABLED", True):
+            raise NotConfigured
+        extension = cls(
+            crawler,
+            interval=settings.getfloat("CRAWL_METRICS_INTERVAL", 10.0),
+            port=settings.getint("CRAWL_METRICS_PORT", 0),
+            host=settings.get("CRAWL_METRICS_HOST", "127.0.0.1"),
+        )
+        crawler.signals.connect(extension.spider_opened, signal=signals.spider_opened)
+        crawler.signals.connect(extension.spider_closed, signal=signals.spider_closed)
+        crawler.signals.connect(extension.response_received, signal=signals.response_received)
+        crawler.signals.connect(extension.item_scraped, signal=signals.item_scraped)
+        return extension
+
+    def spider_opened(self, spider):
+        from twisted.internet import reactor
+
+        self.metrics.reset()
+        self.started_at = self.last_tick = time.monotonic()
+        self.loop = task.LoopingCall(self.update)
+        self.loop.start(self.interval, now=False)
+        if self.port:
+            root = Resource()
+            root.putChild(b"metrics", PrometheusMetricsResource(self.metrics))
+            self.listening_port = reactor.listenTCP(self.port, Site(root), interface=self.host)
+            logger.info("Serving crawl metrics on http://%s:%s/metrics", self.host, self.port)
+
+    def spider_closed(self, spider, reason):
+        if self.loop is not None and self.loop.running:
+            self.loop.stop()
+        self.update()
+        elapsed = time.monotonic() - self.started_at if self.started_at is not None else 0.0
+        if elapsed > 0:
+            self.stats.set_value("metrics/items_per_second", round(self.items_total / elapsed, 2))
+            self.stats.set_value("metrics/bytes_per_second", round(self.bytes_total / elapsed, 2))
+        if self.listening_port is not None:
+            return self.listening_port.stopListening()
+
+    def response_received(self, response, request, spider):
+        self.metrics.inc("responses_total")
+        self.metrics.inc("response_bytes_total", len(response.body))
+        # Responses served by the HTTP cache were not downloaded
+        latency = request.meta.get("download_latency")
+        if latency is not None and "cached" not in response.flags:
+            self.metrics.observe("download", latency)
+
+    def item_scraped(self, item, response, spider):
+        self.metrics.inc("items_total")
+
+    @property
+    def items_total(self) -> float:
+        return self.metrics.counter_value("items_total")
+
+    @property
+    def bytes_total(self) -> float:
+        return self.metrics.counter_value("response_bytes_total")
+
+    def update(self) -> None:
+        """
+        Refresh the throughput and queue depth gauges and copy the stage latencies to the crawl stats.
+        """
+        now = time.monotonic()
+        elapsed = now - self.last_tick if self.last_tick is not None else 0.0
+        if elapsed > 0:
+            self.metrics.set_gauge("items_per_second", (self.items_total - self.last_items) / elapsed)
+            self.metrics.set_gauge("bytes_per_second", (self.bytes_total - self.last_bytes) / elapsed)
+        self.last_tick, self.last_items, self.last_bytes = now, self.items_total, self.bytes_total
+
+        self.update_queue_depths()
+
+        for stage, histogram in list(self.metrics.histograms.items()):
+            self.stats.set_value(f"metrics/{stage}/count", histogram.count)
+            self.stats.set_value(f"metrics/{stage}/total", round(histogram.sum, 6))
+            self.stats.set_value(f"metrics/{stage}/mean", round(histogram.mean, 6))
+            for name, q in self.STAGE_QUANTILES.items():
+                self.stats.set_value(f"metrics/{stage}/{name}", round(histogram.quantile(q), 6))
+
+    def update_queue_depths(self) -> None:
+        engine = self.crawler.engine
+        if engine is None or engine.slot is None:
+            return
+        depths = {
+            "scheduler_requests": len(engine.slot.scheduler),
+            "downloader_active": len(engine.downloader.active),
+            "spider_responses": len(engine.scraper.slot.queue) + len(engine.scraper.slot.active)
+            if engine.scraper.slot
+            else 0,
+            "itemproc_items": engine.scraper.slot.itemproc_size if engine.scraper.slot else 0,
+        }
+        for name, depth in depths.items():
+            self.metrics.set_gauge(f"queue_{name}", depth)
+            self.stats.max_value(f"metrics/queue/{name}_max", depth)
+
+        for pipeline in engine.scraper.itemproc.middlewares:
+            if isinstance(pipeline, SaveToDatabasePipeline):
+                buffered, pending = len(pipeline.items_to_insert), len(pipeline.writes_in_progress)
+                self.metrics.set_gauge("pipeline_buffered_items", buffered, pipeline=pipeline.stats_prefix)
+                self.metrics.set_gauge("pipeline_pending_batches", pending, pipeline=pipeline.stats_prefix)
+                self.stats.max_value(f"metrics/{pipeline.stats_prefix}/pending_batches_max", pending)
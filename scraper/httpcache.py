@@ -0,0 +1,144 @@
+import hashlib
+import logging
+import os
+from urllib.parse import parse_qsl, urlencode, urlparse, urlunparse
+
+from dotenv import load_dotenv
+from scrapy import Request, Spider
+from scrapy.extensions.httpcache import DummyPolicy, FilesystemCacheStorage, RFC2616Policy
+
+load_dotenv()
+
+logger = logging.getLogger(__name__)
+
+# Response flag set on a cached response that the API confirmed with 304 Not Modified
+NOT_MODIFIED_FLAG = "not_modified"
+
+
+class HttpCacheConfig:
+    """
+    HTTP cache configuration of the sreality spider:
+    - mode: one of MODES, "off" by default
+        - "off": no cache, every request goes to the API
+        - "record": responses are served from the cache when recorded, otherwise fetched and recorded
+        - "replay": responses are served only from the cache, requests that were not recorded are dropped,
+          so a crawl runs fully offline and deterministic (benchmarks)
+        - "revalidate": every request is sent with the validators of the recorded response (If-None-Match /
+          If-Modified-Since). On 304 Not Modified the recorded response is used and the spider skips parsing it.
+    - directory: cache directory, relative paths are placed in the project data dir (.scrapy): httpcache by default.
+    """
+
+    MODES = ("off", "record", "replay", "revalidate")
+    # Throttling and server errors are never recorded, a replay must not serve them
+    IGNORED_HTTP_CODES = [429, 500, 502, 503, 504]
+
+    def __init__(self, mode: str, directory: str):
+        self.mode = mode
+        self.directory = directory
+        self.validate_config()
+
+    def validate_config(self):
+        if self.mode not in self.MODES:
+            raise ValueError(f"Unknown HTTP cache mode {self.mode!r}, expected one of: {', '.join(self.MODES)}")
+
+    @classmethod
+    def from_env(cls) -> "HttpCacheConfig":
+        mode = os.environ.get("SREALITY_HTTPCACHE_MODE", "off").lower()
+        directory = os.environ.get("SREALITY_HTTPCACHE_DIR", "httpcache")
+        return cls(mode, directory)
+
+    def to_settings(self) -> dict:
+        """
+        :return: Scrapy settings enabling the HttpCacheMiddleware in the configured mode.
+        """
+        if self.mode == "off":
+            return {"HTTPCACHE_ENABLED": False}
+        return {
+            "HTTPCACHE_ENABLED": True,
+            "HTTPCACHE_MODE": self.mode,
+            "HTTPCACHE_DIR": self.directory,
+            "HTTPCACHE_EXPIRATION_SECS": 0,
+            "HTTPCACHE_IGNORE_MISSING": self.mode == "replay",
+            "HTTPCACHE_IGNORE_HTTP_CODES": self.IGNORED_HTTP_CODES,
+            "HTTPCACHE_STORAGE": "scraper.httpcache.SrealityCacheStorage",
+            "HTTPCACHE_POLICY": "scraper.httpcache.SrealityCachePolicy",
+        }
+
+
+def normalize_api_url(url: str) -> str:
+    """
+    Normalize an API URL for cache lookups: lowercase scheme and host, no fragment, query parameters sorted and
+    without the parameters that do not change the response (the tms cache buster the website adds).
+    :param url: The API URL.
+    :return: The normalized URL.
+    """
+    parsed_url = urlparse(url)
+    query_params = sorted(
+        (key, value) for key, value in parse_qsl(parsed_url.query, keep_blank_values=True) if key not in {"tms"}
+    )
+    return urlunparse(
+        parsed_url._replace(
+            scheme=parsed_url.scheme.lower(),
+            netloc=parsed_url.netloc.lower(),
+            query=urlencode(query_params),
+            fragment="",
+        )
+    )
+
+
+class SrealityCacheStorage(FilesystemCacheStorage):
+    """
+    Filesystem cache storage keyed on the normalized API URL instead of the request fingerprint, so the same page
+    is found again whatever the parameter order or headers of the request (e.g. the validators sent on
+    revalidation). Recordings are grouped by category for easy inspection:
+        <HTTPCACHE_DIR>/<spider>/<category_main_cb>-<category_type_cb>/page-<page>-<hash of the normalized URL>
+    """
+
+    def _get_request_path(self, spider: Spider, request: Request) -> str:
+        normalized_url = normalize_api_url(request.url)
+        query_params = dict(parse_qsl(urlparse(normalized_url).query))
+        category = f"{query_params.get('category_main_cb', 'any')}-{query_params.get('category_type_cb', 'any')}"
+        key = hashlib.sha1(normalized_url.encode("utf-8")).hexdigest()[:16]
+        return os.path.join(self.cachedir, spider.name, category, f"page-{query_params.get('page', '1')}-{key}")
+
+
+class SrealityCachePolicy:
+    """
+    Cache policy for the modes of HttpCacheConfig (HTTPCACHE_MODE setting):
+    - record / replay: recorded responses are always fresh (scrapy DummyPolicy)
+    - revalidate: recorded responses are never fresh, so every request carries their validators (scrapy
+      RFC2616Policy). A recorded response confirmed by 304 Not Modified gets the NOT_MODIFIED_FLAG.
+    """
+
+    def __init__(self, settings):
+        self.mode = settings.get("HTTPCACHE_MODE", "record")
+        self.dummy_policy = DummyPolicy(settings)
+        self.rfc2616_policy = RFC2616Policy(settings)
+
+    @property
+    def revalidate(self) -> bool:
+        return self.mode == "revalidate"
+
+    def should_cache_request(self, request: Request) -> bool:
+        if self.revalidate:
+            return self.rfc2616_policy.should_cache_request(request)
+        return self.dummy_policy.should_cache_request(request)
+
+    def should_cache_response(self, response, request: Request) -> bool:
+        if self.revalidate:
+            return self.rfc2616_policy.should_cache_response(response, request)
+        return self.dummy_policy.should_cache_response(response, request)
+
+    def is_cached_response_fresh(self, cachedresponse, request: Request) -> bool:
+        if self.revalidate:
+            self.rfc2616_policy._set_conditional_validators(request, cachedresponse)
+            return False
+        return True
+
+    def is_cached_response_valid(self, cachedresponse, response, request: Request) -> bool:
+        if not self.revalidate:
+            return True
+        if response.status == 304:
+            cachedresponse.flags.append(NOT_MODIFIED_FLAG)
+            return True
+        return self.rfc2616_policy.is_cached_response_valid(cachedresponse, response, request)
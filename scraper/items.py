@@ -4,10 +4,28 @@ import scrapy
 class PageItem(scrapy.Item):
     """
     The PageItem is a class that represents a scraped item from the sreality.cz website.
-    The item has two fields:
+    The item has eleven fields:
+    - hash_id: stable identifier of the listing on sreality.cz
     - title: title of the listing (e.g. "2+kk, 50m²")
     - image_url: url of the listing's image
+    - price: price of the listing in CZK
+    - area: floor area of the listing in m²
+    - disposition: layout of the flat (e.g. "2+kk")
+    - locality: locality of the listing (e.g. "Praha 6 - Bubeneč")
+    - lat / lon: GPS coordinates of the listing
+    - geohash: geohash of the coordinates (database.geohash)
+    - fingerprint: hash of the listing's fields on the list endpoint
     """
 
+    hash_id = scrapy.Field()
+
     title = scrapy.Field()
     image_url = scrapy.Field()
+    price = scrapy.Field()
+    area = scrapy.Field()
+    disposition = scrapy.Field()
+    locality = scrapy.Field()
+    lat = scrapy.Field()
+    lon = scrapy.Field()
+    geohash = scrapy.Field()
+    fingerprint = scrapy.Field()
@@ -1,8 +1,16 @@
+import logging
+from typing import Dict, Optional
+
 from scrapy import signals
+from scrapy.exceptions import NotConfigured
 
 # useful for handling different item types with a single interface
 from itemadapter import is_item, ItemAdapter
 
+from scraper.services.concurrency import AimdConcurrencyController, ConcurrencyDecision, parse_retry_after
+
+logger = logging.getLogger(__name__)
+
 
 class ScraperSpiderMiddleware:
     # Not all methods need to be defined. If a method is not defined,
@@ -50,47 +58,115 @@ class ScraperSpiderMiddleware:
 
 
 class ScraperDownloaderMiddleware:
-    # Not all methods need to be defined. If a method is not defined,
-    # scrapy acts as if the downloader middleware does not modify the
-    # passed objects.
+    """
+    Downloader middleware that adapts the concurrency of every download slot (domain) to what the API tolerates,
+    using an AimdConcurrencyController per slot:
+    - the concurrency grows by one after every window of healthy responses
+    - it is halved when the p90 latency of a window exceeds ADAPTIVE_CONCURRENCY_TARGET_LATENCY or too many
+      responses are throttled (429), failed (5xx) or timed out
+    - a Retry-After header halves it immediately and sets the slot's download delay to the requested wait
+
+    The decisions are written to the crawl stats (adaptive_concurrency/*).
+
+    The middleware must run before RetryMiddleware (550) sees the responses, so that throttled and failed
+    responses are observed before they are retried: it is enabled with an order between 550 and 590, e.g. 560.
+    It replaces AutoThrottle, do not enable both.
+
+    Settings:
+    - ADAPTIVE_CONCURRENCY_ENABLED: True by default
+    - ADAPTIVE_CONCURRENCY_MIN / ADAPTIVE_CONCURRENCY_MAX: concurrency bounds per slot, 1 and 16 by default.
+      The start value is CONCURRENT_REQUESTS_PER_DOMAIN. The spider's concurrent_pages also caps the number
+      of page requests in flight. A slot with its own concurrency in DOWNLOAD_SLOTS never grows above it.
+    - ADAPTIVE_CONCURRENCY_TARGET_LATENCY: p90 latency (seconds) above which the concurrency is decreased, 1.0
+    - ADAPTIVE_CONCURRENCY_MAX_ERROR_RATE: share of errors above which the concurrency is decreased, 0.05
+    - ADAPTIVE_CONCURRENCY_WINDOW: number of responses per evaluation window, 20
+    - ADAPTIVE_CONCURRENCY_MAX_DELAY: maximum delay set from a Retry-After header (seconds), 60
+    """
+
+    def __init__(self, crawler, settings):
+        self.crawler = crawler
+        self.stats = crawler.stats
+        self.controller_options = dict(
+            min_concurrency=settings.getint("ADAPTIVE_CONCURRENCY_MIN", 1),
+            max_concurrency=settings.getint("ADAPTIVE_CONCURRENCY_MAX", 16),
+            target_latency=settings.getfloat("ADAPTIVE_CONCURRENCY_TARGET_LATENCY", 1.0),
+            max_error_rate=settings.getfloat("ADAPTIVE_CONCURRENCY_MAX_ERROR_RATE", 0.05),
+            window=settings.getint("ADAPTIVE_CONCURRENCY_WINDOW", 20),
+            max_delay=settings.getfloat("ADAPTIVE_CONCURRENCY_MAX_DELAY", 60.0),
+        )
+        self.slot_settings = settings.getdict("DOWNLOAD_SLOTS")
+        self.controllers: Dict[str, AimdConcurrencyController] = {}
 
     @classmethod
     def from_crawler(cls, crawler):
-        # This method is used by Scrapy to create your spiders.
-        s = cls()
+        if not crawler.settings.getbool("ADAPTIVE_CONCURRENCY_ENABLED", True):
+            raise NotConfigured
+        s = cls(crawler, crawler.settings)
         crawler.signals.connect(s.spider_opened, signal=signals.spider_opened)
         return s
 
     def process_request(self, request, spider):
-        # Called for each request that goes through the downloader
-        # middleware.
-
-        # Must either:
-        # - return None: continue processing this request
-        # - or return a Response object
-        # - or return a Request object
-        # - or raise IgnoreRequest: process_exception() methods of
-        #   installed downloader middleware will be called
         return None
 
     def process_response(self, request, response, spider):
-        # Called with the response returned from the downloader.
-
-        # Must either;
-        # - return a Response object
-        # - return a Request object
-        # - or raise IgnoreRequest
+        # Responses served by the HTTP cache say nothing about the API
+        if "cached" not in response.flags:
+            retry_after = parse_retry_after(response.headers.get(b"Retry-After"))
+            self.observe(request, request.meta.get("download_latency"), response.status, retry_after)
         return response
 
     def process_exception(self, request, exception, spider):
-        # Called when a download handler or a process_request()
-        # (from other downloader middleware) raises an exception.
-
-        # Must either:
-        # - return None: continue processing this exception
-        # - return a Response object: stops process_exception() chain
-        # - return a Request object: stops process_exception() chain
-        pass
+        self.observe(request, latency=None, status=None)
+
+    def observe(self, request, latency: Optional[float], status: Optional[int], retry_after=None) -> None:
+        slot_key, slot = self.get_slot(request)
+        if slot is None:
+            return
+
+        controller = self.controllers.get(slot_key)
+        if controller is None:
+            controller = self.create_controller(slot_key, slot)
+            self.controllers[slot_key] = controller
+
+        decision = controller.observe(latency, status, retry_after)
+        if decision is not None:
+            self.apply_decision(slot_key, slot, decision)
+
+    def create_controller(self, slot_key: str, slot) -> AimdConcurrencyController:
+        options = dict(self.controller_options)
+        # The concurrency configured for a slot in DOWNLOAD_SLOTS is an upper limit, the controller may only go below
+        configured = self.slot_settings.get(slot_key, {}).get("concurrency")
+        if configured is not None:
+            options["max_concurrency"] = min(options["max_concurrency"], configured)
+        return AimdConcurrencyController(slot.concurrency, base_delay=slot.delay, **options)
+
+    def get_slot(self, request):
+        slot_key = request.meta.get("download_slot")
+        downloader = getattr(self.crawler.engine, "downloader", None)
+        if slot_key is None or downloader is None:
+            return slot_key, None
+        return slot_key, downloader.slots.get(slot_key)
+
+    def apply_decision(self, slot_key: str, slot, decision: ConcurrencyDecision) -> None:
+        slot.concurrency = decision.concurrency
+        slot.delay = decision.delay
+
+        self.stats.inc_value(f"adaptive_concurrency/{decision.action}")
+        self.stats.set_value(f"adaptive_concurrency/{slot_key}/concurrency", decision.concurrency)
+        self.stats.max_value(f"adaptive_concurrency/{slot_key}/concurrency_max", decision.concurrency)
+        self.stats.set_value(f"adaptive_concurrency/{slot_key}/delay", decision.delay)
+        self.stats.set_value(f"adaptive_concurrency/{slot_key}/p90_latency_ms", round(decision.p90_latency * 1000))
+
+        log = logger.info if decision.action in ("decrease", "retry_after") else logger.debug
+        log(
+            "%s: %s concurrency to %s, delay %.2fs (p90 latency %.0f ms, error rate %.0f%%)",
+            slot_key,
+            decision.action,
+            decision.concurrency,
+            decision.delay,
+            decision.p90_latency * 1000,
+            decision.error_rate * 100,
+        )
 
     def spider_opened(self, spider):
         spider.logger.info("Spider opened: %s" % spider.name)
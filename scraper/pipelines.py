@@ -1,9 +1,20 @@
 import logging
+import time
+from typing import List, Optional, Set
+
+from twisted.internet import defer, task, threads
+from twisted.python.failure import Failure
+from twisted.python.threadpool import ThreadPool
 
 from database.factory import SQLAlchemySessionFactory
-from database.services.flat import FlatDataWriter
+from database.services.base import BaseDatabaseWriter
+from database.services.flat import FlatCopyWriter, FlatDataWriter, UpsertResult
+from database.services.flat_detail import FlatDetailWriter
+from database.services.notifications import FLATS_UPDATED_CHANNEL, notify
 
-from scraper.services.schema import FlatItemModel
+from scraper.services.metrics import CRAWL_METRICS
+from scraper.services.schema import FlatDetailItemModel, FlatItemModel
+from scraper.signals import batch_failed, batch_flushed, writes_pending
 
 logger = logging.getLogger(__name__)
 
@@ -14,16 +25,59 @@ class SaveToDatabasePipeline:
     - title: title of the flat listing
     - image_url: url of the flat listing's image
 
-    For optimization purposes, we are using bulk_create() method to save all the items at once:
-    https://docs.sqlalchemy.org/en/20/orm/large_collections.html#bulk-insert-of-new-items
+    Items are buffered and written in batches of bulk_insert_size by the writer selected with the DATABASE_WRITER
+    setting:
+    - "upsert" (default): FlatDataWriter, one INSERT ... ON CONFLICT statement per batch
+    - "copy": FlatCopyWriter, COPY into a staging table merged into flats (DATABASE_COPY_USE_STAGING=False copies
+      straight into flats, for loading an empty table)
 
-    In init(), we create a new session. This session is then used in process_item() to save the items to the database.
+    The batches are written by a dedicated thread pool (DATABASE_WRITER_THREADS threads), so the reactor keeps
+    downloading and parsing while Postgres commits:
+    - a batch is flushed when bulk_insert_size items are buffered or, on a slow crawl, when the oldest buffered
+      item waits longer than DATABASE_FLUSH_INTERVAL seconds
+    - at most DATABASE_MAX_PENDING_BATCHES batches are queued or being written. When the database falls behind,
+      process_item returns a Deferred that fires once the batch is accepted; Scrapy does not feed the pipeline
+      more items until then, which slows the crawl down to the speed of the database (backpressure)
+    - close_spider flushes the buffer and returns a Deferred that fires after every batch was written
+    - the batch_flushed signal (scraper.signals) is sent after every committed batch, e.g. for crawl checkpoints,
+      and batch_failed after a batch that failed. pending_writes() answers the writes_pending signal
+    - when the spider closes after writing items, a notification is sent on notify_channel (Postgres NOTIFY), so
+      the HTTP server rebuilds the indexes it keeps in memory (app.services.autocomplete)
     """
 
-    def __init__(self, session_factory: SQLAlchemySessionFactory, bulk_insert_size=100):
+    WRITERS = {"upsert": FlatDataWriter, "copy": FlatCopyWriter}
+    # Items saved by this pipeline, other known items are passed on to the next pipeline
+    item_class = FlatItemModel
+    stats_prefix = "database"
+    notify_channel: Optional[str] = FLATS_UPDATED_CHANNEL
+
+    def __init__(
+        self,
+        session_factory: SQLAlchemySessionFactory,
+        bulk_insert_size=100,
+        writer: Optional[BaseDatabaseWriter] = None,
+        writer_threads=2,
+        max_pending_batches=4,
+        flush_interval=5.0,
+        stats=None,
+        signals=None,
+    ):
         self.session_factory = session_factory
         self.bulk_insert_size = bulk_insert_size
+        self.writer = writer or FlatDataWriter(session_factory)
+        self.writer_threads = writer_threads
+        self.flush_interval = flush_interval
+        self.stats = stats
+        self.signals = signals
         self.items_to_insert = []
+        self.items_in_progress = 0
+        self.first_buffered_at: Optional[float] = None
+        self.batches_written = 0
+
+        self.pending_batches = defer.DeferredSemaphore(max_pending_batches)
+        self.writes_in_progress: Set[defer.Deferred] = set()
+        self.thread_pool: Optional[ThreadPool] = None
+        self.flush_loop: Optional[task.LoopingCall] = None
 
     @classmethod
     def from_crawler(cls, crawler):
@@ -31,25 +85,199 @@ class SaveToDatabasePipeline:
         if not db_url:
             raise ValueError("Database URL not found in settings")
         session_factory = SQLAlchemySessionFactory(db_url)
-        return cls(session_factory=session_factory)
+        bulk_insert_size = crawler.settings.getint("DATABASE_BULK_INSERT_SIZE", 100)
+        pipeline = cls(
+            session_factory=session_factory,
+            bulk_insert_size=bulk_insert_size,
+            writer=cls.create_writer(crawler.settings, session_factory, bulk_insert_size),
+            writer_threads=crawler.settings.getint("DATABASE_WRITER_THREADS", 2),
+            max_pending_batches=crawler.settings.getint("DATABASE_MAX_PENDING_BATCHES", 4),
+            flush_interval=crawler.settings.getfloat("DATABASE_FLUSH_INTERVAL", 5.0),
+            stats=crawler.stats,
+            signals=crawler.signals,
+        )
+        crawler.signals.connect(pipeline.pending_writes, signal=writes_pending)
+        return pipeline
+
+    @classmethod
+    def create_writer(cls, settings, session_factory: SQLAlchemySessionFactory, bulk_insert_size: int):
+        writer_name = settings.get("DATABASE_WRITER", "upsert")
+        if writer_name not in cls.WRITERS:
+            raise ValueError(f"Unknown DATABASE_WRITER {writer_name!r}, expected one of: {', '.join(cls.WRITERS)}")
+        if writer_name == "copy":
+            return FlatCopyWriter(
+                session_factory,
+                bulk_insert_size=bulk_insert_size,
+                use_staging=settings.getbool("DATABASE_COPY_USE_STAGING", True),
+            )
+        return FlatDataWriter(session_factory)
+
+    def open_spider(self, spider):
+        from twisted.internet import reactor
+
+        self.thread_pool = ThreadPool(minthreads=1, maxthreads=self.writer_threads, name="database-writer")
+        self.thread_pool.start()
+        # The worker threads would keep the process alive if the reactor stops before close_spider
+        reactor.addSystemEventTrigger("during", "shutdown", self._stop_thread_pool, None)
+        if self.flush_interval > 0:
+            self.flush_loop = task.LoopingCall(self.flush_stale_items)
+            self.flush_loop.start(self.flush_interval, now=False)
 
     def process_item(self, item, spider):
-        if isinstance(item, FlatItemModel):
+        if isinstance(item, self.item_class):
+            if not self.items_to_insert:
+                self.first_buffered_at = time.monotonic()
             self.items_to_insert.append(item)
 
             if len(self.items_to_insert) >= self.bulk_insert_size:
-                self.insert_items()
+                accepted = self.insert_items()
+                if not accepted.called:
+                    # All writer slots are busy: hold the item back until the batch is accepted
+                    if self.stats:
+                        self.stats.inc_value(f"{self.stats_prefix}/backpressure_waits")
+                    return accepted.addCallback(lambda _: item)
 
+            return item
+        elif isinstance(item, (FlatItemModel, FlatDetailItemModel)):
             return item
         else:
             logger.error("Item ignored: %s. This item is not an instance of PageItem", item)
             return item
 
-    def insert_items(self):
-        db_service = FlatDataWriter(self.session_factory)
-        db_service.insert_items(self.items_to_insert)
-        self.items_to_insert.clear()
+    def flush_stale_items(self) -> None:
+        """
+        Flush the buffer if its oldest item waits longer than flush_interval (called periodically by flush_loop).
+        """
+        if self.items_to_insert and time.monotonic() - self.first_buffered_at >= self.flush_interval:
+            self.insert_items()
+
+    def insert_items(self) -> defer.Deferred:
+        """
+        Hand the buffered items over to the writer thread pool.
+        :return: Deferred that fires once the batch got a writer slot (not when it is written).
+        """
+        batch, self.items_to_insert = self.items_to_insert, []
+        self.first_buffered_at = None
+        self.items_in_progress += len(batch)
+        accepted = defer.Deferred()
+
+        def write(_):
+            accepted.callback(None)
+            written = self.run_in_thread(self.write_batch, batch)
+            written.addCallbacks(
+                self.on_batch_written, self.on_batch_failed, callbackArgs=(batch,), errbackArgs=(batch,)
+            )
+            return written
+
+        def done(result):
+            self.items_in_progress -= len(batch)
+            return result
+
+        writing = self.pending_batches.run(write, None).addBoth(done)
+        self.writes_in_progress.add(writing)
+        writing.addBoth(self._forget_write, writing)
+        return accepted
+
+    def write_batch(self, batch: list):
+        """
+        Write a batch with the writer (in a thread of the pool), timed as the "<stats_prefix>/write" stage.
+        """
+        with CRAWL_METRICS.timer(f"{self.stats_prefix}/write"):
+            return self.writer.insert_items(batch)
+
+    def run_in_thread(self, function, *args) -> defer.Deferred:
+        from twisted.internet import reactor
+
+        return threads.deferToThreadPool(reactor, self.thread_pool, function, *args)
 
-    def close_spider(self, spider):
+    def on_batch_written(self, result: Optional[UpsertResult], batch: List[FlatItemModel]) -> None:
+        self.batches_written += 1
+        if self.stats and isinstance(result, UpsertResult):
+            self.stats.inc_value(f"{self.stats_prefix}/items_inserted", result.inserted)
+            self.stats.inc_value(f"{self.stats_prefix}/items_updated", result.updated)
+            self.stats.inc_value(f"{self.stats_prefix}/items_unchanged", result.unchanged)
+            if result.price_changes:
+                self.stats.inc_value(f"{self.stats_prefix}/price_changes", result.price_changes)
+        if self.signals:
+            self.signals.send_catch_log(signal=batch_flushed, items=batch, result=result, pipeline=self)
+
+    def on_batch_failed(self, failure: Failure, batch: List[FlatItemModel]) -> None:
+        logger.error(
+            "Failed to write a batch of %s items: %s",
+            len(batch),
+            failure.getErrorMessage(),
+            exc_info=(failure.type, failure.value, failure.getTracebackObject()),
+        )
+        if self.stats:
+            self.stats.inc_value(f"{self.stats_prefix}/batches_failed")
+            self.stats.inc_value(f"{self.stats_prefix}/items_failed", len(batch))
+        if self.signals:
+            self.signals.send_catch_log(signal=batch_failed, items=batch, failure=failure, pipeline=self)
+
+    def pending_writes(self) -> int:
+        """
+        :return: Number of items buffered or in a batch not written yet (receiver of the writes_pending signal).
+        """
+        return len(self.items_to_insert) + self.items_in_progress
+
+    def _forget_write(self, result, writing: defer.Deferred):
+        self.writes_in_progress.discard(writing)
+        return result
+
+    def close_spider(self, spider) -> defer.Deferred:
+        if self.flush_loop and self.flush_loop.running:
+            self.flush_loop.stop()
         if self.items_to_insert:
             self.insert_items()
+
+        drained = defer.DeferredList(list(self.writes_in_progress))
+        drained.addCallback(self._notify_written)
+        drained.addBoth(self._record_pool_stats)
+        drained.addBoth(self._stop_thread_pool)
+        return drained
+
+    def _notify_written(self, result):
+        if not self.notify_channel or not self.batches_written:
+            return result
+        notified = self.run_in_thread(notify, self.session_factory, self.notify_channel)
+        notified.addErrback(
+            lambda failure: logger.error("Failed to notify %s: %s", self.notify_channel, failure.value)
+        )
+        return notified.addCallback(lambda _: result)
+
+    def _record_pool_stats(self, result):
+        """
+        Record the state of the connection pool of the session factory at the end of the crawl as
+        "<stats_prefix>/pool/<name>" stats (checkout latencies in milliseconds, without the histogram buckets).
+        """
+        if not self.stats:
+            return result
+        for name, value in self.session_factory.pool_stats().items():
+            if isinstance(value, dict):
+                for key, nested_value in value.items():
+                    if key != "buckets":
+                        self.stats.set_value(f"{self.stats_prefix}/pool/{name}_{key}", nested_value)
+            else:
+                self.stats.set_value(f"{self.stats_prefix}/pool/{name}", value)
+        return result
+
+    def _stop_thread_pool(self, result):
+        if self.thread_pool is not None:
+            self.thread_pool.stop()
+            self.thread_pool = None
+        return result
+
+
+class SaveFlatDetailsPipeline(SaveToDatabasePipeline):
+    """
+    Pipeline that saves the payloads of the detail crawl stage (FlatDetailItemModel) to the flat_details table,
+    with the same batching, background writing and backpressure as SaveToDatabasePipeline.
+    """
+
+    item_class = FlatDetailItemModel
+    stats_prefix = "database/details"
+    notify_channel = None
+
+    @classmethod
+    def create_writer(cls, settings, session_factory: SQLAlchemySessionFactory, bulk_insert_size: int):
+        return FlatDetailWriter(session_factory, bulk_insert_size=bulk_insert_size)
@@ -0,0 +1,204 @@
+import json
+import logging
+import os
+import tempfile
+from collections import defaultdict
+from datetime import datetime, timezone
+from typing import Dict, Hashable, Iterable, List, Optional, Set
+
+logger = logging.getLogger(__name__)
+
+
+class CrawlCheckpoint:
+    """
+    Persisted state of a paginated crawl, so that a crawl interrupted by a restart resumes where it stopped
+    instead of starting again from page 1.
+
+    A page is completed once it was parsed and every item it yielded was written to the database. Until then
+    the page stays in the pending frontier: items still buffered in the pipeline (or in a failed batch) are lost
+    on a crash, so their page is downloaded again on resume. A page with an item of a failed batch (items_failed)
+    is never completed. The checkpoint keeps:
+    - crawl_key: identifies the crawl (categories and max_items), a checkpoint of another crawl is never resumed
+    - completed_categories: categories crawled to their last page, a crawl of several categories crawls them
+      one after the other
+    - last_page: last page of the category being crawled, read from its first page
+    - completed_pages: pages of the category being crawled whose items are all written
+    - items_scraped: number of items yielded by the completed pages of all categories (the spider's max_items
+      counter on resume)
+    - items_flushed: number of items written to the database so far (the flushed-item watermark)
+
+    The state is written atomically (temporary file + os.replace) by save(), which the spider calls at the flush
+    boundaries of the pipeline (scraper.signals.batch_flushed), so the file never refers to unwritten items.
+
+    Usage:
+        checkpoint = CrawlCheckpoint.load(path, crawl_key) or CrawlCheckpoint(path, crawl_key)
+        checkpoint.page_parsed(page, [item.id for item in items])
+        checkpoint.items_written([item.id for item in batch]) and checkpoint.save()
+    """
+
+    VERSION = 1
+
+    def __init__(self, path: str, crawl_key: str):
+        self.path = path
+        self.crawl_key = crawl_key
+        self.completed_categories: List[str] = []
+        self.last_page: Optional[int] = None
+        self.completed_pages: Set[int] = set()
+        self.items_scraped = 0
+        self.items_flushed = 0
+        self.resumed = False
+        # In-memory only: pages waiting for their items, and the pages each unwritten item was yielded from
+        self.page_items: Dict[int, int] = {}
+        self.unwritten_items: Dict[int, int] = {}
+        self.item_pages: Dict[Hashable, List[int]] = defaultdict(list)
+        self.failed_pages: Set[int] = set()
+
+    @classmethod
+    def load(cls, path: str, crawl_key: str) -> Optional["CrawlCheckpoint"]:
+        """
+        :return: The checkpoint stored at path, None if there is none or it belongs to another crawl.
+        """
+        try:
+            with open(path, encoding="utf-8") as file:
+                state = json.load(file)
+        except FileNotFoundError:
+            return None
+        except ValueError as e:
+            logger.warning("Ignoring unreadable crawl checkpoint %s: %s", path, e)
+            return None
+
+        if state.get("version") != cls.VERSION or state.get("crawl_key") != crawl_key:
+            logger.warning("Ignoring crawl checkpoint %s of a different crawl", path)
+            return None
+
+        checkpoint = cls(path, crawl_key)
+        checkpoint.completed_categories = state.get("completed_categories", [])
+        checkpoint.last_page = state["last_page"]
+        checkpoint.completed_pages = set(state["completed_pages"])
+        checkpoint.items_scraped = state["items_scraped"]
+        checkpoint.items_flushed = state["items_flushed"]
+        checkpoint.resumed = True
+        return checkpoint
+
+    def pending_pages(self) -> List[int]:
+        """
+        :return: Pages of the crawl that are not completed, in order (empty while last_page is unknown).
+        """
+        if self.last_page is None:
+            return []
+        return [page for page in range(1, self.last_page + 1) if page not in self.completed_pages]
+
+    def page_parsed(self, page: int, item_ids: Iterable[Hashable]) -> None:
+        """
+        Register the items a page yielded. A page without items is completed right away.
+        """
+        item_ids = list(item_ids)
+        if not item_ids:
+            self._complete_page(page, 0)
+            return
+        self.page_items[page] = self.unwritten_items[page] = len(item_ids)
+        for item_id in item_ids:
+            self.item_pages[item_id].append(page)
+
+    def items_written(self, item_ids: Iterable[Hashable]) -> bool:
+        """
+        Advance the watermark by a batch the pipeline wrote.
+        :return: True if the state changed.
+        """
+        changed = False
+        for item_id in item_ids:
+            page = self._take_item(item_id)
+            if page is None:
+                continue
+            self.items_flushed += 1
+            self._item_done(page)
+            changed = True
+        return changed
+
+    def items_failed(self, item_ids: Iterable[Hashable]) -> None:
+        """
+        Stop waiting for the items of a batch the pipeline failed to write: their pages stay pending, so they are
+        downloaded again when the crawl is resumed.
+        """
+        for item_id in item_ids:
+            page = self._take_item(item_id)
+            if page is not None:
+                self.failed_pages.add(page)
+                self._item_done(page)
+
+    def _take_item(self, item_id: Hashable) -> Optional[int]:
+        """
+        :return: The page an unwritten item was yielded from, None for an unknown item.
+        """
+        pages = self.item_pages.get(item_id)
+        if not pages:
+            return None
+        page = pages.pop(0)
+        if not pages:
+            del self.item_pages[item_id]
+        return page
+
+    def _item_done(self, page: int) -> None:
+        self.unwritten_items[page] -= 1
+        if self.unwritten_items[page] == 0:
+            del self.unwritten_items[page]
+            items = self.page_items.pop(page)
+            if page not in self.failed_pages:
+                self._complete_page(page, items)
+
+    def category_completed(self, category: str) -> None:
+        """
+        Register a category as crawled and start the pagination of the next one: its pages are numbered from 1
+        again. Call it once every item of the category is written (no unwritten_items left).
+        """
+        self.completed_categories.append(category)
+        self.last_page = None
+        self.completed_pages = set()
+        self.page_items.clear()
+        self.unwritten_items.clear()
+        self.item_pages.clear()
+        self.failed_pages.clear()
+
+    def _complete_page(self, page: int, items: int) -> None:
+        if page not in self.completed_pages:
+            self.completed_pages.add(page)
+            self.items_scraped += items
+
+    def to_dict(self) -> dict:
+        return {
+            "version": self.VERSION,
+            "crawl_key": self.crawl_key,
+            "completed_categories": self.completed_categories,
+            "updated_at": datetime.now(timezone.utc).isoformat(),
+            "last_page": self.last_page,
+            "completed_pages": sorted(self.completed_pages),
+            "pending_pages": self.pending_pages(),
+            "items_scraped": self.items_scraped,
+            "items_flushed": self.items_flushed,
+        }
+
+    def save(self) -> None:
+        """
+        Write the state atomically: a reader (or a restarted crawl) sees either the previous or the new state.
+        """
+        directory = os.path.dirname(os.path.abspath(self.path))
+        os.makedirs(directory, exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(dir=directory, prefix=".checkpoint-", suffix=".tmp")
+        try:
+            with os.fdopen(fd, "w", encoding="utf-8") as file:
+                json.dump(self.to_dict(), file)
+                file.flush()
+                os.fsync(file.fileno())
+            os.replace(tmp_path, self.path)
+        except BaseException:
+            os.unlink(tmp_path)
+            raise
+
+    def clear(self) -> None:
+        """
+        Remove the stored state once the crawl finished, the next crawl starts from page 1.
+        """
+        try:
+            os.remove(self.path)
+        except FileNotFoundError:
+            pass
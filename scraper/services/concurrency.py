@@ -0,0 +1,145 @@
+import math
+from datetime import datetime, timezone
+from email.utils import parsedate_to_datetime
+from typing import List, NamedTuple, Optional
+
+
+class ConcurrencyDecision(NamedTuple):
+    """
+    Outcome of an evaluation window of the AimdConcurrencyController:
+    - action: "increase", "decrease", "retry_after" or "hold"
+    - concurrency: the new concurrency limit
+    - delay: the new download delay in seconds
+    - p90_latency: 90th percentile of the latencies in the window (seconds)
+    - error_rate: share of throttled (429), failed (5xx) or timed out requests in the window
+    """
+
+    action: str
+    concurrency: int
+    delay: float
+    p90_latency: float
+    error_rate: float
+
+
+def percentile(values: List[float], q: float) -> float:
+    """
+    Nearest-rank percentile.
+    :param values: Observed values, not necessarily sorted.
+    :param q: Percentile between 0 and 100.
+    :return: The percentile, 0.0 for no values.
+    """
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    rank = max(1, math.ceil(q / 100 * len(ordered)))
+    return ordered[rank - 1]
+
+
+def parse_retry_after(value: Optional[bytes], now: Optional[datetime] = None) -> Optional[float]:
+    """
+    Parse a Retry-After header: either a number of seconds or an HTTP date.
+    :return: Seconds to wait, None if the header is missing or invalid.
+    """
+    if not value:
+        return None
+    value = value.decode("latin-1").strip() if isinstance(value, bytes) else str(value).strip()
+    if value.isdigit():
+        return float(value)
+    try:
+        retry_at = parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        return None
+    now = now or datetime.now(timezone.utc)
+    return max(0.0, (retry_at - now).total_seconds())
+
+
+class AimdConcurrencyController:
+    """
+    Additive-increase / multiplicative-decrease controller of the concurrency of one download slot (domain).
+
+    The controller collects the latency and outcome of every response. After each window of `window` responses:
+    - if the error rate (429, 5xx, timeouts) exceeds max_error_rate or the p90 latency exceeds target_latency,
+      the concurrency is multiplied by decrease_factor
+    - otherwise the concurrency grows by increase_step, and a delay raised by Retry-After is halved back towards
+      the base delay
+    A Retry-After header is acted on immediately: the concurrency is decreased and the delay is raised to the
+    requested wait (capped at max_delay), then a new window starts.
+    """
+
+    ERROR_STATUSES = {429, 500, 502, 503, 504}
+
+    def __init__(
+        self,
+        concurrency: int,
+        base_delay: float = 0.0,
+        min_concurrency: int = 1,
+        max_concurrency: int = 32,
+        target_latency: float = 1.0,
+        max_error_rate: float = 0.05,
+        increase_step: int = 1,
+        decrease_factor: float = 0.5,
+        window: int = 20,
+        max_delay: float = 60.0,
+    ):
+        self.min_concurrency = min_concurrency
+        self.max_concurrency = max_concurrency
+        self.concurrency = min(max(concurrency, min_concurrency), max_concurrency)
+        self.base_delay = base_delay
+        self.delay = base_delay
+        self.target_latency = target_latency
+        self.max_error_rate = max_error_rate
+        self.increase_step = increase_step
+        self.decrease_factor = decrease_factor
+        self.window = window
+        self.max_delay = max_delay
+        self.latencies: List[float] = []
+        self.errors = 0
+        self.observations = 0
+
+    def observe(
+        self, latency: Optional[float], status: Optional[int], retry_after: Optional[float] = None
+    ) -> Optional[ConcurrencyDecision]:
+        """
+        Record one response (status None for a failed download, e.g. a timeout).
+        :return: The decision if this observation completed a window or carried a Retry-After, None otherwise.
+        """
+        self.observations += 1
+        if latency is not None:
+            self.latencies.append(latency)
+        if status is None or status in self.ERROR_STATUSES:
+            self.errors += 1
+
+        if retry_after is not None:
+            self.delay = min(max(retry_after, self.base_delay), self.max_delay)
+            return self._decide("retry_after", self._decreased())
+
+        if self.observations < self.window:
+            return None
+
+        if self.error_rate > self.max_error_rate or percentile(self.latencies, 90) > self.target_latency:
+            return self._decide("decrease", self._decreased())
+
+        self.delay = max(self.base_delay, self.delay / 2)
+        concurrency = min(self.concurrency + self.increase_step, self.max_concurrency)
+        return self._decide("increase" if concurrency > self.concurrency else "hold", concurrency)
+
+    @property
+    def error_rate(self) -> float:
+        return self.errors / self.observations if self.observations else 0.0
+
+    def _decreased(self) -> int:
+        return max(self.min_concurrency, math.floor(self.concurrency * self.decrease_factor))
+
+    def _decide(self, action: str, concurrency: int) -> ConcurrencyDecision:
+        decision = ConcurrencyDecision(
+            action=action,
+            concurrency=concurrency,
+            delay=self.delay,
+            p90_latency=percentile(self.latencies, 90),
+            error_rate=self.error_rate,
+        )
+        self.concurrency = concurrency
+        self.latencies.clear()
+        self.errors = 0
+        self.observations = 0
+        return decision
@@ -1,6 +1,9 @@
-from typing import Optional
+import os
+from typing import List, Optional, Tuple
 from urllib.parse import urlparse, parse_qs, urlencode, urlunparse
 
+from scraper.constants import SREALITY_API_URL
+
 
 class ApiUrlConfigService:
     """
@@ -17,9 +20,20 @@ class ApiUrlConfigService:
     - page: The page number in the paginated result set.
     - category_main_cb: Main category code for filtering the results.
     - category_type_cb: Type category code for further filtering the results.
+    - sort: Sort order of the results (NEWEST_FIRST_SORT lists the most recently added listings first).
+
+    A category of listings is a (category_main_cb, category_type_cb) pair, e.g. (1, 1) for flats for sale
+    (see CATEGORY_MAIN and CATEGORY_TYPE).
+
+    The API base URL can be pointed to a local stand-in (benchmarks.fake_api) with the SREALITY_API_URL
+    environment variable.
     """
 
-    BASE_API_URL = "https://www.sreality.cz/api/cs/v2/estates"
+    BASE_API_URL = os.environ.get("SREALITY_API_URL", SREALITY_API_URL)
+    NEWEST_FIRST_SORT = 0
+    CATEGORY_MAIN = {1: "flats", 2: "houses", 3: "land", 4: "commercial", 5: "other"}
+    CATEGORY_TYPE = {1: "sale", 2: "rent", 3: "auction"}
+    DEFAULT_CATEGORY = (1, 1)
 
     @staticmethod
     def get_start_url(custom_parameters: dict = None) -> str:
@@ -39,19 +53,94 @@ class ApiUrlConfigService:
         return f"{ApiUrlConfigService.BASE_API_URL}?{query_string}"
 
     @staticmethod
-    def build_next_page_url(url: str) -> Optional[str]:
+    def get_category_parameters(category: Tuple[int, int]) -> dict:
         """
-        Modifies the provided API URL to point to the next page in a paginated sequence.
+        :param category: (category_main_cb, category_type_cb) pair.
+        :return: The query parameters selecting the category.
+        """
+        category_main, category_type = category
+        return {"category_main_cb": category_main, "category_type_cb": category_type}
+
+    @staticmethod
+    def parse_categories(value: str) -> List[Tuple[int, int]]:
+        """
+        Parse a list of categories: comma-separated <category_main_cb>:<category_type_cb> pairs
+        (e.g. "1:1,2:1" for flats and houses for sale), or "all" for every category.
+        :param value: The list of categories.
+        :return: The (category_main_cb, category_type_cb) pairs, in the given order and without duplicates.
+        """
+        if value.strip().lower() == "all":
+            return [
+                (category_main, category_type)
+                for category_main in ApiUrlConfigService.CATEGORY_MAIN
+                for category_type in ApiUrlConfigService.CATEGORY_TYPE
+            ]
+
+        categories = []
+        for pair in value.split(","):
+            try:
+                category_main, category_type = (int(code) for code in pair.split(":"))
+            except ValueError:
+                raise ValueError(f"Invalid category {pair!r}, expected <category_main_cb>:<category_type_cb>")
+            if (
+                category_main not in ApiUrlConfigService.CATEGORY_MAIN
+                or category_type not in ApiUrlConfigService.CATEGORY_TYPE
+            ):
+                raise ValueError(f"Unknown category {pair!r}")
+            if (category_main, category_type) not in categories:
+                categories.append((category_main, category_type))
+        return categories
+
+    @staticmethod
+    def get_detail_url(hash_id: int) -> str:
+        """
+        Construct the URL of the detail endpoint of a single estate.
+        :param hash_id: The sreality hash_id of the estate.
+        :return: The detail API URL.
+        """
+        return f"{ApiUrlConfigService.BASE_API_URL}/{hash_id}"
+
+    @staticmethod
+    def get_page_number(url: str) -> int:
+        """
+        Read the page number from the provided API URL.
+        :param url: The API URL.
+        :return: The page number, 1 if the URL has no page parameter.
+        """
+        query_params = parse_qs(urlparse(url).query)
+        return int(query_params.get("page", [1])[0])
+
+    @staticmethod
+    def get_per_page(url: str) -> int:
+        """
+        Read the number of items per page from the provided API URL.
+        :param url: The API URL.
+        :return: The number of items per page, 60 (API default) if the URL has no per_page parameter.
+        """
+        query_params = parse_qs(urlparse(url).query)
+        return int(query_params.get("per_page", [60])[0])
+
+    @staticmethod
+    def build_page_url(url: str, page: int) -> str:
+        """
+        Modifies the provided API URL to point to the given page in a paginated sequence.
         :param url: The current API URL.
-        :return: The modified API URL pointing to the next page, or None if not applicable.
+        :param page: The page number to point to.
+        :return: The modified API URL pointing to the given page.
         """
         parsed_url = urlparse(url)
         query_params = parse_qs(parsed_url.query)
-
-        current_page = int(query_params.get("page", [1])[0])
-        query_params["page"] = [str(current_page + 1)]
+        query_params["page"] = [str(page)]
 
         new_query = urlencode(query_params, doseq=True)
-        new_url = urlunparse(parsed_url._replace(query=new_query))
+        return urlunparse(parsed_url._replace(query=new_query))
 
-        return new_url
+    @staticmethod
+    def build_next_page_url(url: str) -> Optional[str]:
+        """
+        Modifies the provided API URL to point to the next page in a paginated sequence.
+        :param url: The current API URL.
+        :return: The modified API URL pointing to the next page, or None if not applicable.
+        """
+        current_page = ApiUrlConfigService.get_page_number(url)
+        return ApiUrlConfigService.build_page_url(url, current_page + 1)
@@ -0,0 +1,189 @@
+import json
+from abc import ABC, abstractmethod
+from typing import Dict, List, NamedTuple, Optional, Type, Union
+
+# Optional dependencies (the speedups extra: poetry install -E speedups): the stdlib json decoder is used when they are missing.
+try:
+    import msgspec
+except ImportError:  # pragma: no cover
+    msgspec = None
+
+try:
+    import orjson
+except ImportError:  # pragma: no cover
+    orjson = None
+
+
+class EstateRecord(NamedTuple):
+    """
+    The fields of an estate from the API list endpoint that the scraper uses.
+    """
+
+    hash_id: Optional[int]
+    name: Optional[str]
+    locality: Optional[str]
+    price: Optional[Union[int, float]]
+    image_url: Optional[str]
+    lat: Optional[float] = None
+    lon: Optional[float] = None
+
+
+class ApiPage(NamedTuple):
+    """
+    A decoded API page:
+    - result_size: total number of listings matching the query
+    - estates: estates on this page
+    """
+
+    result_size: int
+    estates: List[EstateRecord]
+
+
+class ApiPageDecoder(ABC):
+    """
+    Decodes a raw API page (JSON) into an ApiPage.
+    """
+
+    name: str
+
+    @abstractmethod
+    def decode(self, json_response: Union[str, bytes]) -> ApiPage:
+        raise NotImplementedError
+
+
+class StdlibJsonDecoder(ApiPageDecoder):
+    """
+    Decoder based on the standard library json module. It builds dicts for the whole document
+    and then picks the fields we use.
+    """
+
+    name = "json"
+
+    def loads(self, json_response: Union[str, bytes]) -> dict:
+        return json.loads(json_response)
+
+    def decode(self, json_response: Union[str, bytes]) -> ApiPage:
+        data = self.loads(json_response)
+        estates = data.get("_embedded", {}).get("estates", [])
+        return ApiPage(
+            result_size=int(data.get("result_size") or 0),
+            estates=[self.to_estate_record(estate) for estate in estates],
+        )
+
+    @staticmethod
+    def to_estate_record(estate: dict) -> EstateRecord:
+        hash_id = estate.get("hash_id")
+        images = estate.get("_links", {}).get("images", [])
+        gps = estate.get("gps") or {}
+        return EstateRecord(
+            hash_id=int(hash_id) if hash_id is not None else None,
+            name=estate.get("name"),
+            locality=estate.get("locality"),
+            price=(estate.get("price_czk") or {}).get("value_raw"),
+            image_url=images[0].get("href") if images else None,
+            lat=gps.get("lat"),
+            lon=gps.get("lon"),
+        )
+
+
+class OrjsonDecoder(StdlibJsonDecoder):
+    """
+    Same as StdlibJsonDecoder, but the document is parsed by orjson.
+    """
+
+    name = "orjson"
+
+    def __init__(self):
+        if orjson is None:
+            raise ImportError("orjson is not installed, install it with: pip install orjson")
+
+    def loads(self, json_response: Union[str, bytes]) -> dict:
+        return orjson.loads(json_response)
+
+
+if msgspec is not None:
+
+    class _Price(msgspec.Struct):
+        value_raw: Optional[Union[int, float]] = None
+
+    class _Image(msgspec.Struct):
+        href: Optional[str] = None
+
+    class _Gps(msgspec.Struct):
+        lat: Optional[float] = None
+        lon: Optional[float] = None
+
+    class _Links(msgspec.Struct):
+        images: List[_Image] = []
+
+    class _Estate(msgspec.Struct):
+        hash_id: Optional[Union[int, str]] = None
+        name: Optional[str] = None
+        locality: Optional[str] = None
+        price_czk: Optional[_Price] = None
+        gps: Optional[_Gps] = None
+        links: _Links = msgspec.field(default_factory=_Links, name="_links")
+
+    class _Embedded(msgspec.Struct):
+        estates: List[_Estate] = []
+
+    class _Page(msgspec.Struct):
+        result_size: Optional[int] = None
+        embedded: _Embedded = msgspec.field(default_factory=_Embedded, name="_embedded")
+
+
+class MsgspecDecoder(ApiPageDecoder):
+    """
+    Decoder based on msgspec: the document is decoded straight into structs that declare only the fields we use.
+    All other fields (labels, seo, the other _links, ...) are skipped by the parser without being built.
+    """
+
+    name = "msgspec"
+
+    def __init__(self):
+        if msgspec is None:
+            raise ImportError("msgspec is not installed, install it with: pip install msgspec")
+        self._decoder = msgspec.json.Decoder(_Page)
+
+    def decode(self, json_response: Union[str, bytes]) -> ApiPage:
+        page = self._decoder.decode(json_response)
+        return ApiPage(
+            result_size=page.result_size or 0,
+            estates=[self.to_estate_record(estate) for estate in page.embedded.estates],
+        )
+
+    @staticmethod
+    def to_estate_record(estate: "_Estate") -> EstateRecord:
+        images = estate.links.images
+        return EstateRecord(
+            hash_id=int(estate.hash_id) if estate.hash_id is not None else None,
+            name=estate.name,
+            locality=estate.locality,
+            price=estate.price_czk.value_raw if estate.price_czk else None,
+            image_url=images[0].href if images else None,
+            lat=estate.gps.lat if estate.gps else None,
+            lon=estate.gps.lon if estate.gps else None,
+        )
+
+
+DECODERS: Dict[str, Type[ApiPageDecoder]] = {
+    MsgspecDecoder.name: MsgspecDecoder,
+    OrjsonDecoder.name: OrjsonDecoder,
+    StdlibJsonDecoder.name: StdlibJsonDecoder,
+}
+
+
+def get_decoder(name: str = "auto") -> ApiPageDecoder:
+    """
+    Create a decoder by name: "msgspec", "orjson", "json" or "auto" (the fastest one installed).
+    """
+    if name == "auto":
+        if msgspec is not None:
+            return MsgspecDecoder()
+        if orjson is not None:
+            return OrjsonDecoder()
+        return StdlibJsonDecoder()
+
+    if name not in DECODERS:
+        raise ValueError(f"Unknown JSON decoder {name!r}, expected one of: auto, {', '.join(DECODERS)}")
+    return DECODERS[name]()
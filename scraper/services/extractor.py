@@ -1,58 +1,164 @@
-import json
-from typing import Optional, List
+import hashlib
+import re
+from typing import Optional, List, Tuple, Union
 
+from database import geohash
 from scraper.error_handler import ScrapyErrorHandler
 from scraper.items import PageItem
+from scraper.services.decoder import ApiPage, ApiPageDecoder, EstateRecord, get_decoder
+from scraper.services.metrics import CRAWL_METRICS
+
+# Disposition in the listing name, e.g. "Prodej bytu 2+kk 54 m²"
+DISPOSITION_PATTERN = re.compile(r"(?<![\d+])(\d\+(?:kk|\d))(?![\w+])")
+# First area in the listing name, with an optional thousands separator, e.g. "Prodej pozemku 1 200 m²"
+AREA_PATTERN = re.compile(r"(?<![\d.,])(\d{1,3}(?:[ \xa0]\d{3})+|\d+)\s*m²")
 
 
 class JsonDataExtractor:
     """
     JsonDataExtractor is a class that contains logic for extracting necessary information from a JSON response:
+        - hash_id: stable identifier of the listing on sreality.cz
         - title: title of the listing (e.g. "2+kk, 50m²")
         - image_url: url of the listing's image
+        - price: price of the listing in CZK
+        - area: floor area in m², read from the listing name
+        - disposition: layout of the flat (e.g. "2+kk"), read from the listing name
+        - locality: locality of the listing (e.g. "Praha 6 - Bubeneč")
+        - lat / lon / geohash: GPS coordinates of the listing and their geohash (database.geohash)
+        - fingerprint: hash of the listing's fields, changes whenever the listing changes on the list endpoint
+
+    The JSON response is decoded by an ApiPageDecoder (scraper.services.decoder), the fastest installed one
+    by default: msgspec, orjson or the stdlib json module. A page that is read twice (the first page: result_size
+    and listings) is decoded once with decode() and the ApiPage is passed instead of the JSON response.
     """
 
+    def __init__(self, decoder: Optional[ApiPageDecoder] = None):
+        self.decoder = decoder or get_decoder()
+
     @staticmethod
-    def extract_title(estate: dict) -> Optional[str]:
-        name = estate.get("name")
-        locality = estate.get("locality")
-        price = estate.get("price_czk", {}).get("value_raw")
+    def extract_hash_id(estate: EstateRecord) -> Optional[int]:
+        return estate.hash_id
 
-        title_parts = [name, locality]
-        if price:
-            title_parts.append(f"{price} CZK")
+    @staticmethod
+    def extract_title(estate: EstateRecord) -> Optional[str]:
+        title_parts = [estate.name, estate.locality]
+        if estate.price:
+            title_parts.append(f"{estate.price} CZK")
 
         return ", ".join(filter(None, title_parts))
 
     @staticmethod
-    def extract_image_url(estate: dict) -> Optional[str]:
-        images = estate.get("_links", {}).get("images", [])
-        if images:
-            return images[0].get("href")
-        return None
+    def extract_image_url(estate: EstateRecord) -> Optional[str]:
+        return estate.image_url
+
+    @staticmethod
+    def extract_price(estate: EstateRecord) -> Optional[int]:
+        """
+        Price in CZK, None for listings without a price (e.g. "price on request" listings report 0 or 1 CZK).
+        """
+        if not estate.price or estate.price <= 1:
+            return None
+        return int(estate.price)
+
+    @staticmethod
+    def extract_disposition(estate: EstateRecord) -> Optional[str]:
+        match = DISPOSITION_PATTERN.search(estate.name or "")
+        return match.group(1) if match else None
+
+    @staticmethod
+    def extract_area(estate: EstateRecord) -> Optional[int]:
+        """
+        Area in m²: the first area in the name (the floor area, e.g. "Prodej domu 120 m², pozemek 600 m²").
+        The disposition is removed first, so "2+1 100 m²" is not read as 1 100 m².
+        """
+        name = DISPOSITION_PATTERN.sub(" ", estate.name or "", count=1)
+        match = AREA_PATTERN.search(name)
+        if not match:
+            return None
+        return int(re.sub(r"\D", "", match.group(1)))
+
+    @staticmethod
+    def extract_locality(estate: EstateRecord) -> Optional[str]:
+        return estate.locality.replace("\xa0", " ").strip() if estate.locality else None
+
+    @staticmethod
+    def extract_gps(estate: EstateRecord) -> Tuple[Optional[float], Optional[float]]:
+        """
+        GPS coordinates (lat, lon), (None, None) when they are missing or out of range.
+        """
+        try:
+            lat, lon = float(estate.lat), float(estate.lon)
+        except (TypeError, ValueError):
+            return None, None
+        if not (-90 <= lat <= 90 and -180 <= lon <= 180):
+            return None, None
+        return lat, lon
+
+    @staticmethod
+    def extract_fingerprint(estate: EstateRecord) -> str:
+        """
+        Fingerprint of the listing's fields on the list endpoint (name, locality, price, image).
+        :return: 16 hex characters.
+        """
+        fields = "\x1f".join(str(value) for value in (estate.name, estate.locality, estate.price, estate.image_url))
+        return hashlib.blake2b(fields.encode("utf-8"), digest_size=8).hexdigest()
+
+    def decode(self, json_response: Union[str, bytes, ApiPage]) -> ApiPage:
+        """
+        :param json_response: JSON response as a string, or a page decoded already (returned as is).
+        """
+        if isinstance(json_response, ApiPage):
+            return json_response
+        with CRAWL_METRICS.timer("decode"):
+            return self.decoder.decode(json_response)
+
+    def extract_result_size(self, json_response: Union[str, bytes, ApiPage]) -> int:
+        """
+        Returns the total number of listings matching the query, as reported by the API.
+        :param json_response: JSON response as a string, or the decoded ApiPage.
+        :return: Total number of listings (result_size), 0 if it is missing.
+        """
+        return self.decode(json_response).result_size
 
-    def extract_items_from_response(self, json_response: str) -> List[PageItem]:
+    def extract_items_from_response(self, json_response: Union[str, bytes, ApiPage]) -> List[PageItem]:
         """
         Parses a JSON response and returns a list of items with title and image URL.
-        :param json_response: JSON response as a string.
+        :param json_response: JSON response as a string, or the decoded ApiPage.
         :return: List of items with title and image URL.
         """
-        data = json.loads(json_response)
-        estates = data.get("_embedded", {}).get("estates", [])
+        page = self.decode(json_response)
 
         items = []
-        for estate in estates:
-            title = self.extract_title(estate)
-            image_url = self.extract_image_url(estate)
-            if title and image_url:
-                items.append(PageItem(title=title, image_url=image_url))
+        with CRAWL_METRICS.timer("extract"):
+            for estate in page.estates:
+                title = self.extract_title(estate)
+                image_url = self.extract_image_url(estate)
+                if title and image_url:
+                    lat, lon = self.extract_gps(estate)
+                    items.append(
+                        PageItem(
+                            hash_id=self.extract_hash_id(estate),
+                            title=title,
+                            image_url=image_url,
+                            price=self.extract_price(estate),
+                            area=self.extract_area(estate),
+                            disposition=self.extract_disposition(estate),
+                            locality=self.extract_locality(estate),
+                            lat=lat,
+                            lon=lon,
+                            geohash=geohash.encode(lat, lon) if lat is not None else None,
+                            fingerprint=self.extract_fingerprint(estate),
+                        )
+                    )
         return items
 
-    def process_extraction_safely(self, url: str, json_response: str) -> List[Optional[PageItem]]:
+    def process_extraction_safely(
+        self, url: str, json_response: Union[str, bytes, ApiPage]
+    ) -> List[Optional[PageItem]]:
         """
         Handle the page processing with built-in error handling.
         :param url: URL of the page
-        :param json_response: JSON response as a string.
+        :param json_response: JSON response as a string, or the decoded ApiPage.
         :return: List of processed PageItems
         """
         try:
@@ -0,0 +1,182 @@
+import logging
+from typing import Iterable, List, Optional
+
+import redis
+
+logger = logging.getLogger(__name__)
+
+
+class RedisCrawlFrontier:
+    """
+    Crawl frontier shared by several spider workers through Redis. Every worker pulls API page URLs from the same
+    queue, so the crawl can be spread over multiple processes and hosts.
+
+    The frontier keeps the following keys (prefixed with key_prefix):
+    - <prefix>:queue: list of API page URLs waiting to be fetched
+    - <prefix>:seen: set of every API page URL ever pushed, a URL is queued only the first time it is pushed
+    - <prefix>:items: number of items claimed by all workers, capped by max_items
+    - <prefix>:seed: seeding state - "claimed" while a worker fetches the first page, "done" once the URLs of all
+      remaining pages have been pushed
+    - <prefix>:retries: number of times each failed page URL was queued again (see requeue)
+
+    Pushing and claiming items are done by Lua scripts, so they are atomic across workers: a page is handed out
+    to exactly one worker and the workers together never claim more than max_items items.
+
+    Once the crawl is finished, expire() gives all its keys a short TTL: the workers still running see the crawl
+    finished, and a later crawl with the same key_prefix starts from scratch instead of exiting at once.
+
+    Usage:
+        frontier = RedisCrawlFrontier.from_url("redis://localhost:6379/0", max_items=500)
+        if frontier.claim_seed():
+            ...  # fetch the first page, then frontier.push(page_urls) and frontier.mark_seeded()
+        urls = frontier.pop(8)
+    """
+
+    PUSH_SCRIPT = """
+    local pushed = 0
+    for _, url in ipairs(ARGV) do
+        if redis.call("SADD", KEYS[1], url) == 1 then
+            redis.call("RPUSH", KEYS[2], url)
+            pushed = pushed + 1
+        end
+    end
+    return pushed
+    """
+
+    CLAIM_ITEMS_SCRIPT = """
+    local requested = tonumber(ARGV[1])
+    local max_items = tonumber(ARGV[2])
+    local claimed = tonumber(redis.call("GET", KEYS[1]) or "0")
+    if max_items >= 0 then
+        requested = math.max(0, math.min(requested, max_items - claimed))
+    end
+    if requested > 0 then
+        redis.call("INCRBY", KEYS[1], requested)
+    end
+    return requested
+    """
+
+    REQUEUE_SCRIPT = """
+    local attempts = redis.call("HINCRBY", KEYS[1], ARGV[1], 1)
+    if attempts > tonumber(ARGV[2]) then
+        return 0
+    end
+    redis.call("RPUSH", KEYS[2], ARGV[1])
+    return 1
+    """
+
+    PUSH_CHUNK_SIZE = 1000
+    # A worker that claimed the first page and died must not block the crawl forever
+    SEED_CLAIM_TIMEOUT = 300
+    # A failed page is queued again up to MAX_PAGE_RETRIES times before it is given up
+    MAX_PAGE_RETRIES = 3
+    # Seconds the keys of a finished crawl are kept, for the workers still running to see it finished
+    FINISHED_CRAWL_TTL = 300
+
+    def __init__(self, redis_client: redis.Redis, key_prefix: str = "sreality", max_items: Optional[int] = 500):
+        self.redis = redis_client
+        self.max_items = max_items
+        self.queue_key = f"{key_prefix}:queue"
+        self.seen_key = f"{key_prefix}:seen"
+        self.items_key = f"{key_prefix}:items"
+        self.seed_key = f"{key_prefix}:seed"
+        self.retries_key = f"{key_prefix}:retries"
+        self._push = self.redis.register_script(self.PUSH_SCRIPT)
+        self._claim_items = self.redis.register_script(self.CLAIM_ITEMS_SCRIPT)
+        self._requeue = self.redis.register_script(self.REQUEUE_SCRIPT)
+
+    @classmethod
+    def from_url(cls, redis_url: str, **kwargs) -> "RedisCrawlFrontier":
+        return cls(redis.Redis.from_url(redis_url, decode_responses=True), **kwargs)
+
+    def claim_seed(self) -> bool:
+        """
+        Claim the right to fetch the first page. Only one worker succeeds; the others wait for the page URLs.
+        The claim expires after SEED_CLAIM_TIMEOUT seconds unless the frontier is marked as seeded.
+        :return: True if this worker should fetch the first page.
+        """
+        return bool(self.redis.set(self.seed_key, "claimed", nx=True, ex=self.SEED_CLAIM_TIMEOUT))
+
+    def release_seed(self) -> None:
+        """
+        Give up the seed claim (e.g. the first page failed), so that another worker can retry it.
+        """
+        self.redis.delete(self.seed_key)
+
+    def mark_seeded(self) -> None:
+        self.redis.set(self.seed_key, "done")
+
+    def is_seeded(self) -> bool:
+        return self.redis.get(self.seed_key) == "done"
+
+    def push(self, urls: Iterable[str]) -> int:
+        """
+        Queue the URLs that were never pushed before.
+        :param urls: API page URLs.
+        :return: Number of URLs actually queued.
+        """
+        urls = list(urls)
+        pushed = 0
+        for i in range(0, len(urls), self.PUSH_CHUNK_SIZE):
+            pushed += self._push(keys=[self.seen_key, self.queue_key], args=urls[i : i + self.PUSH_CHUNK_SIZE])
+        logger.debug("Pushed %s of %s URLs to the frontier", pushed, len(urls))
+        return pushed
+
+    def pop(self, count: int) -> List[str]:
+        """
+        Take up to `count` URLs from the queue. Each URL is handed out to exactly one worker.
+        """
+        if count <= 0:
+            return []
+        return self.redis.lpop(self.queue_key, count) or []
+
+    def requeue(self, url: str) -> bool:
+        """
+        Queue a page URL that failed again (push() ignores the URLs it has seen), up to MAX_PAGE_RETRIES times.
+        :return: True if the URL was queued, False if it failed too many times.
+        """
+        return bool(self._requeue(keys=[self.retries_key, self.queue_key], args=[url, self.MAX_PAGE_RETRIES]))
+
+    def claim_items(self, count: int) -> int:
+        """
+        Claim up to `count` items from the shared max_items budget.
+        :return: Number of items this worker may emit.
+        """
+        max_items = -1 if self.max_items is None else self.max_items
+        return self._claim_items(keys=[self.items_key], args=[count, max_items])
+
+    def items_claimed(self) -> int:
+        return int(self.redis.get(self.items_key) or 0)
+
+    def pending(self) -> int:
+        return self.redis.llen(self.queue_key)
+
+    def is_max_items_reached(self) -> bool:
+        return self.max_items is not None and self.items_claimed() >= self.max_items
+
+    def is_finished(self) -> bool:
+        """
+        The crawl is finished once all page URLs were pushed and handed out, or the items budget is used up.
+        """
+        return self.is_max_items_reached() or (self.is_seeded() and self.pending() == 0)
+
+    def keys(self) -> List[str]:
+        return [self.queue_key, self.seen_key, self.items_key, self.seed_key, self.retries_key]
+
+    def expire(self, seconds: int = FINISHED_CRAWL_TTL) -> None:
+        """
+        Remove all the keys of the crawl after `seconds`.
+        """
+        with self.redis.pipeline() as pipeline:
+            for key in self.keys():
+                pipeline.expire(key, seconds)
+            pipeline.execute()
+
+    def ttl(self) -> int:
+        """
+        :return: Seconds until the keys of the crawl expire, -1 if they do not expire.
+        """
+        return self.redis.ttl(self.seed_key)
+
+    def reset(self) -> None:
+        self.redis.delete(*self.keys())
@@ -0,0 +1,163 @@
+import bisect
+import math
+import threading
+import time
+from contextlib import contextmanager
+from typing import Dict, Iterator, List, Optional, Sequence, Tuple
+
+# Upper bounds (seconds) of the latency histogram buckets, from a decode of a small page to a slow download
+DEFAULT_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, math.inf)
+
+Labels = Tuple[Tuple[str, str], ...]
+
+
+class LatencyHistogram:
+    """
+    Latency histogram with fixed bucket bounds (the Prometheus histogram model): count per bucket, total count
+    and sum. Quantiles are estimated by linear interpolation inside the bucket, like histogram_quantile().
+    """
+
+    def __init__(self, buckets: Sequence[float] = DEFAULT_BUCKETS):
+        self.buckets = tuple(buckets)
+        self.counts = [0] * len(self.buckets)
+        self.count = 0
+        self.sum = 0.0
+
+    def observe(self, seconds: float) -> None:
+        self.counts[bisect.bisect_left(self.buckets, seconds)] += 1
+        self.count += 1
+        self.sum += seconds
+
+    @property
+    def mean(self) -> float:
+        return self.sum / self.count if self.count else 0.0
+
+    def quantile(self, q: float) -> float:
+        """
+        :param q: Quantile between 0 and 1.
+        :return: Estimated quantile in seconds, 0.0 without observations. Values in the last (+Inf) bucket are
+            reported as the largest finite bound.
+        """
+        if not self.count:
+            return 0.0
+        rank = q * self.count
+        seen = 0
+        for index, bucket_count in enumerate(self.counts):
+            if seen + bucket_count >= rank and bucket_count:
+                upper = self.buckets[index]
+                lower = self.buckets[index - 1] if index else 0.0
+                if math.isinf(upper):
+                    return lower
+                return lower + (upper - lower) * (rank - seen) / bucket_count
+            seen += bucket_count
+        return self.buckets[-2]
+
+    def cumulative_counts(self) -> List[Tuple[float, int]]:
+        cumulative, total = [], 0
+        for bound, bucket_count in zip(self.buckets, self.counts):
+            total += bucket_count
+            cumulative.append((bound, total))
+        return cumulative
+
+
+class CrawlMetrics:
+    """
+    Thread-safe registry of the crawl metrics: latency histograms per stage, counters and gauges. The stages are
+    timed where they run (the spider callbacks, the services, the writer threads of the pipeline) and
+    CrawlMetricsExtension publishes the registry to the crawl stats and, optionally, in the Prometheus text format.
+
+    Stages recorded by the scraper:
+    - download: download latency of a response (scrapy download_latency)
+    - decode: decoding of an API page (ApiPageDecoder, json.loads or its replacement)
+    - extract: extraction of the listings from the decoded page (JsonDataExtractor)
+    - validate: pydantic validation of a page of listings (FlatItemModel)
+    - <pipeline stats prefix>/write: write of a batch by the pipeline's writer thread (e.g. database/write)
+
+    Usage:
+        with CRAWL_METRICS.timer("decode"):
+            page = decoder.decode(body)
+    """
+
+    def __init__(self, buckets: Sequence[float] = DEFAULT_BUCKETS):
+        self.buckets = buckets
+        self._lock = threading.Lock()
+        self.histograms: Dict[str, LatencyHistogram] = {}
+        self.counters: Dict[Tuple[str, Labels], float] = {}
+        self.gauges: Dict[Tuple[str, Labels], float] = {}
+
+    def observe(self, stage: str, seconds: float) -> None:
+        with self._lock:
+            histogram = self.histograms.get(stage)
+            if histogram is None:
+                histogram = self.histograms[stage] = LatencyHistogram(self.buckets)
+            histogram.observe(seconds)
+
+    @contextmanager
+    def timer(self, stage: str) -> Iterator[None]:
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(stage, time.perf_counter() - start)
+
+    def inc(self, name: str, value: float = 1, **labels: str) -> None:
+        key = (name, tuple(sorted(labels.items())))
+        with self._lock:
+            self.counters[key] = self.counters.get(key, 0) + value
+
+    def set_gauge(self, name: str, value: float, **labels: str) -> None:
+        with self._lock:
+            self.gauges[(name, tuple(sorted(labels.items())))] = value
+
+    def counter_value(self, name: str, **labels: str) -> float:
+        return self.counters.get((name, tuple(sorted(labels.items()))), 0)
+
+    def histogram(self, stage: str) -> Optional[LatencyHistogram]:
+        return self.histograms.get(stage)
+
+    def reset(self) -> None:
+        with self._lock:
+            self.histograms.clear()
+            self.counters.clear()
+            self.gauges.clear()
+
+    def render_prometheus(self, namespace: str = "sreality_crawl") -> str:
+        """
+        :return: The metrics in the Prometheus text exposition format (version 0.0.4).
+        """
+        with self._lock:
+            lines = [
+                f"# HELP {namespace}_stage_seconds Time spent per crawl stage.",
+                f"# TYPE {namespace}_stage_seconds histogram",
+            ]
+            for stage, histogram in sorted(self.histograms.items()):
+                stage_label = f'stage="{escape_label_value(stage)}"'
+                for bound, count in histogram.cumulative_counts():
+                    le = "+Inf" if math.isinf(bound) else repr(bound)
+                    lines.append(f'{namespace}_stage_seconds_bucket{{{stage_label},le="{le}"}} {count}')
+                lines.append(f"{namespace}_stage_seconds_sum{{{stage_label}}} {histogram.sum!r}")
+                lines.append(f"{namespace}_stage_seconds_count{{{stage_label}}} {histogram.count}")
+            lines.extend(render_samples(namespace, "counter", self.counters))
+            lines.extend(render_samples(namespace, "gauge", self.gauges))
+        return "\n".join(lines) + "\n"
+
+
+def escape_label_value(value: str) -> str:
+    return value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def render_samples(namespace: str, metric_type: str, samples: Dict[Tuple[str, Labels], float]) -> List[str]:
+    lines = []
+    declared = set()
+    for (name, labels), value in sorted(samples.items()):
+        metric = f"{namespace}_{name}"
+        if metric not in declared:
+            lines.append(f"# TYPE {metric} {metric_type}")
+            declared.add(metric)
+        label_text = ",".join(f'{key}="{escape_label_value(label)}"' for key, label in labels)
+        lines.append(f"{metric}{{{label_text}}} {value!r}" if label_text else f"{metric} {value!r}")
+    return lines
+
+
+# Registry of the running crawl, shared by the services, the pipelines and CrawlMetricsExtension
+CRAWL_METRICS = CrawlMetrics()
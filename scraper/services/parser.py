@@ -1,61 +1,110 @@
 import logging
 import uuid
-from typing import Optional, List
+from collections import Counter
+from typing import Dict, NamedTuple, Optional, List, Union
 from pydantic import ValidationError
 
+from scraper.constants import FLAT_ID_NAMESPACE
 from scraper.items import PageItem
+from scraper.services.decoder import ApiPage
 from scraper.services.extractor import JsonDataExtractor
-from scraper.services.schema import FlatItemModel
+from scraper.services.metrics import CRAWL_METRICS
+from scraper.services.schema import FlatItemListAdapter, FlatItemModel
 
 logger = logging.getLogger(__name__)
 
 
+class BatchValidationResult(NamedTuple):
+    """
+    Result of validating a page of items:
+    - valid: the valid items as FlatItemModels, in page order
+    - errors: number of errors per pydantic error type (e.g. {"url_parsing": 2})
+    """
+
+    valid: List[FlatItemModel]
+    errors: Dict[str, int]
+
+    @property
+    def invalid_count(self) -> int:
+        return sum(self.errors.values())
+
+
 class ApiResponseParser:
     """
     ApiResponseParser is a class that contains logic for:
         1. extracting necessary information from a page via the JsonDataExtractor
         2. validating the extracted information via pydantic and creating FlatItemModels
 
-    The parser will stop parsing once it reaches the max_items limit - 500 by default.
+    All items of a page are validated in one call of a compiled list adapter (FlatItemListAdapter), and invalid
+    items are reported with a single log line per page.
+
+    The parser keeps no state between pages: the max_items limit is applied by the spider.
+
+    Flat ids are derived from the sreality hash_id (uuid5), so the same listing always gets the same id
+    and re-scraping it updates the existing row instead of creating a new one.
     """
 
-    def __init__(self, json_data_extractor: JsonDataExtractor, max_items: int):
+    def __init__(self, json_data_extractor: JsonDataExtractor):
         self.json_data_extractor = json_data_extractor
-        self.max_items = max_items
-        self.items_scraped = 0
 
-    def parse_api_response(self, url: str, json_response: str) -> List[FlatItemModel]:
+    def parse_api_response(self, url: str, json_response: Union[str, bytes, ApiPage]) -> List[FlatItemModel]:
         """
         Parses a page and returns a list of PageItems.
         :param url: The URL of the page
-        :param json_response: JSON response as a string.
+        :param json_response: JSON response as a string, or the page decoded already (JsonDataExtractor.decode).
         :return: List of FlatItemModels: id, title, image_url - already validated via pydantic
         """
 
         items = self.json_data_extractor.process_extraction_safely(url=url, json_response=json_response)
-        parsed_items = []
-
-        for item in items:
-            if self.items_scraped >= self.max_items:
-                break
-
-            parsed_item = self.validate_and_create_flat_item(item)
-            if parsed_item:
-                parsed_items.append(parsed_item)
-                self.items_scraped += 1
-
-        return parsed_items
+        with CRAWL_METRICS.timer("validate"):
+            result = self.validate_items(items)
+        if result.errors:
+            logger.error("Dropped %s invalid items from %s: %s", result.invalid_count, url, result.errors)
+        return result.valid
 
     @staticmethod
-    def validate_and_create_flat_item(item: PageItem) -> Optional[FlatItemModel]:
+    def validate_items(items: List[PageItem]) -> BatchValidationResult:
         """
-        Creates a PageItem from a dict and validates it via pydantic.
-        If the item is invalid, it will log an error and return None.
-        :param item: dict containing the item's title and image_url
-        :return: PageItem or None
+        Validate a page of items in one call and create FlatItemModels.
+        If some items are invalid, they are left out and the remaining items are validated again.
+        :param items: list of dicts containing the items' hash_id, title, image_url, price, area, disposition,
+            locality, lat, lon, geohash and fingerprint
+        :return: BatchValidationResult with the valid FlatItemModels and a summary of the errors
         """
+        rows = [
+            {
+                "id": ApiResponseParser.build_flat_id(item.get("hash_id")),
+                "hash_id": item.get("hash_id"),
+                "title": item.get("title"),
+                "image_url": item.get("image_url"),
+                "price": item.get("price"),
+                "area": item.get("area"),
+                "disposition": item.get("disposition"),
+                "locality": item.get("locality"),
+                "lat": item.get("lat"),
+                "lon": item.get("lon"),
+                "geohash": item.get("geohash"),
+                "fingerprint": item.get("fingerprint"),
+            }
+            for item in items
+        ]
         try:
-            return FlatItemModel(id=uuid.uuid4(), title=item["title"], image_url=item["image_url"])
+            return BatchValidationResult(valid=FlatItemListAdapter.validate_python(rows), errors={})
         except ValidationError as e:
-            logger.error("Invalid item: %s. Error: %s", item, e)
-            return None
+            errors = e.errors()
+
+        invalid_indexes = {error["loc"][0] for error in errors}
+        valid_rows = [row for index, row in enumerate(rows) if index not in invalid_indexes]
+        return BatchValidationResult(
+            valid=FlatItemListAdapter.validate_python(valid_rows),
+            errors=dict(Counter(error["type"] for error in errors)),
+        )
+
+    @staticmethod
+    def build_flat_id(hash_id: Optional[int]) -> uuid.UUID:
+        """
+        Build a deterministic flat id from the sreality hash_id. Items without a hash_id get a random id.
+        """
+        if hash_id is None:
+            return uuid.uuid4()
+        return uuid.uuid5(FLAT_ID_NAMESPACE, str(hash_id))
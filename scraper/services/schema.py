@@ -1,15 +1,24 @@
+from typing import Any, Dict, List, Optional
 from uuid import UUID
 from pydantic import field_validator, model_validator
-from pydantic import BaseModel, HttpUrl
+from pydantic import BaseModel, HttpUrl, TypeAdapter
 
 
 class FlatItemModel(BaseModel):
     """
     FlatItemModel is a pydantic model that represents a flat item.
-    The model has three fields:
+    The model has twelve fields:
     - uuid: unique identifier of the flat item
+    - hash_id: stable identifier of the listing on sreality.cz (optional)
     - title: title of the flat listing (e.g. "2+kk, 50m²")
     - image_url: url of the flat listing's image
+    - price: price of the flat listing in CZK (optional)
+    - area: floor area in m² (optional)
+    - disposition: layout of the flat, e.g. "2+kk" (optional)
+    - locality: locality of the flat listing, e.g. "Praha 6 - Bubeneč" (optional)
+    - lat / lon: GPS coordinates of the flat listing (optional)
+    - geohash: geohash of the coordinates, see database.geohash (optional)
+    - fingerprint: hash of the listing's fields on the list endpoint, changes whenever the listing changes (optional)
 
     The model has two validators:
     - field_validator: validates the title field
@@ -20,8 +29,17 @@ class FlatItemModel(BaseModel):
     """
 
     id: UUID
+    hash_id: Optional[int] = None
     title: str
     image_url: HttpUrl
+    price: Optional[int] = None
+    area: Optional[int] = None
+    disposition: Optional[str] = None
+    locality: Optional[str] = None
+    lat: Optional[float] = None
+    lon: Optional[float] = None
+    geohash: Optional[str] = None
+    fingerprint: Optional[str] = None
 
     class Config:
         from_attributes = True
@@ -39,4 +57,34 @@ class FlatItemModel(BaseModel):
         return values
 
     def model_dump(self, *args, **kwargs) -> dict:
-        return {"id": self.id, "title": self.title, "image_url": str(self.image_url)}
+        return {
+            "id": self.id,
+            "hash_id": self.hash_id,
+            "title": self.title,
+            "image_url": str(self.image_url),
+            "price": self.price,
+            "area": self.area,
+            "disposition": self.disposition,
+            "locality": self.locality,
+            "lat": self.lat,
+            "lon": self.lon,
+            "geohash": self.geohash,
+            "fingerprint": self.fingerprint,
+        }
+
+
+class FlatDetailItemModel(BaseModel):
+    """
+    FlatDetailItemModel represents the payload of the per-estate detail endpoint:
+    - hash_id: stable identifier of the listing on sreality.cz
+    - list_fingerprint: fingerprint of the listing on the list endpoint when the detail was requested
+    - payload: the decoded detail JSON
+    """
+
+    hash_id: int
+    list_fingerprint: Optional[str] = None
+    payload: Dict[str, Any]
+
+
+# Validates a whole page of flat items in one call, see ApiResponseParser.validate_items()
+FlatItemListAdapter = TypeAdapter(List[FlatItemModel])
@@ -0,0 +1,132 @@
+import hashlib
+import logging
+import math
+import os
+import struct
+import tempfile
+from typing import Iterable, List, Optional
+
+logger = logging.getLogger(__name__)
+
+
+class BloomFilter:
+    """
+    Bloom filter of integer keys (sreality hash_ids): a set that answers "maybe stored" or "certainly not stored"
+    in a fixed amount of memory, whatever the number of keys added.
+
+    The filter is sized for capacity keys at the target false_positive_rate: num_bits = -n ln p / (ln 2)² bits and
+    num_hashes = num_bits / n ln 2 bit positions per key (about 14.4 bits and 10 positions per key at p = 0.001).
+    The positions are derived from a single blake2b digest of the key by double hashing (h1 + i * h2). Adding more
+    keys than capacity keeps the answers correct for the keys added, but the false positive rate grows: check
+    is_saturated() and build a bigger filter.
+
+    The bits are persisted atomically (temporary file + os.replace) by save() and read back by load():
+        seen = BloomFilter.load(path) or BloomFilter(capacity=200000)
+        seen.add(hash_id)
+        hash_id in seen
+        seen.save(path)
+    """
+
+    MAGIC = b"SBF1"
+    # capacity, false_positive_rate, count
+    HEADER = struct.Struct("<4sQdQ")
+
+    def __init__(self, capacity: int, false_positive_rate: float = 0.001):
+        if capacity < 1:
+            raise ValueError("capacity must be a positive integer")
+        if not 0 < false_positive_rate < 1:
+            raise ValueError("false_positive_rate must be between 0 and 1")
+        self.capacity = capacity
+        self.false_positive_rate = false_positive_rate
+        self.num_bits = max(8, math.ceil(-capacity * math.log(false_positive_rate) / math.log(2) ** 2))
+        self.num_hashes = max(1, round(self.num_bits / capacity * math.log(2)))
+        self.bits = bytearray((self.num_bits + 7) // 8)
+        # Number of distinct keys added (a key that was a false positive when added is not counted)
+        self.count = 0
+
+    def __len__(self) -> int:
+        return self.count
+
+    def _positions(self, key: int) -> List[int]:
+        digest = hashlib.blake2b(key.to_bytes(8, "little", signed=True), digest_size=16).digest()
+        h1 = int.from_bytes(digest[:8], "little")
+        h2 = int.from_bytes(digest[8:], "little") | 1
+        return [(h1 + i * h2) % self.num_bits for i in range(self.num_hashes)]
+
+    def __contains__(self, key: int) -> bool:
+        bits = self.bits
+        return all(bits[position >> 3] & (1 << (position & 7)) for position in self._positions(key))
+
+    def add(self, key: int) -> bool:
+        """
+        :return: True if the key was not in the filter yet (no false positive).
+        """
+        added = False
+        bits = self.bits
+        for position in self._positions(key):
+            mask = 1 << (position & 7)
+            if not bits[position >> 3] & mask:
+                bits[position >> 3] |= mask
+                added = True
+        if added:
+            self.count += 1
+        return added
+
+    def update(self, keys: Iterable[int]) -> None:
+        for key in keys:
+            self.add(key)
+
+    @property
+    def memory_bytes(self) -> int:
+        return len(self.bits)
+
+    def estimated_false_positive_rate(self) -> float:
+        """
+        :return: Probability that a key that was never added is reported as added, at the current count.
+        """
+        return (1 - math.exp(-self.num_hashes * self.count / self.num_bits)) ** self.num_hashes
+
+    def is_saturated(self) -> bool:
+        return self.count > self.capacity
+
+    @classmethod
+    def load(cls, path: str) -> Optional["BloomFilter"]:
+        """
+        :return: The filter stored at path, None if there is none or it cannot be read.
+        """
+        try:
+            with open(path, "rb") as file:
+                data = file.read()
+        except FileNotFoundError:
+            return None
+        try:
+            magic, capacity, false_positive_rate, count = cls.HEADER.unpack_from(data)
+            if magic != cls.MAGIC:
+                raise ValueError("not a Bloom filter file")
+            bloom_filter = cls(capacity, false_positive_rate)
+            if len(data) != cls.HEADER.size + len(bloom_filter.bits):
+                raise ValueError("truncated Bloom filter file")
+        except (struct.error, ValueError) as e:
+            logger.warning("Ignoring unreadable Bloom filter %s: %s", path, e)
+            return None
+        bloom_filter.bits[:] = data[cls.HEADER.size :]
+        bloom_filter.count = count
+        return bloom_filter
+
+    def save(self, path: str) -> None:
+        """
+        Write the filter atomically: a reader sees either the previous or the new filter.
+        """
+        directory = os.path.dirname(os.path.abspath(path))
+        os.makedirs(directory, exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(dir=directory, prefix=".bloom-", suffix=".tmp")
+        try:
+            with os.fdopen(fd, "wb") as file:
+                file.write(self.HEADER.pack(self.MAGIC, self.capacity, self.false_positive_rate, self.count))
+                file.write(self.bits)
+                file.flush()
+                os.fsync(file.fileno())
+            os.replace(tmp_path, path)
+        except BaseException:
+            os.unlink(tmp_path)
+            raise
@@ -50,15 +50,29 @@ ROBOTSTXT_OBEY = True
 
 # Enable or disable downloader middlewares
 # See https://docs.scrapy.org/en/latest/topics/downloader-middleware.html
+# ScraperDownloaderMiddleware adapts the concurrency per domain (AIMD), it must run before RetryMiddleware (550)
 # DOWNLOADER_MIDDLEWARES = {
-#    "scraper.middlewares.ScraperDownloaderMiddleware": 543,
+#    "scraper.middlewares.ScraperDownloaderMiddleware": 560,
 # }
+# ADAPTIVE_CONCURRENCY_ENABLED = True
+# ADAPTIVE_CONCURRENCY_MIN = 1
+# ADAPTIVE_CONCURRENCY_MAX = 16
+# ADAPTIVE_CONCURRENCY_TARGET_LATENCY = 1.0
+# ADAPTIVE_CONCURRENCY_MAX_ERROR_RATE = 0.05
+# ADAPTIVE_CONCURRENCY_WINDOW = 20
 
 # Enable or disable extensions
 # See https://docs.scrapy.org/en/latest/topics/extensions.html
 # EXTENSIONS = {
 #    "scrapy.extensions.telnet.TelnetConsole": None,
+#    "scraper.extensions.CrawlMetricsExtension": 500,
 # }
+# CrawlMetricsExtension: per-stage latencies, throughput and queue depths in the crawl stats (metrics/*),
+# and in the Prometheus text format on http://CRAWL_METRICS_HOST:CRAWL_METRICS_PORT/metrics if the port is set
+# CRAWL_METRICS_ENABLED = True
+# CRAWL_METRICS_INTERVAL = 10.0
+# CRAWL_METRICS_PORT = 0
+# CRAWL_METRICS_HOST = "127.0.0.1"
 
 # Configure item pipelines
 # See https://docs.scrapy.org/en/latest/topics/item-pipeline.html
@@ -66,6 +80,18 @@ ITEM_PIPELINES = {
     "scraper.pipelines.SaveToDatabasePipeline": 300,
 }
 
+# Database writer used by SaveToDatabasePipeline: "upsert" (INSERT ... ON CONFLICT) or "copy" (COPY FROM STDIN)
+# DATABASE_WRITER = "upsert"
+# DATABASE_BULK_INSERT_SIZE = 100
+# Copy straight into flats instead of merging through a staging table (only safe for an empty table)
+# DATABASE_COPY_USE_STAGING = True
+# Batches are written by a background thread pool, the reactor never waits for Postgres
+# DATABASE_WRITER_THREADS = 2
+# Batches queued or being written before SaveToDatabasePipeline starts holding items back
+# DATABASE_MAX_PENDING_BATCHES = 4
+# Seconds after which a partially filled batch is flushed
+# DATABASE_FLUSH_INTERVAL = 5.0
+
 # Enable and configure the AutoThrottle extension (disabled by default)
 # See https://docs.scrapy.org/en/latest/topics/autothrottle.html
 # AUTOTHROTTLE_ENABLED = True
@@ -86,6 +112,8 @@ ITEM_PIPELINES = {
 # HTTPCACHE_DIR = "httpcache"
 # HTTPCACHE_IGNORE_HTTP_CODES = []
 # HTTPCACHE_STORAGE = "scrapy.extensions.httpcache.FilesystemCacheStorage"
+# The sreality spider configures the cache from the SREALITY_HTTPCACHE_MODE (off|record|replay|revalidate) and
+# SREALITY_HTTPCACHE_DIR environment variables, see scraper.httpcache.HttpCacheConfig
 
 # Set settings whose default value is deprecated to a future-proof value
 REQUEST_FINGERPRINTER_IMPLEMENTATION = "2.7"
@@ -0,0 +1,15 @@
+"""
+Custom signals of the scraper, sent through crawler.signals like the built-in scrapy signals.
+"""
+
+# Sent by SaveToDatabasePipeline (and its subclasses) in the reactor thread after a batch was committed.
+# Args: items - the items of the batch, result - the writer's result (UpsertResult or None), pipeline
+batch_flushed = object()
+
+# Sent by SaveToDatabasePipeline (and its subclasses) in the reactor thread after a batch failed to be written.
+# Args: items - the items of the batch, failure - the Failure of the writer, pipeline
+batch_failed = object()
+
+# Sent by the spider to ask the pipelines whether items are still to be written. Every receiver returns the number
+# of items it buffers or writes; no receiver (no database pipeline) means nothing is pending.
+writes_pending = object()
@@ -1,12 +1,28 @@
+import json
 import logging
-from typing import Generator
+import math
+import os
+from typing import Generator, List, Optional, Tuple
 
 import scrapy
+from scrapy import signals
+from scrapy.exceptions import DontCloseSpider
 
 from database.config import db_config
+from database.factory import SQLAlchemySessionFactory
+from database.services.flat import FlatDataReader
+from database.services.flat_detail import FlatDetailReader
+from database.services.image_cache import DiskLRUCache, ImageCacheConfig
+from scraper import signals as scraper_signals
+from scraper.httpcache import NOT_MODIFIED_FLAG, HttpCacheConfig
+from scraper.services.checkpoint import CrawlCheckpoint
 from scraper.services.configuration import ApiUrlConfigService
+from scraper.services.decoder import get_decoder
 from scraper.services.parser import ApiResponseParser
 from scraper.services.extractor import JsonDataExtractor
+from scraper.services.frontier import RedisCrawlFrontier
+from scraper.services.schema import FlatDetailItemModel, FlatItemModel
+from scraper.services.seen_filter import BloomFilter
 
 logger = logging.getLogger(__name__)
 
@@ -22,8 +38,71 @@ class SrealitySpider(scrapy.Spider):
     The spider is able to scrape listings in multiple languages: Czech, English, Russian.
     Languages are supported by the sreality.cz website.
 
-    Once the spider is started, it will scrape the first page and then it will scrape the next page and so on.
-    The spider will stop scraping once it reaches the max_items limit (500 by default)
+    Once the spider is started, it will scrape the first page and read the total number of listings (result_size)
+    from it. The remaining pages are then requested concurrently: up to concurrent_pages (16 by default) page requests
+    are kept in flight, and every finished page schedules the next one until the last page is reached. How many of
+    them are downloaded at the same time is adapted to the API by ScraperDownloaderMiddleware.
+    The spider will stop scraping once it reaches the max_items limit (500 by default). With max_items=all the
+    whole catalog is crawled: the spider keeps only counters and the window of in-flight pages, the parser works
+    page by page and the pipeline writes bounded batches, so memory stays flat as the catalog grows. Detail and
+    image requests are produced faster than their download slots fetch them; once max_pending_requests of them
+    are waiting, no further pages are requested until half of them are done.
+
+    The categories argument selects the categories to crawl (see ApiUrlConfigService.parse_categories), flats
+    for sale (1:1) by default. Categories are crawled one after the other, each with its own pagination, and
+    max_items is shared by all of them.
+
+    In incremental mode the spider requests listings newest-first, one page at a time, and skips listings whose
+    sreality hash_id is already stored. It stops paginating at the first page on which every listing is known,
+    so a refresh run only downloads the pages added since the previous run.
+    Whether a listing is stored is first looked up in a Bloom filter of the stored hash_ids (see BloomFilter), and
+    only its positive answers are confirmed with a database query: new listings, the bulk of what a refresh run
+    parses, never reach the database before they are saved. The filter is loaded at start from seen_filter_path
+    (argument or SREALITY_SEEN_FILTER_PATH environment variable), or built from the flats table if there is no
+    stored filter or it holds more ids than it was sized for. The hash_ids of every batch the pipeline commits are
+    added to it, and it is saved back when the spider closes. Its size, fill and estimated false positive rate
+    are reported in the seen_filter/* stats, with the number of positives the database confirmed or rejected.
+
+    In distributed mode (frontier_url is set) several workers share a RedisCrawlFrontier: one worker fetches the
+    first page and pushes the URLs of all remaining pages to the shared queue, and every worker pulls page URLs
+    from it. The max_items limit is shared by all workers. Workers of the same crawl must use the same crawl_id.
+    A page that fails is queued again for any worker to retry (up to RedisCrawlFrontier.MAX_PAGE_RETRIES times).
+    Once the crawl is finished its keys expire after RedisCrawlFrontier.FINISHED_CRAWL_TTL seconds, the crawl_id
+    can then be used again.
+
+    With details enabled, a second stage requests the detail endpoint of every listing that is new or whose
+    list-level fingerprint changed since its detail was last fetched, and saves the payload to flat_details
+    (SaveFlatDetailsPipeline). Detail requests use their own download slot (DETAIL_DOWNLOAD_SLOT, with its own
+    concurrency in DOWNLOAD_SLOTS) and a higher priority for new listings than for changed ones. The scheduler
+    picks requests from the least busy slot, so the detail stage does not hold back the list pages.
+
+    With prefetch_images enabled, the thumbnails of the listings that are not in the image cache of the HTTP
+    server's image proxy (see ImageCacheConfig) yet are downloaded during the crawl and stored in the cache, so
+    the first visitor of a page does not wait for the image CDN. Image requests use their own download slot
+    (IMAGE_DOWNLOAD_SLOT) and the lowest priority.
+
+    The API responses can be recorded and replayed through the HTTP cache (see HttpCacheConfig), configured by the
+    SREALITY_HTTPCACHE_MODE environment variable. In "revalidate" mode a page the API reports as not modified
+    still drives pagination, but its listings are not parsed again.
+
+    With a checkpoint path (checkpoint_path argument or SREALITY_CHECKPOINT_PATH environment variable) a full crawl
+    persists its progress (see CrawlCheckpoint) every time the pipeline commits a batch. A crawl restarted after a
+    crash or a deploy skips the pages whose listings were all saved and continues with the items_scraped counter
+    it stopped at. The checkpoint is removed once the crawl finishes. Incremental crawls stop at the first known
+    page anyway, and the distributed frontier already keeps its state in Redis, so both ignore the checkpoint.
+
+    Usage:
+        SREALITY_HTTPCACHE_MODE=replay scrapy runspider scraper/spiders/sreality_spider.py
+        scrapy runspider scraper/spiders/sreality_spider.py -a concurrent_pages=32
+        scrapy runspider scraper/spiders/sreality_spider.py -a max_items=all -a categories=all
+        scrapy runspider scraper/spiders/sreality_spider.py -a max_items=20000 -a categories=1:1,1:2
+        scrapy runspider scraper/spiders/sreality_spider.py -a incremental=true
+        scrapy runspider scraper/spiders/sreality_spider.py -a incremental=true -a seen_filter_path=.scrapy/seen.bloom
+        scrapy runspider scraper/spiders/sreality_spider.py -a frontier_url=redis://redis:6379/0 -a crawl_id=run-42
+        scrapy runspider scraper/spiders/sreality_spider.py -a json_decoder=json
+        scrapy runspider scraper/spiders/sreality_spider.py -a details=true
+        IMAGE_CACHE_DIR=/var/cache/sreality scrapy runspider scraper/spiders/sreality_spider.py -a prefetch_images=true
+        scrapy runspider scraper/spiders/sreality_spider.py -a checkpoint_path=.scrapy/checkpoints/sreality.json
 
     The spider pass the scraped items to SaveToDatabasePipeline
     which is responsible for saving the items to the database:
@@ -35,51 +114,595 @@ class SrealitySpider(scrapy.Spider):
     """
 
     name = "sreality_spider"
+    DETAIL_DOWNLOAD_SLOT = "sreality-details"
+    DETAIL_PRIORITY_NEW = 20
+    DETAIL_PRIORITY_CHANGED = 10
+    IMAGE_DOWNLOAD_SLOT = "sreality-images"
+    IMAGE_PRIORITY = -10
+    SEEN_FILTER_MIN_CAPACITY = 100000
+    SEEN_FILTER_FALSE_POSITIVE_RATE = 0.001
+
     custom_settings = {
         "DATABASE_URL": db_config.url,
-        "ITEM_PIPELINES": {"scraper.pipelines.SaveToDatabasePipeline": 300},
+        "ITEM_PIPELINES": {
+            "scraper.pipelines.SaveToDatabasePipeline": 300,
+            "scraper.pipelines.SaveFlatDetailsPipeline": 310,
+        },
+        "DOWNLOADER_MIDDLEWARES": {"scraper.middlewares.ScraperDownloaderMiddleware": 560},
+        "EXTENSIONS": {"scraper.extensions.CrawlMetricsExtension": 500},
+        "DOWNLOAD_SLOTS": {DETAIL_DOWNLOAD_SLOT: {"concurrency": 4}, IMAGE_DOWNLOAD_SLOT: {"concurrency": 4}},
+        "SCHEDULER_PRIORITY_QUEUE": "scrapy.pqueues.DownloaderAwarePriorityQueue",
+        **HttpCacheConfig.from_env().to_settings(),
     }
 
-    def __init__(self, language="en", *args, **kwargs):
+    def __init__(
+        self,
+        language="en",
+        concurrent_pages=16,
+        incremental=False,
+        frontier_url=None,
+        crawl_id="default",
+        json_decoder="auto",
+        details=False,
+        checkpoint_path=None,
+        seen_filter_path=None,
+        prefetch_images=False,
+        max_items=500,
+        categories="1:1",
+        max_pending_requests=1000,
+        *args,
+        **kwargs,
+    ):
         super().__init__(*args, **kwargs)
         self.language = language
+        self.incremental = str(incremental).lower() in ("1", "true", "yes")
+        self.details = str(details).lower() in ("1", "true", "yes")
+        self.prefetch_images = str(prefetch_images).lower() in ("1", "true", "yes")
         self.items_scraped = 0
-        self.max_items = 500
-        self.json_data_extractor = JsonDataExtractor()
-        self.page_parser = ApiResponseParser(json_data_extractor=self.json_data_extractor, max_items=self.max_items)
+        self.max_items = self.parse_max_items(max_items)
+        self.categories: List[Tuple[int, int]] = ApiUrlConfigService.parse_categories(str(categories))
+        self.category_index = 0
+        self.max_pending_requests = int(max_pending_requests)
+        self.pending_requests = 0
+        self.held_page_slots = 0
+        self.held_page_url: Optional[str] = None
+        self.concurrent_pages = int(concurrent_pages)
+        self.next_page = 2
+        self.last_page: Optional[int] = None
+        self.json_data_extractor = JsonDataExtractor(decoder=get_decoder(json_decoder))
+        self.page_parser = ApiResponseParser(json_data_extractor=self.json_data_extractor)
+        self.flat_reader = FlatDataReader(SQLAlchemySessionFactory(db_config.url)) if self.incremental else None
+        self.flat_detail_reader = FlatDetailReader(SQLAlchemySessionFactory(db_config.url)) if self.details else None
+        self.image_config = ImageCacheConfig.from_env() if self.prefetch_images else None
+        self.image_cache = (
+            DiskLRUCache(self.image_config.directory, self.image_config.max_bytes) if self.prefetch_images else None
+        )
+        self.frontier = (
+            RedisCrawlFrontier.from_url(frontier_url, key_prefix=f"sreality:{crawl_id}", max_items=self.max_items)
+            if frontier_url
+            else None
+        )
+        if self.frontier is not None and len(self.categories) > 1:
+            raise ValueError("Distributed crawls support a single category")
+        self.checkpoint = self.load_checkpoint(checkpoint_path or os.environ.get("SREALITY_CHECKPOINT_PATH"))
+        self.seen_filter_path = seen_filter_path or os.environ.get("SREALITY_SEEN_FILTER_PATH")
+        self.seen_filter = self.load_seen_filter(self.seen_filter_path) if self.incremental else None
+
+    @classmethod
+    def from_crawler(cls, crawler, *args, **kwargs):
+        spider = super().from_crawler(crawler, *args, **kwargs)
+        crawler.signals.connect(spider.spider_idle, signal=signals.spider_idle)
+        crawler.signals.connect(spider.spider_closed, signal=signals.spider_closed)
+        crawler.signals.connect(spider.batch_flushed, signal=scraper_signals.batch_flushed)
+        crawler.signals.connect(spider.batch_failed, signal=scraper_signals.batch_failed)
+        return spider
+
+    @staticmethod
+    def parse_max_items(value) -> Optional[int]:
+        """
+        :param value: Maximum number of items to scrape, "all" (or "none", "unbounded") for no limit.
+        :return: The limit, None for no limit.
+        """
+        if value is None or str(value).lower() in ("all", "none", "unbounded"):
+            return None
+        return int(value)
+
+    @staticmethod
+    def category_key(category: Tuple[int, int]) -> str:
+        return "{}:{}".format(*category)
+
+    def get_start_url(self, custom_parameters: dict = None) -> str:
+        """
+        :return: The URL of the first page of the category being crawled.
+        """
+        parameters = ApiUrlConfigService.get_category_parameters(self.categories[self.category_index])
+        return ApiUrlConfigService.get_start_url({**parameters, **(custom_parameters or {})})
+
+    def load_checkpoint(self, path: Optional[str]) -> Optional[CrawlCheckpoint]:
+        """
+        Load the crawl state stored at path and resume from it, or start a new checkpoint there.
+        :return: The checkpoint, None if checkpoints are disabled.
+        """
+        if not path:
+            return None
+        if self.incremental or self.frontier is not None:
+            logger.warning("Crawl checkpoints are supported by full crawls only, ignoring %s", path)
+            return None
+
+        categories = ",".join(self.category_key(category) for category in self.categories)
+        crawl_key = f"{ApiUrlConfigService.BASE_API_URL}?categories={categories}&max_items={self.max_items}"
+        checkpoint = CrawlCheckpoint.load(path, crawl_key)
+        if checkpoint is None:
+            return CrawlCheckpoint(path, crawl_key)
+
+        # Categories are crawled in order, the completed ones are skipped
+        self.category_index = len(checkpoint.completed_categories)
+        self.items_scraped = checkpoint.items_scraped
+        if checkpoint.last_page is not None:
+            self.last_page = checkpoint.last_page
+            self.next_page = 1
+        logger.info(
+            "Resuming crawl from %s: %s of %s categories and %s of %s pages completed, %s items scraped",
+            path,
+            len(checkpoint.completed_categories),
+            len(self.categories),
+            len(checkpoint.completed_pages),
+            checkpoint.last_page,
+            checkpoint.items_scraped,
+        )
+        return checkpoint
+
+    def load_seen_filter(self, path: Optional[str]) -> BloomFilter:
+        """
+        Load the Bloom filter of the stored hash_ids from path, or build it from the database: sized for twice the
+        stored hash_ids (at least SEEN_FILTER_MIN_CAPACITY), so it serves many crawls before it is rebuilt.
+        """
+        seen_filter = BloomFilter.load(path) if path else None
+        if seen_filter is not None and not seen_filter.is_saturated():
+            logger.info("Loaded the seen filter of %s hash_ids from %s", len(seen_filter), path)
+            return seen_filter
+
+        count = self.flat_reader.retrieve_hash_id_count()
+        seen_filter = BloomFilter(
+            capacity=max(self.SEEN_FILTER_MIN_CAPACITY, 2 * count),
+            false_positive_rate=self.SEEN_FILTER_FALSE_POSITIVE_RATE,
+        )
+        seen_filter.update(self.flat_reader.iterate_hash_ids())
+        logger.info("Built the seen filter of %s hash_ids (%s bytes)", len(seen_filter), seen_filter.memory_bytes)
+        return seen_filter
+
+    def record_seen_filter_stats(self) -> None:
+        stats = self.crawler.stats
+        stats.set_value("seen_filter/hash_ids", len(self.seen_filter))
+        stats.set_value("seen_filter/capacity", self.seen_filter.capacity)
+        stats.set_value("seen_filter/memory_bytes", self.seen_filter.memory_bytes)
+        stats.set_value("seen_filter/false_positive_rate", round(self.seen_filter.estimated_false_positive_rate(), 6))
 
     def start_requests(self) -> Generator[scrapy.Request, None, None]:
-        start_url = ApiUrlConfigService.get_start_url()
-        yield scrapy.Request(start_url, callback=self.parse)
+        if self.frontier is not None and not self.frontier.claim_seed():
+            if self.frontier.is_finished():
+                logger.warning(
+                    "Crawl %s is already finished, its state expires in %s s: start a new crawl with another crawl_id",
+                    self.frontier.seed_key,
+                    self.frontier.ttl(),
+                )
+            # Another worker fetches the first page, this one waits for page URLs in spider_idle()
+            return
+        if self.category_index >= len(self.categories):
+            # Resumed from the checkpoint of a crawl whose categories are all completed
+            return
+        if self.last_page is not None:
+            # Resumed: last_page is known already, the pages that are not completed are scheduled like any next page
+            yield from self.schedule_next_pages(self.get_start_url(), count=self.concurrent_pages)
+            return
+        yield self.build_start_request()
+
+    def build_start_request(self) -> scrapy.Request:
+        if self.incremental:
+            start_url = self.get_start_url({"sort": ApiUrlConfigService.NEWEST_FIRST_SORT})
+        else:
+            start_url = self.get_start_url()
+        return scrapy.Request(start_url, callback=self.parse, errback=self.handle_request_failure)
+
+    def spider_idle(self, spider):
+        """
+        Keep the spider open while there is work left:
+        - once a category is crawled, continue with the next one
+        - in distributed mode, pull more page URLs from the shared frontier until the crawl is finished. If the
+          worker that claimed the first page died, its claim expires and this worker retries it.
+        """
+        if self.frontier is None:
+            self.continue_with_next_category()
+            return
+        if self.frontier.is_finished():
+            return
+
+        if not self.frontier.is_seeded() and self.frontier.claim_seed():
+            requests = [self.build_start_request()]
+        else:
+            requests = list(self.schedule_next_pages(ApiUrlConfigService.BASE_API_URL, count=self.concurrent_pages))
+
+        for request in requests:
+            self.crawler.engine.crawl(request)
+        raise DontCloseSpider
+
+    def continue_with_next_category(self) -> None:
+        """
+        Start the pagination of the next category, if any and the max_items limit is not reached.
+        :raises DontCloseSpider: A category is left to crawl.
+        """
+        if self.held_page_slots:
+            self.release_held_pages()
+            raise DontCloseSpider
+        if self.category_index + 1 >= len(self.categories) or self.is_max_items_reached():
+            return
+        if self.checkpoint is not None:
+            if self.checkpoint.unwritten_items:
+                if self.pending_writes():
+                    # The pages of the category are completed once the pipeline flushed their last items
+                    raise DontCloseSpider
+                logger.warning(
+                    "No pipeline writes the items of %s pages, completing the category without them",
+                    len(self.checkpoint.unwritten_items),
+                )
+            if self.checkpoint.failed_pages:
+                logger.warning(
+                    "Pages %s of category %s failed to be written, they are not crawled again on resume",
+                    sorted(self.checkpoint.failed_pages),
+                    self.category_key(self.categories[self.category_index]),
+                )
+            self.checkpoint.category_completed(self.category_key(self.categories[self.category_index]))
+            self.checkpoint.save()
+
+        self.category_index += 1
+        self.last_page, self.next_page = None, 2
+        logger.info("Crawling category %s", self.category_key(self.categories[self.category_index]))
+        self.crawler.engine.crawl(self.build_start_request())
+        raise DontCloseSpider
 
     def parse(self, response: scrapy.http.Response, **kwargs):
         logger.debug("Start parsing %s", response.url)
 
         if response.status != 200 or not response.body:
             logging.error(f"Error while scraping {response.url}. Status code: {response.status}")
-            return None
+            self.requeue_failed_page(response.url)
+            yield from self.schedule_next_pages(response.url, count=1)
+            return
+
+        if self.incremental:
+            yield from self.parse_incremental(response)
+            return
 
+        # The first page is read twice (result_size, then its listings): it is decoded once
+        page = response.body
+        if self.is_first_page(response.url):
+            page = self.json_data_extractor.decode(response.body)
+            result_size = self.json_data_extractor.extract_result_size(page)
+            self.last_page = self.calculate_last_page(result_size, ApiUrlConfigService.get_per_page(response.url))
+            logger.info("Found %s listings, scraping up to page %s", result_size, self.last_page)
+            if self.checkpoint is not None:
+                self.checkpoint.last_page = self.last_page
+            if self.frontier is not None:
+                pages = range(2, self.last_page + 1)
+                self.frontier.push(ApiUrlConfigService.build_page_url(response.url, page) for page in pages)
+                self.frontier.mark_seeded()
+            yield from self.schedule_next_pages(response.url, count=self.concurrent_pages)
+        else:
+            yield from self.schedule_next_pages(response.url, count=1)
+
+        if NOT_MODIFIED_FLAG in response.flags:
+            logger.debug("%s not modified since the last crawl, skipping its listings", response.url)
+            self.crawler.stats.inc_value("httpcache/not_modified_skipped")
+            self.record_page(response.url, [])
+            return
+
+        parsed_items = self.page_parser.parse_api_response(url=response.url, json_response=page)
+        if self.frontier is not None:
+            parsed_items = parsed_items[: self.frontier.claim_items(len(parsed_items))]
+        accepted_items = self.take_items_within_limit(parsed_items)
+        self.record_page(response.url, accepted_items)
+        yield from accepted_items
+        yield from self.schedule_details(accepted_items)
+        yield from self.schedule_image_prefetch(accepted_items)
+
+    def parse_incremental(self, response: scrapy.http.Response):
+        """
+        Parse a newest-first page in incremental mode: yield only listings that are not stored yet and request
+        the next page only if this page contained at least one new listing.
+        """
         parsed_items = self.page_parser.parse_api_response(url=response.url, json_response=response.body)
-        for item in parsed_items:
-            if not self.increment_items_scraped():
-                return
-            yield item
+        new_items = self.filter_known_items(parsed_items)
 
-        if self.items_scraped < self.max_items:
+        accepted_items = self.take_items_within_limit(new_items)
+        yield from accepted_items
+        yield from self.schedule_details(accepted_items)
+        yield from self.schedule_image_prefetch(accepted_items)
+        if len(accepted_items) < len(new_items):
+            return
+
+        if not parsed_items:
+            logger.info("No more pages to scrape")
+        elif not new_items:
+            logger.info("All listings on %s are already known, stopping", response.url)
+        elif not self.is_max_items_reached():
             next_page_url = ApiUrlConfigService.build_next_page_url(response.url)
-            if next_page_url:
-                yield scrapy.Request(next_page_url, callback=self.parse)
+            yield scrapy.Request(next_page_url, callback=self.parse)
+
+    def filter_known_items(self, items: List[FlatItemModel]) -> List[FlatItemModel]:
+        """
+        Drop the items whose sreality hash_id is already stored in the database. Only the hash_ids the seen filter
+        reports as stored are looked up (one query per page with any of them).
+        Items without a hash_id cannot be compared and are always kept.
+        """
+        hash_ids = {item.hash_id for item in items if item.hash_id is not None}
+        if self.seen_filter is not None:
+            hash_ids = {hash_id for hash_id in hash_ids if hash_id in self.seen_filter}
+        known_hash_ids = self.flat_reader.retrieve_existing_hash_ids(hash_ids)
+        if self.seen_filter is not None and hash_ids:
+            self.crawler.stats.inc_value("seen_filter/positives", len(hash_ids))
+            self.crawler.stats.inc_value("seen_filter/false_positives", len(hash_ids) - len(known_hash_ids))
+        return [item for item in items if item.hash_id is None or item.hash_id not in known_hash_ids]
+
+    def schedule_details(self, items: List[FlatItemModel]) -> Generator[scrapy.Request, None, None]:
+        """
+        Request the detail endpoint of the listings that are new or whose list fingerprint differs from the one
+        their stored detail was fetched for (one query per page). New listings are requested first.
+        """
+        if not self.details:
+            return
+        items = [item for item in items if item.hash_id is not None]
+        list_fingerprints = self.flat_detail_reader.retrieve_list_fingerprints(item.hash_id for item in items)
+
+        for item in items:
+            if item.hash_id not in list_fingerprints:
+                priority, reason = self.DETAIL_PRIORITY_NEW, "new"
+            elif list_fingerprints[item.hash_id] != item.fingerprint:
+                priority, reason = self.DETAIL_PRIORITY_CHANGED, "changed"
             else:
-                logger.info("No more pages to scrape")
+                continue
+            self.crawler.stats.inc_value(f"details/scheduled_{reason}")
+            self.pending_requests += 1
+            # Detail and image URLs are unique per listing: the dupefilter would only keep one fingerprint per
+            # listing in memory for the whole crawl
+            yield scrapy.Request(
+                ApiUrlConfigService.get_detail_url(item.hash_id),
+                callback=self.parse_detail,
+                errback=self.handle_detail_failure,
+                priority=priority,
+                dont_filter=True,
+                meta={
+                    "download_slot": self.DETAIL_DOWNLOAD_SLOT,
+                    "hash_id": item.hash_id,
+                    "list_fingerprint": item.fingerprint,
+                },
+            )
+
+    def parse_detail(self, response: scrapy.http.Response):
+        self.request_finished()
+        if response.status != 200 or not response.body:
+            logger.error("Error while scraping detail %s. Status code: %s", response.url, response.status)
+            return
+        try:
+            payload = json.loads(response.body)
+        except ValueError as e:
+            logger.error("Invalid detail payload %s: %s", response.url, e)
+            return
+        yield FlatDetailItemModel(
+            hash_id=response.meta["hash_id"], list_fingerprint=response.meta["list_fingerprint"], payload=payload
+        )
+
+    def handle_detail_failure(self, failure):
+        self.request_finished()
+        logger.error("Failed to scrape detail %s: %s", failure.request.url, failure.value)
+        self.crawler.stats.inc_value("details/failed")
+
+    def schedule_image_prefetch(self, items: List[FlatItemModel]) -> Generator[scrapy.Request, None, None]:
+        """
+        Request the thumbnails of the listings that are not in the image cache yet.
+        """
+        if self.image_cache is None:
+            return
+        for item in items:
+            thumbnail_url = self.image_config.thumbnail_url(str(item.image_url))
+            if thumbnail_url in self.image_cache:
+                continue
+            self.crawler.stats.inc_value("images/prefetch_scheduled")
+            self.pending_requests += 1
+            yield scrapy.Request(
+                thumbnail_url,
+                callback=self.store_image,
+                errback=self.handle_image_failure,
+                priority=self.IMAGE_PRIORITY,
+                dont_filter=True,
+                meta={"download_slot": self.IMAGE_DOWNLOAD_SLOT, "thumbnail_url": thumbnail_url, "dont_cache": True},
+            )
+
+    def store_image(self, response: scrapy.http.Response):
+        self.request_finished()
+        if response.status != 200 or not response.body:
+            logger.warning("Failed to prefetch image %s. Status code: %s", response.url, response.status)
+            self.crawler.stats.inc_value("images/prefetch_failed")
+            return
+        # Keyed by the thumbnail URL the image proxy computes, not by the (escaped or redirected) response URL
+        self.image_cache.put(response.meta["thumbnail_url"], response.body)
+        self.crawler.stats.inc_value("images/prefetched")
+
+    def handle_image_failure(self, failure):
+        self.request_finished()
+        logger.warning("Failed to prefetch image %s: %s", failure.request.url, failure.value)
+        self.crawler.stats.inc_value("images/prefetch_failed")
+
+    def request_finished(self) -> None:
+        """
+        Called when a detail or image request is done: release the held pages once half of the backlog drained.
+        """
+        self.pending_requests -= 1
+        if self.held_page_slots and self.pending_requests <= self.max_pending_requests // 2:
+            self.release_held_pages()
+
+    def release_held_pages(self) -> None:
+        slots, self.held_page_slots = self.held_page_slots, 0
+        for request in self.schedule_next_pages(self.held_page_url, count=slots):
+            self.crawler.engine.crawl(request)
+
+    def record_page(self, url: str, items: List[FlatItemModel]) -> None:
+        """
+        Register the items yielded by a parsed page in the checkpoint: the page is completed once they are saved.
+        """
+        if self.checkpoint is not None:
+            self.checkpoint.page_parsed(ApiUrlConfigService.get_page_number(url), [item.id for item in items])
+
+    def batch_flushed(self, items: list):
+        """
+        Called when a pipeline committed a batch (scraper.signals.batch_flushed): add the hash_ids of the batch to
+        the seen filter and persist the checkpoint.
+        """
+        if self.seen_filter is not None:
+            self.seen_filter.update(
+                item.hash_id for item in items if isinstance(item, FlatItemModel) and item.hash_id is not None
+            )
+        if self.checkpoint is None:
+            return
+        if self.checkpoint.items_written(item.id for item in items if isinstance(item, FlatItemModel)):
+            self.checkpoint.save()
+            self.crawler.stats.set_value("checkpoint/pages_completed", len(self.checkpoint.completed_pages))
+            self.crawler.stats.set_value("checkpoint/items_flushed", self.checkpoint.items_flushed)
+
+    def batch_failed(self, items: list):
+        """
+        Called when a pipeline failed to write a batch (scraper.signals.batch_failed): the pages of its items are
+        not completed, and the spider stops waiting for them.
+        """
+        if self.checkpoint is not None:
+            self.checkpoint.items_failed(item.id for item in items if isinstance(item, FlatItemModel))
+            self.crawler.stats.set_value("checkpoint/pages_failed", len(self.checkpoint.failed_pages))
+
+    def pending_writes(self) -> int:
+        """
+        :return: Number of items the pipelines still have to write (scraper.signals.writes_pending).
+        """
+        responses = self.crawler.signals.send_catch_log(signal=scraper_signals.writes_pending)
+        return sum(response for _, response in responses if isinstance(response, int))
+
+    def spider_closed(self, spider, reason: str):
+        """
+        Remove the checkpoint of a finished crawl, keep the progress of an interrupted one (e.g. reason "shutdown").
+        Save the seen filter: it holds the hash_ids of committed batches only, whatever the reason.
+        Expire the frontier of a finished distributed crawl, so that its crawl_id can be used again.
+        """
+        if self.frontier is not None and reason == "finished" and self.frontier.is_finished():
+            self.frontier.expire()
+        if self.seen_filter is not None:
+            self.record_seen_filter_stats()
+            if self.seen_filter_path:
+                self.seen_filter.save(self.seen_filter_path)
+        if self.checkpoint is None:
+            return
+        if reason == "finished":
+            self.checkpoint.clear()
+        else:
+            self.checkpoint.save()
+            logger.info("Crawl %s, progress saved to %s", reason, self.checkpoint.path)
+
+    def handle_request_failure(self, failure):
+        """
+        Errback for page requests: a failed page must not shrink the window of in-flight page requests.
+        """
+        logger.error("Request failed: %s", failure)
+        if self.frontier is not None and self.is_first_page(failure.request.url):
+            self.frontier.release_seed()
+            return
+        self.requeue_failed_page(failure.request.url)
+        yield from self.schedule_next_pages(failure.request.url, count=1)
+
+    def requeue_failed_page(self, url: str) -> None:
+        """
+        In distributed mode, queue a failed page in the frontier again: the frontier never queues a seen URL twice.
+        """
+        if self.frontier is None:
+            return
+        if self.frontier.requeue(url):
+            self.crawler.stats.inc_value("frontier/pages_requeued")
+        else:
+            logger.error("Giving up %s after %s retries", url, self.frontier.MAX_PAGE_RETRIES)
+            self.crawler.stats.inc_value("frontier/pages_dropped")
+
+    def is_first_page(self, url: str) -> bool:
+        if self.frontier is not None:
+            return ApiUrlConfigService.get_page_number(url) == 1
+        return self.last_page is None
+
+    def calculate_last_page(self, result_size: int, per_page: int) -> int:
+        """
+        Calculate the last page to request: enough pages to cover the max_items limit, but not more
+        than the API has for the query.
+        :param result_size: Total number of listings reported by the API.
+        :param per_page: Number of listings per page.
+        :return: The number of the last page to request.
+        """
+        available_pages = math.ceil(result_size / per_page)
+        if self.max_items is None:
+            return available_pages
+        needed_pages = math.ceil(self.max_items / per_page)
+        return min(available_pages, needed_pages)
+
+    def schedule_next_pages(self, url: str, count: int) -> Generator[scrapy.Request, None, None]:
+        """
+        Schedule up to `count` next page requests. The number of in-flight page requests is therefore capped by
+        concurrent_pages: the first page fills the window, and every finished page refills a single slot.
+        In distributed mode the next pages are taken from the shared frontier instead.
+        While max_pending_requests detail and image requests are waiting, the slots are held instead and
+        released by request_finished().
+        :param url: URL of any API page, used as a template for the next page URLs.
+        :param count: Maximum number of page requests to schedule.
+        """
+        if self.pending_requests >= self.max_pending_requests:
+            self.held_page_slots += count
+            self.held_page_url = url
+            self.crawler.stats.inc_value("pages/held")
+            return
+
+        if self.frontier is not None:
+            if self.frontier.is_max_items_reached():
+                return
+            for next_page_url in self.frontier.pop(count):
+                yield scrapy.Request(next_page_url, callback=self.parse, errback=self.handle_request_failure)
+            return
+
+        if self.last_page is None:
+            return
+
+        for _ in range(count):
+            while self.checkpoint is not None and self.next_page in self.checkpoint.completed_pages:
+                self.next_page += 1
+            if self.next_page > self.last_page or self.is_max_items_reached():
+                return
+            next_page_url = ApiUrlConfigService.build_page_url(url, self.next_page)
+            self.next_page += 1
+            yield scrapy.Request(next_page_url, callback=self.parse, errback=self.handle_request_failure)
+
+    def take_items_within_limit(self, items: List[FlatItemModel]) -> List[FlatItemModel]:
+        """
+        :return: The leading items that fit within the max_items limit, counted as scraped.
+        """
+        accepted_items = []
+        for item in items:
+            if not self.increment_items_scraped():
+                break
+            accepted_items.append(item)
+        return accepted_items
 
     def increment_items_scraped(self) -> bool:
         """
         Increment the number of items scraped.
-        If the number of items scraped is greater than or equal to the max_items limit, then stop scraping.
-        :return: bool - True if the spider should continue scraping, False otherwise.
+        If the number of items scraped has already reached the max_items limit, then stop scraping.
+        :return: bool - True if the item fits within the max_items limit, False otherwise.
         """
-        self.items_scraped += 1
-        if self.items_scraped >= self.max_items:
+        if self.is_max_items_reached():
             logger.warning("Reached maximum item limit of %s", self.max_items)
             return False
+        self.items_scraped += 1
         return True
+
+    def is_max_items_reached(self) -> bool:
+        return self.max_items is not None and self.items_scraped >= self.max_items
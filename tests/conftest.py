@@ -1,8 +1,11 @@
 import logging
+import os
 import threading
+import uuid
 from unittest.mock import Mock
 
 import pytest
+import redis
 from psycopg2.errorcodes import DUPLICATE_DATABASE
 import sqlalchemy
 from sqlalchemy import text
@@ -18,6 +21,7 @@ from http_server.config import ServerConfig
 from http_server.handler import SimpleHTTPRequestHandler
 from http_server.server import SimpleHTTPServer
 from scraper.services.extractor import JsonDataExtractor
+from scraper.services.frontier import RedisCrawlFrontier
 from scraper.services.parser import ApiResponseParser
 from scraper.spiders.sreality_spider import SrealitySpider
 from tests.utils import load_test_data, clear_test_data
@@ -27,6 +31,7 @@ logger = logging.getLogger(__name__)
 SERVER_TESTING_IP = "127.0.0.1"
 SERVER_TESTING_PORT = 8089
 BASE_URL = f"http://{SERVER_TESTING_IP}:{SERVER_TESTING_PORT}"
+REDIS_TESTING_URL = os.environ.get("REDIS_TESTING_URL", "redis://localhost:6379/15")
 
 
 @pytest.fixture(scope="session")
@@ -134,12 +139,14 @@ def test_data(initialized_application, db_session):
 @pytest.fixture(scope="function")
 def empty_database_state(db_session):
     """
-    Ensure the database is in an empty state (specifically, the 'flats' table).
+    Ensure the database is in an empty state (specifically, the 'flats', 'flat_details' and 'price_history' tables).
     :param db_session: The database session.
     :return: None
     """
     with db_session.begin():
         db_session.query(sql_schema.Flat).delete()
+        db_session.query(sql_schema.FlatDetail).delete()
+        db_session.query(sql_schema.PriceHistory).delete()
         db_session.commit()
 
     yield
@@ -158,3 +165,19 @@ def sreality_spider(mock_api_response_parser):
     spider = SrealitySpider(language="en")
     spider.page_parser = mock_api_response_parser
     return spider
+
+
+@pytest.fixture
+def redis_frontier():
+    """
+    RedisCrawlFrontier on a local redis-server (REDIS_TESTING_URL) with a unique key prefix.
+    Tests are skipped if no redis-server is reachable.
+    """
+    frontier = RedisCrawlFrontier.from_url(REDIS_TESTING_URL, key_prefix=f"test:{uuid.uuid4()}", max_items=100)
+    try:
+        frontier.redis.ping()
+    except redis.exceptions.ConnectionError:
+        pytest.skip(f"redis-server is not reachable at {REDIS_TESTING_URL}")
+
+    yield frontier
+    frontier.reset()
@@ -0,0 +1,83 @@
+import threading
+
+from app.services.autocomplete import AutocompleteEntry, AutocompleteIndex, AutocompleteService, fold
+from database.services.notifications import FLATS_UPDATED_CHANNEL, notify
+from database.sql_schema import Flat
+
+ENTRIES = [
+    AutocompleteEntry("locality", "Praha 6 - Bubeneč", 120),
+    AutocompleteEntry("locality", "Praha 2 - Vinohrady", 300),
+    AutocompleteEntry("locality", "Brno - Žabovřesky", 80),
+    AutocompleteEntry("locality", "Bubenečská, Praha 6 - Dejvice", 5),
+    AutocompleteEntry("disposition", "2+kk", 900),
+    AutocompleteEntry("disposition", "2+1", 400),
+]
+
+
+def values(entries):
+    return [entry.value for entry in entries]
+
+
+def test_fold():
+    assert fold(" Praha 6 -\xa0 BUBENEČ ") == "praha 6 - bubenec"
+    assert fold("2+kk") == "2 kk"
+
+
+def test_suggestions_match_word_prefixes_without_accents():
+    index = AutocompleteIndex(ENTRIES)
+    assert values(index.search("bube")) == ["Praha 6 - Bubeneč", "Bubenečská, Praha 6 - Dejvice"]
+    assert values(index.search("ŽAB")) == ["Brno - Žabovřesky"]
+    assert values(index.search("praha")) == [
+        "Praha 2 - Vinohrady",
+        "Praha 6 - Bubeneč",
+        "Bubenečská, Praha 6 - Dejvice",
+    ]
+    assert values(index.search("2+k")) == ["2+kk"]
+    assert values(index.search("", limit=2)) == ["2+kk", "2+1"]
+    assert index.search("ostrava") == []
+
+
+def test_precomputed_suggestions_match_a_scan():
+    entries = [
+        AutocompleteEntry("locality", f"Praha {number % 22 + 1} - Ulice {number}", number) for number in range(500)
+    ]
+    index = AutocompleteIndex(entries)
+    assert "praha 1" in index.precomputed
+    for query in ("p", "praha 1", "praha 1 - ulice 4", "ulice 49", "u"):
+        expected = sorted(
+            (entry for entry in entries if any(word.startswith(query) for word in suffixes(fold(entry.value)))),
+            key=lambda entry: -entry.count,
+        )[: AutocompleteIndex.MAX_LIMIT]
+        assert index.search(query) == expected, query
+
+
+def suffixes(value: str):
+    return [value[position:] for position in range(len(value)) if position == 0 or value[position - 1] == " "]
+
+
+def test_index_is_rebuilt_after_a_crawl_notification(initialized_application, test_data, db_session):
+    service = AutocompleteService(initialized_application.session_factory)
+    service.build()
+    assert service.search("bube") == []
+
+    rebuilt = threading.Event()
+    build = service.build
+
+    def build_and_signal():
+        index = build()
+        rebuilt.set()
+        return index
+
+    service.build = build_and_signal
+    service.start_refresh()
+    try:
+        with db_session.begin():
+            db_session.query(Flat).update({"locality": "Praha 6 - Bubeneč"})
+        # The listener connects in the background: notify until the rebuild is seen
+        for _ in range(50):
+            notify(initialized_application.session_factory, FLATS_UPDATED_CHANNEL)
+            if rebuilt.wait(0.1):
+                break
+        assert service.search("bube") == [AutocompleteEntry("locality", "Praha 6 - Bubeneč", 2)]
+    finally:
+        service.stop_refresh()
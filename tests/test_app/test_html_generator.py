@@ -26,3 +26,8 @@ def test_simple_html_page_generator():
     # Test pagination on the second page
     page_2_html = generator.generate_page(flats, 2)
     assert "<h3>🏠 Flat 3</h3>" in page_2_html
+
+    # Test an estimated total
+    estimated_html = generator.generate_page(flats[:2], 1, total_items=1200000, approximate=True)
+    assert "Page 1 of about 600000" in estimated_html
+    assert "Total Items: about 1200000" in estimated_html
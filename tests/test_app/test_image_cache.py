@@ -0,0 +1,117 @@
+import os
+
+import pytest
+import requests
+
+from app.services.image_cache import ImageProxy
+from database.services.image_cache import DiskLRUCache, build_thumbnail_url
+from app.views import ImageThumbnailView
+from http_server.handler import SimpleHTTPRequestHandler
+from tests.conftest import BASE_URL
+
+JPEG = b"\xff\xd8\xff\xe0" + b"\x00" * 96
+IMAGE_URL = "https://test-a.sdn.cz/d_18/c_img_QM_Kc/pF5BiVP.jpeg?fl=res,400,300,3|shr,,20|jpg,90"
+
+
+class FakeImageHost:
+    """
+    Stand-in of the image CDN counting the fetches.
+    """
+
+    def __init__(self, content: bytes = JPEG, fail: bool = False):
+        self.content = content
+        self.fail = fail
+        self.fetched = []
+
+    def __call__(self, url: str, timeout: float) -> bytes:
+        self.fetched.append(url)
+        if self.fail:
+            raise OSError("Connection refused")
+        return self.content
+
+
+def test_build_thumbnail_url():
+    assert build_thumbnail_url(IMAGE_URL, 200, 150) == (
+        "https://test-a.sdn.cz/d_18/c_img_QM_Kc/pF5BiVP.jpeg?fl=res,200,150,3|shr,,20|jpg,90"
+    )
+    assert build_thumbnail_url("https://example.com/a.jpeg", 200, 150) == "https://example.com/a.jpeg"
+
+
+def test_disk_lru_cache_evicts_least_recently_used(tmp_path):
+    cache = DiskLRUCache(str(tmp_path), max_bytes=250)
+    cache.put("a", b"a" * 100)
+    cache.put("b", b"b" * 100)
+    assert cache.get("a") == b"a" * 100  # "b" is now the least recently used
+
+    cache.put("c", b"c" * 100)
+
+    assert "b" not in cache
+    assert not os.path.exists(cache.path("b"))
+    assert cache.get("a") == b"a" * 100
+    assert cache.get("c") == b"c" * 100
+    assert cache.total_bytes == 200
+
+
+def test_disk_lru_cache_index_survives_restart(tmp_path):
+    cache = DiskLRUCache(str(tmp_path), max_bytes=1000)
+    cache.put("a", b"a" * 100)
+    cache.put("b", b"b" * 100)
+    os.utime(cache.path("a"), (1, 1))  # "a" was used long ago
+
+    reopened = DiskLRUCache(str(tmp_path), max_bytes=150)
+
+    assert len(reopened) == 1
+    assert "a" not in reopened
+    assert reopened.get("b") == b"b" * 100
+
+
+def test_image_proxy_fetches_once(tmp_path):
+    host = FakeImageHost()
+    proxy = ImageProxy(DiskLRUCache(str(tmp_path), max_bytes=1000), 200, 150, fetch=host)
+
+    assert proxy.get_thumbnail(IMAGE_URL) == (JPEG, "image/jpeg")
+    assert proxy.get_thumbnail(IMAGE_URL) == (JPEG, "image/jpeg")
+    assert host.fetched == [proxy.thumbnail_url(IMAGE_URL)]
+    assert proxy.is_cached(IMAGE_URL)
+
+
+@pytest.fixture
+def image_route(initialized_application, tmp_path):
+    """
+    Serve /img/ from a proxy with a temporary cache and a fake image host for the duration of a test.
+    """
+    host = FakeImageHost()
+    view = ImageThumbnailView(
+        initialized_application.session_factory, ImageProxy(DiskLRUCache(str(tmp_path), 10_000), fetch=host)
+    )
+    router = SimpleHTTPRequestHandler.router
+    previous_handler = router.prefix_routes.get(ImageThumbnailView.PATH_PREFIX)
+    SimpleHTTPRequestHandler.add_route(
+        ImageThumbnailView.PATH_PREFIX, lambda handler: view.render(handler.path), prefix=True
+    )
+    yield host
+    if previous_handler is not None:
+        router.prefix_routes[ImageThumbnailView.PATH_PREFIX] = previous_handler
+    else:
+        del router.prefix_routes[ImageThumbnailView.PATH_PREFIX]
+
+
+def test_image_route(server_fixture, test_data, image_route):
+    response = requests.get(f"{BASE_URL}/img/12345678-1234-5678-1234-567812345678")
+    assert response.status_code == 200
+    assert response.headers["Content-Type"] == "image/jpeg"
+    assert "max-age" in response.headers["Cache-Control"]
+    assert response.content == JPEG
+
+    requests.get(f"{BASE_URL}/img/12345678-1234-5678-1234-567812345678?v=2")
+    assert len(image_route.fetched) == 1
+
+
+def test_image_route_not_found(server_fixture, test_data, image_route):
+    assert requests.get(f"{BASE_URL}/img/not-a-uuid").status_code == 404
+    assert requests.get(f"{BASE_URL}/img/00000000-0000-0000-0000-000000000000").status_code == 404
+
+
+def test_image_route_bad_gateway(server_fixture, test_data, image_route):
+    image_route.fail = True
+    assert requests.get(f"{BASE_URL}/img/12345678-1234-5678-1234-567812345679").status_code == 502
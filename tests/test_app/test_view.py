@@ -1,5 +1,10 @@
+import html
+import re
+
 import requests
 
+from database.services.pagination import QueryPaginationService
+from database.services.row_count import ItemCount
 from database.sql_schema import Flat
 from tests.conftest import BASE_URL
 from tests.utils import parse_html_for_flats
@@ -32,3 +37,116 @@ def test_display_flats(server_fixture, test_data, db_session):
             "image_url": "https://test-a.sdn.cz/d_18/c_img_gG_Q/6XJBiV.jpeg?fl=res,400,300,3|shr,,20|jpg,90",
         },
     ]
+
+
+def test_display_flats_cursor(server_fixture, test_data):
+    cursor = QueryPaginationService.encode_cursor(["12345678-1234-5678-1234-567812345678"], 2, item_count=ItemCount(2))
+
+    response = requests.get(BASE_URL + "/", params={"cursor": cursor})
+    assert response.status_code == 200
+    assert [flat["title"] for flat in parse_html_for_flats(response.text)] == [
+        "🏠 Prodej bytu 1+kk 30 m², Praha 6 - Bubeneč, 4990000 CZK"
+    ]
+    assert "Total Items: 2" in response.text
+    previous_url = html.unescape(re.search(r'href="([^"]+)">👈Previous Page', response.text).group(1))
+    assert previous_url.startswith("/?cursor=")
+
+    response = requests.get(BASE_URL + previous_url)
+    assert [flat["title"] for flat in parse_html_for_flats(response.text)] == [
+        "🏠 Prodej bytu 3+kk 73 m², Praha 6 - Bubeneč, 10900000 CZK"
+    ]
+
+    assert requests.get(BASE_URL + "/?cursor=garbage").status_code == 400
+
+
+def test_filtered_flats(server_fixture, test_data, db_session):
+    with db_session.begin():
+        db_session.query(Flat).filter(Flat.id == "12345678-1234-5678-1234-567812345678").update(
+            {"disposition": "3+kk", "area": 73, "price": 10900000, "locality": "Praha 6 - Bubeneč"}
+        )
+        db_session.query(Flat).filter(Flat.id == "12345678-1234-5678-1234-567812345679").update(
+            {"disposition": "1+kk", "area": 30, "price": 4990000, "locality": "Praha 6 - Bubeneč"}
+        )
+
+    response = requests.get(BASE_URL + "/flats", params={"locality": "Praha 6", "sort": "price"})
+    assert response.status_code == 200
+    assert [flat["title"] for flat in parse_html_for_flats(response.text)] == [
+        "🏠 Prodej bytu 1+kk 30 m², Praha 6 - Bubeneč, 4990000 CZK",
+        "🏠 Prodej bytu 3+kk 73 m², Praha 6 - Bubeneč, 10900000 CZK",
+    ]
+
+    response = requests.get(BASE_URL + "/flats?disposition=3%2Bkk&max_price=5000000")
+    assert "No items to display" in response.text
+
+    assert requests.get(BASE_URL + "/flats?sort=title").status_code == 400
+    assert requests.get(BASE_URL + "/flats?cursor=garbage").status_code == 400
+
+
+def test_filtered_flats_cursor(server_fixture, test_data):
+    cursor = QueryPaginationService.encode_cursor(["12345678-1234-5678-1234-567812345678"], 2)
+
+    response = requests.get(BASE_URL + "/flats", params={"cursor": cursor})
+    assert response.status_code == 200
+    assert [flat["title"] for flat in parse_html_for_flats(response.text)] == [
+        "🏠 Prodej bytu 1+kk 30 m², Praha 6 - Bubeneč, 4990000 CZK"
+    ]
+    previous_url = html.unescape(re.search(r'href="([^"]+)">👈Previous Page', response.text).group(1))
+    assert "Next Page" not in response.text
+
+    # The count carried by the cursor is shown, the flats are not counted again
+    cursor = QueryPaginationService.encode_cursor(
+        ["12345678-1234-5678-1234-567812345678"], 2, item_count=ItemCount(42)
+    )
+    assert "Total Items: 42" in requests.get(BASE_URL + "/flats", params={"cursor": cursor}).text
+
+    response = requests.get(BASE_URL + previous_url)
+    assert [flat["title"] for flat in parse_html_for_flats(response.text)] == [
+        "🏠 Prodej bytu 3+kk 73 m², Praha 6 - Bubeneč, 10900000 CZK"
+    ]
+
+
+def test_map_routes(server_fixture, test_data, db_session):
+    with db_session.begin():
+        db_session.query(Flat).filter(Flat.id == "12345678-1234-5678-1234-567812345678").update(
+            {"lat": 50.1020, "lon": 14.3950, "geohash": "u2fjp8f17"}
+        )
+
+    bbox = "14.2,49.95,14.7,50.2"
+    response = requests.get(BASE_URL + "/map/flats", params={"bbox": bbox})
+    assert response.status_code == 200
+    assert response.headers["Content-Type"] == "application/json"
+    assert [flat["id"] for flat in response.json()["flats"]] == ["12345678-1234-5678-1234-567812345678"]
+    assert response.json()["truncated"] is False
+
+    response = requests.get(BASE_URL + "/map/clusters", params={"bbox": bbox, "zoom": 10})
+    assert [cluster["count"] for cluster in response.json()["clusters"]] == [1]
+
+    assert requests.get(BASE_URL + "/map/clusters", params={"bbox": bbox}).status_code == 400
+    assert requests.get(BASE_URL + "/map/flats", params={"bbox": "14.2,49.95"}).status_code == 400
+
+
+def test_search_route(server_fixture, test_data):
+    response = requests.get(BASE_URL + "/search", params={"q": "3+kk bubenec"})
+    assert response.status_code == 200
+    assert [flat["title"] for flat in parse_html_for_flats(response.text)] == [
+        "🏠 Prodej bytu 3+kk 73 m², Praha 6 - Bubeneč, 10900000 CZK"
+    ]
+
+    assert requests.get(BASE_URL + "/search").status_code == 400
+
+
+def test_autocomplete_route(server_fixture):
+    response = requests.get(BASE_URL + "/autocomplete", params={"q": "bube"})
+    assert response.status_code == 200
+    assert response.headers["Content-Type"] == "application/json"
+    assert isinstance(response.json()["suggestions"], list)
+
+    assert requests.get(BASE_URL + "/autocomplete", params={"q": "bube", "limit": 50}).status_code == 400
+
+
+def test_pool_stats_route(server_fixture):
+    response = requests.get(BASE_URL + "/stats/pool")
+    assert response.status_code == 200
+    assert response.headers["Content-Type"] == "application/json"
+    stats = response.json()
+    assert stats["pool_size"] >= 1 and stats["checkouts"] >= 1
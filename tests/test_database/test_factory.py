@@ -0,0 +1,65 @@
+import threading
+
+import pytest
+from sqlalchemy import text
+from sqlalchemy.exc import TimeoutError as PoolTimeoutError
+
+from database.config import PoolConfig
+from database.factory import SQLAlchemySessionFactory, get_session
+
+
+def test_pool_config_from_env(monkeypatch):
+    monkeypatch.setenv("POSTGRES_POOL_SIZE", "2")
+    monkeypatch.setenv("POSTGRES_POOL_PRE_PING", "false")
+    monkeypatch.setenv("POSTGRES_ECHO", "yes")
+    config = PoolConfig.from_env()
+    assert config.to_engine_arguments() == {
+        "pool_size": 2,
+        "max_overflow": 10,
+        "pool_timeout": 30.0,
+        "pool_pre_ping": False,
+        "pool_recycle": 1800,
+        "echo": True,
+    }
+
+    monkeypatch.setenv("POSTGRES_POOL_SIZE", "0")
+    with pytest.raises(RuntimeError):
+        PoolConfig.from_env()
+
+    # -1 is SQLAlchemy's "no overflow limit"
+    assert PoolConfig(max_overflow=-1).to_engine_arguments()["max_overflow"] == -1
+    with pytest.raises(ValueError):
+        PoolConfig(max_overflow=-2)
+
+
+def test_pool_stats(database_url):
+    session_factory = SQLAlchemySessionFactory(database_url, PoolConfig(pool_size=1, max_overflow=0, pool_timeout=0.5))
+    try:
+        for _ in range(3):
+            with get_session(session_factory) as session:
+                session.execute(text("SELECT 1"))
+
+        # The only connection is checked out: a second checkout waits for it, then times out
+        connection = session_factory.engine.raw_connection()
+        released = threading.Timer(0.1, connection.close)
+        released.start()
+        session_factory.engine.raw_connection().close()
+        released.join()
+        connection = session_factory.engine.raw_connection()
+        with pytest.raises(PoolTimeoutError):
+            session_factory.engine.raw_connection()
+        connection.close()
+
+        stats = session_factory.pool_stats()
+        assert stats["pool_size"] == 1 and stats["checked_out"] == 0 and stats["checked_in"] == 1
+        assert stats["checkouts"] == 6
+        assert stats["waits"] == 2 and stats["timeouts"] == 1
+        assert stats["wait_seconds"] >= 0.1
+        assert stats["checkout_ms"]["p50"] <= stats["checkout_ms"]["p99"]
+        assert stats["checkout_ms"]["buckets"][-1] == {"le": "+Inf", "count": 6}
+
+        # The statistics survive the replacement of the pool
+        session_factory.engine.dispose()
+        assert session_factory.pool_stats()["checkouts"] == 6
+    finally:
+        session_factory.engine.dispose()
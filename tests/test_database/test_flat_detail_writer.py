@@ -0,0 +1,22 @@
+from database.services.flat import UpsertResult
+from database.services.flat_detail import FlatDetailReader, FlatDetailWriter
+from scraper.services.schema import FlatDetailItemModel
+
+
+def test_flat_details_are_upserted_with_list_fingerprint(initialized_application, empty_database_state):
+    writer = FlatDetailWriter(initialized_application.session_factory)
+    reader = FlatDetailReader(initialized_application.session_factory)
+
+    result = writer.insert_items(
+        [
+            FlatDetailItemModel(hash_id=1, list_fingerprint="aaaa", payload={"text": {"value": "Flat 1"}}),
+            FlatDetailItemModel(hash_id=2, list_fingerprint="bbbb", payload={"text": {"value": "Flat 2"}}),
+        ]
+    )
+    assert result == UpsertResult(inserted=2, updated=0)
+
+    result = writer.insert_items([FlatDetailItemModel(hash_id=2, list_fingerprint="cccc", payload={})])
+    assert result == UpsertResult(inserted=0, updated=1)
+
+    assert reader.retrieve_list_fingerprints([1, 2, 3]) == {1: "aaaa", 2: "cccc"}
+    assert reader.retrieve_list_fingerprints([]) == {}
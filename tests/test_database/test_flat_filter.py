@@ -0,0 +1,121 @@
+import pytest
+from sqlalchemy import text
+
+from database.services.flat import FlatDataWriter
+from database.services.flat_filter import FlatFilter
+from database.services.pagination import QueryPaginationService
+from database.services.row_count import ItemCount
+from database.sql_schema import Flat
+from scraper.services.parser import ApiResponseParser
+from scraper.services.schema import FlatItemModel
+
+FLATS = [
+    # hash_id, disposition, area, price, locality
+    (1, "2+kk", 54, 5_400_000, "Praha 6 - Bubeneč"),
+    (2, "2+kk", 48, 4_100_000, "Brno - Žabovřesky"),
+    (3, "3+kk", 73, 10_900_000, "Praha 2 - Vinohrady"),
+    (4, "2+kk", 60, None, "Praha 10 - Vršovice"),
+    (5, "1+kk", 30, 4_990_000, "Praha 6 - Bubeneč"),
+]
+
+
+@pytest.fixture
+def flats(initialized_application, empty_database_state):
+    FlatDataWriter(initialized_application.session_factory).insert_items(
+        [
+            FlatItemModel(
+                id=ApiResponseParser.build_flat_id(hash_id),
+                hash_id=hash_id,
+                title=f"Prodej bytu {disposition} {area} m², {locality}",
+                image_url="http://example.com/img.jpg",
+                price=price,
+                area=area,
+                disposition=disposition,
+                locality=locality,
+            )
+            for hash_id, disposition, area, price, locality in FLATS
+        ]
+    )
+
+
+def filtered_hash_ids(db_session, query_string: dict) -> list:
+    flat_filter = FlatFilter.from_query_params({name: [value] for name, value in query_string.items()})
+    with db_session.begin():
+        return [flat.hash_id for flat in flat_filter.apply(db_session.query(Flat))]
+
+
+def test_filter_and_sort(flats, db_session):
+    # "+" decoded as a space by parse_qs
+    assert filtered_hash_ids(db_session, {"disposition": "2 kk", "sort": "price"}) == [2, 1]
+    assert filtered_hash_ids(db_session, {"locality": "Praha", "sort": "-area"}) == [3, 4, 1, 5]
+    assert filtered_hash_ids(db_session, {"min_area": "50", "max_price": "6000000", "sort": "area"}) == [1]
+    assert sorted(filtered_hash_ids(db_session, {"disposition": "2+kk"})) == [1, 2, 4]
+
+
+@pytest.mark.parametrize(
+    "query_string", [{"sort": "title"}, {"min_price": "cheap"}, {"max_area": "-1"}], ids=["sort", "int", "negative"]
+)
+def test_invalid_filter(query_string):
+    with pytest.raises(ValueError):
+        FlatFilter.from_query_params({name: [value] for name, value in query_string.items()})
+
+
+@pytest.mark.parametrize(
+    "flat_filter, index",
+    [
+        (FlatFilter(dispositions=["2+kk"], sort="price"), "ix_flats_disposition_price"),
+        (FlatFilter(ranges={"min_price": 4_000_000}, sort="-price"), "ix_flats_price"),
+        (FlatFilter(ranges={"min_area": 50}), "ix_flats_area"),
+        (FlatFilter(locality="Praha 6"), "ix_flats_locality_price"),
+    ],
+)
+def test_filters_use_indexes(flats, db_session, flat_filter, index):
+    query = flat_filter.apply(db_session.query(Flat))
+    statement = query.statement.compile(db_session.bind, compile_kwargs={"literal_binds": True})
+    with db_session.begin():
+        # The test table is tiny, the planner would scan it sequentially
+        db_session.execute(text("SET LOCAL enable_seqscan = off"))
+        plan = "\n".join(row[0] for row in db_session.execute(text(f"EXPLAIN {statement}")))
+    assert index in plan
+
+
+@pytest.mark.parametrize(
+    "sort, expected", [("price", [[2, 5], [1, 3]]), ("-area", [[3, 4], [1, 2], [5]]), (None, None)]
+)
+def test_keyset_pagination_walks_both_ways(flats, db_session, initialized_application, sort, expected):
+    flat_filter = FlatFilter(sort=sort)
+    sort_columns, descending = flat_filter.sort_key()
+    pagination = QueryPaginationService(initialized_application.session_factory, items_per_page=2)
+    with db_session.begin():
+        query = flat_filter.apply(db_session.query(Flat))
+        if expected is None:
+            all_ids = [flat.hash_id for flat in query]
+            expected = [all_ids[0:2], all_ids[2:4], all_ids[4:]]
+
+        pages, cursor = [], None
+        while True:
+            # The count given on the first page is carried by the cursors
+            item_count = ItemCount(5) if cursor is None else None
+            page = pagination.paginate_query_by_keyset(query, sort_columns, descending, cursor, item_count)
+            assert page.page_number == len(pages) + 1
+            assert page.item_count == ItemCount(5)
+            assert (page.previous_cursor is None) == (page.page_number == 1)
+            pages.append([flat.hash_id for flat in page.items])
+            if page.next_cursor is None:
+                break
+            cursor = page.next_cursor
+        assert pages == expected
+
+        cursor = page.previous_cursor
+        while cursor is not None:
+            page = pagination.paginate_query_by_keyset(query, sort_columns, descending, cursor)
+            assert [flat.hash_id for flat in page.items] == expected[page.page_number - 1]
+            assert page.next_cursor is not None
+            cursor = page.previous_cursor
+        assert page.page_number == 1
+
+
+@pytest.mark.parametrize("cursor", ["garbage", QueryPaginationService.encode_cursor(["x", "y"], 2)])
+def test_invalid_cursor(cursor):
+    with pytest.raises(ValueError):
+        QueryPaginationService.decode_cursor(cursor, [Flat.price, Flat.id])
@@ -0,0 +1,84 @@
+import pytest
+from sqlalchemy import text
+
+from database import geohash
+from database.geohash import BoundingBox
+from database.services.flat import FlatDataWriter
+from database.services.flat_map import FlatMapReader
+from scraper.services.parser import ApiResponseParser
+from scraper.services.schema import FlatItemModel
+
+FLATS = [
+    # hash_id, lat, lon, price
+    (1, 50.0875, 14.4213, 5_400_000),  # Praha - Staré Město
+    (2, 50.0880, 14.4200, 4_100_000),  # Praha - Staré Město
+    (3, 50.1020, 14.3950, 10_900_000),  # Praha 6 - Bubeneč
+    (4, 49.1951, 16.6068, 3_900_000),  # Brno
+    (5, None, None, 4_990_000),
+]
+PRAGUE = BoundingBox(min_lat=49.95, min_lon=14.2, max_lat=50.2, max_lon=14.7)
+
+
+@pytest.fixture
+def flats(initialized_application, empty_database_state):
+    FlatDataWriter(initialized_application.session_factory).insert_items(
+        [
+            FlatItemModel(
+                id=ApiResponseParser.build_flat_id(hash_id),
+                hash_id=hash_id,
+                title=f"Prodej bytu {hash_id}",
+                image_url="http://example.com/img.jpg",
+                price=price,
+                lat=lat,
+                lon=lon,
+                geohash=geohash.encode(lat, lon) if lat is not None else None,
+            )
+            for hash_id, lat, lon, price in FLATS
+        ]
+    )
+    return FlatMapReader(initialized_application.session_factory)
+
+
+def test_geohash_cells_contain_their_points():
+    assert geohash.encode(57.64911, 10.40744, 11) == "u4pruydqqvj"
+    cell = geohash.decode_bbox("u2fkb")
+    assert cell.min_lat <= 50.0875 <= cell.max_lat and cell.min_lon <= 14.4213 <= cell.max_lon
+
+    precision = geohash.cover_precision(PRAGUE, 32)
+    cells = geohash.cover(PRAGUE, precision)
+    assert len(cells) <= 32 < len(geohash.cover(PRAGUE, precision + 1))
+    assert all(any(geohash.encode(lat, lon).startswith(cell) for cell in cells) for _, lat, lon, _ in FLATS[:3])
+
+
+def test_flats_in_bounding_box(flats):
+    assert sorted(flat["hash_id"] for flat in flats.retrieve_flats(PRAGUE, limit=10)) == [1, 2, 3]
+    assert len(flats.retrieve_flats(PRAGUE, limit=2)) == 2
+    # Same geohash cells as PRAGUE, but Bubeneč is outside the exact bounds
+    assert sorted(flat["hash_id"] for flat in flats.retrieve_flats(PRAGUE._replace(max_lat=50.09), 10)) == [1, 2]
+
+
+def test_clusters_by_zoom(flats):
+    country = BoundingBox(min_lat=48.5, min_lon=12.0, max_lat=51.1, max_lon=18.9)
+    assert [(cluster["count"], cluster["min_price"]) for cluster in flats.retrieve_clusters(country, zoom=5)] == [
+        (1, 3_900_000),
+        (3, 4_100_000),
+    ]
+    (bubenec, old_town) = flats.retrieve_clusters(PRAGUE, zoom=12)
+    assert old_town["count"] == 2 and old_town["lat"] == pytest.approx(50.08775)
+    assert bubenec["count"] == 1 and len(bubenec["geohash"]) == FlatMapReader.cluster_precision(12)
+
+
+@pytest.mark.parametrize("value", [None, "14.2,49.95,14.7", "a,b,c,d", "14.7,49.95,14.2,50.2", "14.2,-95,14.7,50"])
+def test_invalid_bounding_box(value):
+    with pytest.raises(ValueError):
+        FlatMapReader.parse_bbox(value)
+
+
+def test_bounding_box_query_uses_geohash_index(flats, db_session):
+    query = flats.query_flats(db_session, PRAGUE, limit=10)
+    statement = query.statement.compile(db_session.bind, compile_kwargs={"literal_binds": True})
+    with db_session.begin():
+        # The test table is tiny, the planner would scan it sequentially
+        db_session.execute(text("SET LOCAL enable_seqscan = off"))
+        plan = "\n".join(row[0] for row in db_session.execute(text(f"EXPLAIN {statement}")))
+    assert "ix_flats_geohash" in plan
@@ -0,0 +1,92 @@
+import pytest
+from sqlalchemy import text
+
+from database.services.flat import FlatCopyWriter, FlatDataWriter
+from database.services.flat_search import FlatSearch
+from database.services.pagination import QueryPaginationService
+from database.services.row_count import CappedCountProvider
+from database.sql_schema import Flat
+from scraper.services.parser import ApiResponseParser
+from scraper.services.schema import FlatItemModel
+
+FLATS = [
+    # hash_id, name, locality
+    (1, "Prodej bytu 2+kk 54 m²", "Praha 6 - Bubeneč"),
+    (2, "Prodej bytu 3+kk 73 m²", "Praha 2 - Vinohrady"),
+    (3, "Prodej bytu 2+1 60 m²", "Brno - Žabovřesky"),
+    (4, "Prodej bytu 1+kk 30 m² u Bubenečského nádraží", "Praha 6 - Bubeneč"),
+]
+
+
+def build_items(flats):
+    return [
+        FlatItemModel(
+            id=ApiResponseParser.build_flat_id(hash_id),
+            hash_id=hash_id,
+            title=f"{name}, {locality}",
+            image_url="http://example.com/img.jpg",
+            locality=locality,
+        )
+        for hash_id, name, locality in flats
+    ]
+
+
+@pytest.fixture
+def flats(initialized_application, empty_database_state):
+    session_factory = initialized_application.session_factory
+    FlatDataWriter(session_factory).insert_items(build_items(FLATS[:2]))
+    # The COPY writer merges through a staging table created LIKE flats, the search vector must still be generated
+    FlatCopyWriter(session_factory).insert_items(build_items(FLATS[2:]))
+
+
+def search(db_session, q: str) -> list:
+    with db_session.begin():
+        return [flat.hash_id for flat in FlatSearch(q).apply(db_session.query(Flat))]
+
+
+def test_search_is_accent_and_case_insensitive(flats, db_session):
+    assert sorted(search(db_session, "bubenec")) == [1, 4]
+    assert search(db_session, "ŽABOVŘESKY") == [3]
+    assert search(db_session, "zabovresky 2+1") == [3]
+    # "2+kk" is a phrase: "2" followed by "kk"
+    assert search(db_session, "2+kk praha") == [1]
+    assert sorted(search(db_session, "praha -vinohrady")) == [1, 4]
+    assert sorted(search(db_session, '"praha 2" or brno')) == [2, 3]
+
+
+def test_search_ranks_better_matches_first(flats, db_session):
+    # Flat 4 mentions Bubeneč in its name, its title and its locality
+    assert search(db_session, "bubenec") == [4, 1]
+
+
+def test_search_results_are_counted_up_to_max_count(flats, initialized_application, db_session):
+    pagination = QueryPaginationService(initialized_application.session_factory, items_per_page=1)
+
+    def paginate(page_number: int):
+        with db_session.begin():
+            query = FlatSearch("prodej").apply(db_session.query(Flat))
+            items, item_count = pagination.paginate_query(query, page_number, CappedCountProvider(max_count=2))
+            return len(items), item_count.value, item_count.is_exact
+
+    assert paginate(1) == (1, 2, False)
+    # The items up to the requested page are always counted
+    assert paginate(3) == (1, 3, False)
+    assert paginate(4) == (1, 4, True)
+
+
+@pytest.mark.parametrize("q", ["", "   ", "x" * 201])
+def test_invalid_search(q):
+    with pytest.raises(ValueError):
+        FlatSearch.from_query_params({"q": [q]})
+
+
+def test_search_uses_gin_index(flats, db_session):
+    query = FlatSearch("bubenec").apply(db_session.query(Flat))
+    # The regconfig argument of websearch_to_tsquery has no literal renderer, the statement is run with parameters
+    statement = query.statement.compile(db_session.bind)
+    with db_session.begin():
+        # The test table is tiny, the planner would scan it sequentially
+        db_session.execute(text("SET LOCAL enable_seqscan = off"))
+        rows = db_session.connection().exec_driver_sql(f"EXPLAIN {statement}", statement.params)
+        plan = "\n".join(row[0] for row in rows)
+    assert "ix_flats_search_vector" in plan
@@ -0,0 +1,82 @@
+import uuid
+
+from database.services.flat import FlatCopyWriter, FlatDataReader, FlatDataWriter, UpsertResult
+from database.sql_schema import Flat
+from scraper.services.parser import ApiResponseParser
+from scraper.services.schema import FlatItemModel
+
+
+def make_flat_item(hash_id: int, title: str) -> FlatItemModel:
+    return FlatItemModel(
+        id=ApiResponseParser.build_flat_id(hash_id),
+        hash_id=hash_id,
+        title=title,
+        image_url="http://example.com/img.jpg",
+    )
+
+
+def test_insert_items_upserts_on_hash_id(initialized_application, empty_database_state, db_session):
+    writer = FlatDataWriter(initialized_application.session_factory)
+
+    result = writer.insert_items([make_flat_item(1, "Flat 1"), make_flat_item(2, "Flat 2")])
+    assert result == UpsertResult(inserted=2, updated=0, unchanged=0)
+
+    result = writer.insert_items([make_flat_item(1, "Flat 1"), make_flat_item(2, "Flat 2, new price")])
+    assert result == UpsertResult(inserted=0, updated=1, unchanged=1)
+
+    with db_session.begin():
+        flats = db_session.query(Flat).order_by(Flat.hash_id).all()
+        assert [(flat.hash_id, flat.title) for flat in flats] == [(1, "Flat 1"), (2, "Flat 2, new price")]
+        assert str(flats[0].id) == str(uuid.uuid5(uuid.uuid5(uuid.NAMESPACE_DNS, "sreality.cz"), "1"))
+
+
+def test_reader_streams_stored_hash_ids(initialized_application, empty_database_state):
+    FlatCopyWriter(initialized_application.session_factory).insert_items(
+        [make_flat_item(i, "Flat") for i in (3, 1, 2)]
+    )
+    reader = FlatDataReader(initialized_application.session_factory)
+
+    assert reader.retrieve_hash_id_count() == 3
+    assert sorted(reader.iterate_hash_ids(batch_size=2)) == [1, 2, 3]
+    assert reader.retrieve_existing_hash_ids([2, 4]) == {2}
+
+
+def test_insert_items_deduplicates_within_batch(initialized_application, empty_database_state, db_session):
+    writer = FlatDataWriter(initialized_application.session_factory)
+
+    result = writer.insert_items([make_flat_item(1, "Flat 1"), make_flat_item(1, "Flat 1, new price")])
+
+    # The dropped duplicate is not a stored row left unchanged
+    assert result == UpsertResult(inserted=1, updated=0, unchanged=0)
+    with db_session.begin():
+        assert [flat.title for flat in db_session.query(Flat).all()] == ["Flat 1, new price"]
+
+
+def test_deduplicated_rows_are_in_hash_id_order():
+    items = [make_flat_item(hash_id, f"Flat {hash_id}") for hash_id in (3, 1, 2, 1)]
+
+    assert [mapping["hash_id"] for mapping in FlatDataWriter._deduplicate(items)] == [1, 2, 3]
+
+
+def test_copy_writer_merges_through_staging_table(initialized_application, empty_database_state, db_session):
+    writer = FlatCopyWriter(initialized_application.session_factory)
+
+    result = writer.insert_items([make_flat_item(1, "Flat 1"), make_flat_item(2, "Flat 2")])
+    assert result == UpsertResult(inserted=2, updated=0, unchanged=0)
+
+    result = writer.insert_items([make_flat_item(1, "Flat 1"), make_flat_item(2, "Flat 2, new price")])
+    assert result == UpsertResult(inserted=0, updated=1, unchanged=1)
+
+    with db_session.begin():
+        flats = db_session.query(Flat).order_by(Flat.hash_id).all()
+        assert [(flat.hash_id, flat.title) for flat in flats] == [(1, "Flat 1"), (2, "Flat 2, new price")]
+
+
+def test_copy_writer_without_staging_copies_into_flats(initialized_application, empty_database_state, db_session):
+    writer = FlatCopyWriter(initialized_application.session_factory, use_staging=False)
+
+    result = writer.insert_items([make_flat_item(1, "Flat 1"), make_flat_item(2, "Flat 2")])
+
+    assert result == UpsertResult(inserted=2, updated=0, unchanged=0)
+    with db_session.begin():
+        assert db_session.query(Flat).count() == 2
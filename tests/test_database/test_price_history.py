@@ -0,0 +1,73 @@
+from datetime import date
+
+from sqlalchemy import text
+
+from database.services.flat import FlatCopyWriter, FlatDataWriter
+from database.services.price_history import create_partition_sql, partition_name
+from database.sql_schema import PriceHistory
+from scraper.services.parser import ApiResponseParser
+from scraper.services.schema import FlatItemModel
+
+
+def make_flat_item(hash_id: int, price) -> FlatItemModel:
+    return FlatItemModel(
+        id=ApiResponseParser.build_flat_id(hash_id),
+        hash_id=hash_id,
+        title=f"Flat {hash_id}, {price} CZK",
+        image_url="http://example.com/img.jpg",
+        price=price,
+    )
+
+
+def price_history(db_session):
+    with db_session.begin():
+        rows = db_session.query(PriceHistory.hash_id, PriceHistory.price).order_by(
+            PriceHistory.hash_id, PriceHistory.observed_at
+        )
+        return [tuple(row) for row in rows]
+
+
+def test_writer_appends_only_price_changes(initialized_application, empty_database_state, db_session):
+    writer = FlatDataWriter(initialized_application.session_factory)
+
+    result = writer.insert_items([make_flat_item(1, 5000000), make_flat_item(2, 6000000), make_flat_item(3, None)])
+    assert result.price_changes == 2
+
+    result = writer.insert_items([make_flat_item(1, 5000000), make_flat_item(2, 5800000), make_flat_item(3, None)])
+    assert result.price_changes == 1
+
+    assert price_history(db_session) == [(1, 5000000), (2, 6000000), (2, 5800000)]
+
+
+def test_copy_writer_appends_only_price_changes(initialized_application, empty_database_state, db_session):
+    FlatCopyWriter(initialized_application.session_factory, use_staging=False).insert_items(
+        [make_flat_item(1, 5000000), make_flat_item(2, 6000000)]
+    )
+
+    result = FlatCopyWriter(initialized_application.session_factory).insert_items(
+        [make_flat_item(1, 4900000), make_flat_item(2, 6000000)]
+    )
+
+    assert result.price_changes == 1
+    assert price_history(db_session) == [(1, 5000000), (1, 4900000), (2, 6000000)]
+
+
+def test_price_history_is_partitioned_by_month(initialized_application, db_session):
+    with db_session.begin():
+        db_session.execute(text(create_partition_sql(date(2031, 2, 14))))
+        db_session.execute(text("SET LOCAL TIME ZONE 'UTC'"))
+        bounds = db_session.execute(
+            text("SELECT pg_get_expr(relpartbound, oid) FROM pg_class WHERE relname = :name"),
+            {"name": partition_name(date(2031, 2, 1))},
+        ).scalar_one()
+
+    assert bounds == "FOR VALUES FROM ('2031-02-01 00:00:00+00') TO ('2031-03-01 00:00:00+00')"
+
+
+def test_price_history_has_default_partition(initialized_application, db_session):
+    with db_session.begin():
+        bounds = db_session.execute(
+            text("SELECT pg_get_expr(relpartbound, oid) FROM pg_class WHERE relname = 'price_history_default'")
+        ).scalar_one()
+
+    assert bounds == "DEFAULT"
@@ -0,0 +1,54 @@
+from sqlalchemy import text
+
+from database.services.flat import FlatCopyWriter, FlatDataWriter
+from database.services.pagination import QueryPaginationService
+from database.services.row_count import (
+    CachedCountProvider,
+    EstimatedCountProvider,
+    ExactCountProvider,
+    ItemCount,
+    RowCounter,
+)
+from database.sql_schema import Flat
+from tests.test_database.test_flat_writer import make_flat_item
+
+
+def test_writers_keep_the_row_counter(initialized_application, empty_database_state, db_session):
+    with db_session.begin():
+        # The fixture deletes the flats behind the writers' back
+        assert RowCounter.refresh(db_session, "flats") == 0
+
+    FlatDataWriter(initialized_application.session_factory).insert_items([make_flat_item(i, "Flat") for i in (1, 2)])
+    FlatCopyWriter(initialized_application.session_factory).insert_items([make_flat_item(i, "Flat") for i in (2, 3)])
+
+    with db_session.begin():
+        assert RowCounter.retrieve(db_session, "flats") == 3
+        assert CachedCountProvider().count(db_session.query(Flat)) == ItemCount(3)
+        db_session.execute(text("UPDATE row_counts SET row_count = 1000 WHERE table_name = 'flats'"))
+        assert CachedCountProvider().count(db_session.query(Flat)) == ItemCount(1000)
+        # A filtered listing is counted by the fallback provider
+        assert CachedCountProvider().count(db_session.query(Flat).filter(Flat.hash_id > 1)) == ItemCount(2)
+        db_session.rollback()
+
+
+def test_estimated_count(initialized_application, empty_database_state, db_session):
+    FlatCopyWriter(initialized_application.session_factory).insert_items(
+        [make_flat_item(i, "Flat") for i in range(1, 301)]
+    )
+    with db_session.begin():
+        db_session.execute(text("ANALYZE flats"))
+        provider = EstimatedCountProvider(exact_below=0)
+        assert provider.count(db_session.query(Flat)) == ItemCount(300, ItemCount.ESTIMATE)
+        filtered = provider.count(db_session.query(Flat).filter(Flat.hash_id.in_([1, 2, 3])))
+        assert filtered.kind == ItemCount.ESTIMATE and 1 <= filtered.value <= 10
+        assert EstimatedCountProvider(exact_below=1000).count(db_session.query(Flat)) == ItemCount(300)
+
+        pagination = QueryPaginationService(initialized_application.session_factory, 100, provider)
+        _, item_count = pagination.paginate_query(db_session.query(Flat).order_by(Flat.id), 2)
+        assert item_count.kind == ItemCount.ESTIMATE
+        # The last page tells the exact count
+        _, item_count = pagination.paginate_query(
+            db_session.query(Flat).filter(Flat.hash_id > 50).order_by(Flat.id), 3
+        )
+        assert item_count == ItemCount(250)
+        assert ExactCountProvider().count(db_session.query(Flat)) == ItemCount(300)
@@ -1,4 +1,10 @@
+import threading
+import time
+from http import HTTPStatus
+
 import requests
+
+from http_server.handler import SimpleHTTPRequestHandler
 from tests.conftest import BASE_URL
 
 
@@ -11,3 +17,23 @@ def test_404_not_found(server_fixture):
 def test_200_ok(server_fixture):
     response = requests.get(BASE_URL + "/")
     assert response.status_code == 200
+
+
+def test_slow_request_does_not_block_other_requests(server_fixture):
+    release = threading.Event()
+
+    def slow_view(handler):
+        release.wait(5)
+        return "slow", HTTPStatus.OK
+
+    SimpleHTTPRequestHandler.add_route("/slow", slow_view)
+    slow_request = threading.Thread(target=requests.get, args=(f"{BASE_URL}/slow",))
+    slow_request.start()
+    try:
+        started_at = time.monotonic()
+        assert requests.get(f"{BASE_URL}/nonexistentpath", timeout=2).status_code == 404
+        assert time.monotonic() - started_at < 2
+    finally:
+        release.set()
+        slow_request.join()
+        del SimpleHTTPRequestHandler.router.routes["/slow"]
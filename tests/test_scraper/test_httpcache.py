@@ -0,0 +1,70 @@
+from unittest.mock import Mock
+
+import pytest
+from scrapy import Request
+from scrapy.http import HtmlResponse, Response
+from scrapy.settings import Settings
+
+from scraper.httpcache import (
+    NOT_MODIFIED_FLAG,
+    HttpCacheConfig,
+    SrealityCachePolicy,
+    SrealityCacheStorage,
+    normalize_api_url,
+)
+
+API_URL = "https://www.sreality.cz/api/cs/v2/estates"
+
+
+def test_normalize_api_url_ignores_parameter_order_and_cache_buster():
+    url = f"{API_URL}?page=2&per_page=60&category_main_cb=1&category_type_cb=1&tms=1700000000000"
+    reordered_url = f"{API_URL}?category_type_cb=1&category_main_cb=1&per_page=60&page=2"
+
+    assert normalize_api_url(url) == normalize_api_url(reordered_url)
+    assert normalize_api_url(url) != normalize_api_url(url.replace("page=2", "page=3"))
+
+
+def test_http_cache_config_rejects_unknown_mode():
+    with pytest.raises(ValueError):
+        HttpCacheConfig(mode="offline", directory="httpcache")
+    assert HttpCacheConfig(mode="off", directory="httpcache").to_settings() == {"HTTPCACHE_ENABLED": False}
+
+
+def test_storage_replays_recorded_response_for_equivalent_url(tmp_path):
+    storage = SrealityCacheStorage(Settings({"HTTPCACHE_DIR": str(tmp_path), "HTTPCACHE_EXPIRATION_SECS": 0}))
+    spider = Mock(name="spider")
+    spider.name = "sreality_spider"
+
+    request = Request(f"{API_URL}?per_page=60&page=2&category_main_cb=1&category_type_cb=1")
+    storage.store_response(spider, request, Response(request.url, body=b'{"result_size": 1}'))
+
+    equivalent_request = Request(f"{API_URL}?category_type_cb=1&category_main_cb=1&page=2&per_page=60")
+    assert storage.retrieve_response(spider, equivalent_request).body == b'{"result_size": 1}'
+    assert storage.retrieve_response(spider, Request(f"{API_URL}?page=3")) is None
+    assert (tmp_path / "sreality_spider" / "1-1").is_dir()
+
+
+def test_revalidate_policy_sends_validators_and_flags_not_modified():
+    policy = SrealityCachePolicy(Settings({"HTTPCACHE_MODE": "revalidate"}))
+    request = Request(f"{API_URL}?page=1")
+    cached_response = Response(request.url, headers={"ETag": '"v1"'}, body=b"{}")
+
+    assert not policy.is_cached_response_fresh(cached_response, request)
+    assert request.headers[b"If-None-Match"] == b'"v1"'
+
+    assert policy.is_cached_response_valid(cached_response, Response(request.url, status=304), request)
+    assert NOT_MODIFIED_FLAG in cached_response.flags
+
+
+def test_parse_skips_listings_of_not_modified_page(sreality_spider, mock_api_response_parser):
+    sreality_spider.crawler = Mock()
+    sreality_spider.last_page = 3
+    sreality_spider.next_page = 3
+    response = HtmlResponse(
+        url=f"{API_URL}?per_page=60&page=2", body=b'{"_embedded": {"estates": []}}', flags=[NOT_MODIFIED_FLAG]
+    )
+
+    results = list(sreality_spider.parse(response))
+
+    assert [request.url for request in results] == [f"{API_URL}?per_page=60&page=3"]
+    mock_api_response_parser.parse_api_response.assert_not_called()
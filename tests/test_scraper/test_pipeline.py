@@ -0,0 +1,133 @@
+import time
+import uuid
+from unittest.mock import Mock
+
+import pytest
+from twisted.internet import defer
+
+from database.services.flat import UpsertResult
+from database.services.notifications import FLATS_UPDATED_CHANNEL, notify
+from scraper.pipelines import SaveToDatabasePipeline
+from scraper.services.schema import FlatItemModel
+
+
+def make_flat_item(hash_id: int) -> FlatItemModel:
+    return FlatItemModel(
+        id=uuid.uuid4(), hash_id=hash_id, title=f"Flat {hash_id}", image_url="https://example.com/flat.jpg"
+    )
+
+
+@pytest.fixture
+def pipeline():
+    """
+    Pipeline whose "thread pool" hands out Deferreds the test fires by hand, to simulate a slow database.
+    """
+    writer = Mock()
+    pipeline = SaveToDatabasePipeline(
+        session_factory=Mock(
+            **{"pool_stats.return_value": {"checkouts": 3, "checkout_ms": {"p95": 0.5, "buckets": []}}}
+        ),
+        bulk_insert_size=2,
+        writer=writer,
+        max_pending_batches=1,
+        stats=Mock(),
+        signals=Mock(),
+    )
+    pipeline.writes = []
+    pipeline.calls = []
+
+    def run_in_thread(function, *args):
+        called = defer.Deferred()
+        if function == pipeline.write_batch:
+            pipeline.writes.append((args[0], called))
+        else:
+            pipeline.calls.append((function, args, called))
+        return called
+
+    pipeline.run_in_thread = run_in_thread
+    return pipeline
+
+
+def test_process_item_flushes_full_batch_to_writer(pipeline):
+    pipeline.process_item(make_flat_item(1), spider=None)
+    assert pipeline.writes == []
+
+    pipeline.process_item(make_flat_item(2), spider=None)
+    batch, written = pipeline.writes[0]
+    assert [item.hash_id for item in batch] == [1, 2]
+
+    written.callback(UpsertResult(inserted=2))
+    pipeline.stats.inc_value.assert_any_call("database/items_inserted", 2)
+    assert pipeline.signals.send_catch_log.call_args.kwargs["items"] == batch
+    assert not pipeline.writes_in_progress
+
+
+def test_close_spider_without_stats(pipeline):
+    pipeline.stats = None
+    pipeline.process_item(make_flat_item(1), spider=None)
+
+    closed = []
+    pipeline.close_spider(spider=None).addCallback(closed.append)
+    pipeline.writes[0][1].callback(UpsertResult(inserted=1))
+    pipeline.calls[0][2].callback(None)
+    assert closed
+
+
+def test_failed_batch_is_signalled(pipeline):
+    for hash_id in (1, 2):
+        pipeline.process_item(make_flat_item(hash_id), spider=None)
+    pipeline.process_item(make_flat_item(3), spider=None)
+    assert pipeline.pending_writes() == 3
+
+    pipeline.writes[0][1].errback(RuntimeError("connection lost"))
+    assert [item.hash_id for item in pipeline.signals.send_catch_log.call_args.kwargs["items"]] == [1, 2]
+    assert pipeline.pending_writes() == 1
+
+
+def test_process_item_waits_while_writer_slots_are_busy(pipeline):
+    for hash_id in (1, 2):
+        assert isinstance(pipeline.process_item(make_flat_item(hash_id), spider=None), FlatItemModel)
+
+    pipeline.process_item(make_flat_item(3), spider=None)
+    held_back = pipeline.process_item(make_flat_item(4), spider=None)
+    assert isinstance(held_back, defer.Deferred) and not held_back.called
+    assert len(pipeline.writes) == 1
+
+    pipeline.writes[0][1].callback(UpsertResult(inserted=2))
+    assert held_back.called
+    assert [item.hash_id for item in pipeline.writes[1][0]] == [3, 4]
+
+
+def test_flush_stale_items_flushes_partial_batch_after_interval(pipeline):
+    pipeline.process_item(make_flat_item(1), spider=None)
+    pipeline.flush_stale_items()
+    assert pipeline.writes == []
+
+    pipeline.first_buffered_at = time.monotonic() - pipeline.flush_interval
+    pipeline.flush_stale_items()
+    assert [item.hash_id for item in pipeline.writes[0][0]] == [1]
+
+
+def test_close_spider_drains_buffer_and_pending_writes(pipeline):
+    for hash_id in (1, 2, 3):
+        pipeline.process_item(make_flat_item(hash_id), spider=None)
+
+    drained = pipeline.close_spider(spider=None)
+    closed = []
+    drained.addBoth(closed.append)
+    assert not closed
+
+    pipeline.writes[0][1].callback(UpsertResult(inserted=2))
+    assert not closed
+    pipeline.writes[1][1].errback(RuntimeError("connection lost"))
+
+    # The HTTP server is notified that flats were written before the pipeline closes
+    ((function, args, notified),) = pipeline.calls
+    assert function is notify and args[1] == FLATS_UPDATED_CHANNEL
+    assert not closed
+    notified.callback(None)
+    assert closed
+    assert [item.hash_id for item in pipeline.writes[1][0]] == [3]
+    pipeline.stats.inc_value.assert_any_call("database/items_failed", 1)
+    pipeline.stats.set_value.assert_any_call("database/pool/checkouts", 3)
+    pipeline.stats.set_value.assert_any_call("database/pool/checkout_ms_p95", 0.5)
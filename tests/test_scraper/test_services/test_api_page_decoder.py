@@ -0,0 +1,62 @@
+import json
+
+import pytest
+
+from scraper.services.decoder import EstateRecord, MsgspecDecoder, OrjsonDecoder, StdlibJsonDecoder, get_decoder
+
+API_PAGE = json.dumps(
+    {
+        "result_size": 8543,
+        "_embedded": {
+            "estates": [
+                {
+                    "hash_id": 2451387212,
+                    "name": "Prodej bytu 2+kk 50 m²",
+                    "locality": "Praha 6 - Bubeneč",
+                    "price_czk": {"value_raw": 6490000, "unit": "", "name": "Celková cena"},
+                    "gps": {"lat": 50.1, "lon": 14.4},
+                    "labels": ["Sklep", "Balkon"],
+                    "_links": {
+                        "images": [{"href": "http://example.com/img1.jpg"}, {"href": "http://example.com/img2.jpg"}],
+                        "self": {"href": "/cs/v2/estates/2451387212"},
+                    },
+                },
+                {"name": "Prodej bytu 1+kk 30 m²", "locality": "Brno", "_links": {}},
+            ]
+        },
+        "per_page": 60,
+        "page": 1,
+    }
+)
+
+EXPECTED_ESTATES = [
+    EstateRecord(
+        hash_id=2451387212,
+        name="Prodej bytu 2+kk 50 m²",
+        locality="Praha 6 - Bubeneč",
+        price=6490000,
+        image_url="http://example.com/img1.jpg",
+        lat=50.1,
+        lon=14.4,
+    ),
+    EstateRecord(hash_id=None, name="Prodej bytu 1+kk 30 m²", locality="Brno", price=None, image_url=None),
+]
+
+
+@pytest.mark.parametrize("decoder_cls", [StdlibJsonDecoder, OrjsonDecoder, MsgspecDecoder])
+def test_decoders_return_the_same_page(decoder_cls):
+    if decoder_cls is OrjsonDecoder:
+        pytest.importorskip("orjson")
+    if decoder_cls is MsgspecDecoder:
+        pytest.importorskip("msgspec")
+
+    page = decoder_cls().decode(API_PAGE.encode("utf-8"))
+
+    assert page.result_size == 8543
+    assert page.estates == EXPECTED_ESTATES
+
+
+def test_get_decoder_rejects_unknown_backend():
+    with pytest.raises(ValueError):
+        get_decoder("yaml")
+    assert get_decoder("json").name == "json"
@@ -13,7 +13,7 @@ def test_api_response_parser():
         {"title": "Flat 2", "image_url": "http://example.com/img2.jpg"},
     ]
 
-    parser = ApiResponseParser(json_data_extractor=mock_extractor, max_items=2)
+    parser = ApiResponseParser(json_data_extractor=mock_extractor)
 
     json_response = '{"data": "mocked data"}'
     parsed_items = parser.parse_api_response("http://example.com/api", json_response)
@@ -23,4 +23,21 @@ def test_api_response_parser():
     assert parsed_items[0].title == "Flat 1"
     assert parsed_items[0].image_url == HttpUrl("http://example.com/img1.jpg")
 
-    assert parser.items_scraped == 2
+
+def test_api_response_parser_drops_invalid_items():
+    mock_extractor = Mock(spec=JsonDataExtractor)
+    mock_extractor.process_extraction_safely.return_value = [
+        {"hash_id": 1, "title": "Flat 1", "image_url": "http://example.com/img1.jpg"},
+        {"hash_id": 2, "title": "Flat 2", "image_url": "not an url"},
+        {"hash_id": 3, "title": "", "image_url": "http://example.com/img3.jpg"},
+        {"hash_id": 4, "title": "Flat 4", "image_url": "http://example.com/img4.jpg"},
+    ]
+
+    parser = ApiResponseParser(json_data_extractor=mock_extractor)
+    parsed_items = parser.parse_api_response("http://example.com/api", '{"data": "mocked data"}')
+
+    assert [item.hash_id for item in parsed_items] == [1, 4]
+
+    result = parser.validate_items(mock_extractor.process_extraction_safely.return_value)
+    assert result.invalid_count == 2
+    assert result.errors == {"url_parsing": 1, "value_error": 1}
@@ -0,0 +1,89 @@
+from datetime import datetime, timezone
+from unittest.mock import Mock
+
+from scrapy import Request
+from scrapy.http import Response
+from scrapy.settings import Settings
+from scrapy.statscollectors import MemoryStatsCollector
+
+from scraper.middlewares import ScraperDownloaderMiddleware
+from scraper.services.concurrency import AimdConcurrencyController, parse_retry_after, percentile
+
+
+def test_percentile_uses_nearest_rank():
+    assert percentile([0.5, 0.1, 0.3, 0.2, 0.4, 0.6, 0.7, 0.8, 0.9, 1.0], 90) == 0.9
+    assert percentile([], 90) == 0.0
+
+
+def test_parse_retry_after_accepts_seconds_and_http_date():
+    now = datetime(2024, 1, 1, 12, 0, 0, tzinfo=timezone.utc)
+    assert parse_retry_after(b"120") == 120.0
+    assert parse_retry_after(b"Mon, 01 Jan 2024 12:00:30 GMT", now=now) == 30.0
+    assert parse_retry_after(b"soon") is None
+    assert parse_retry_after(None) is None
+
+
+def test_controller_increases_additively_on_healthy_window():
+    controller = AimdConcurrencyController(concurrency=4, window=5, target_latency=1.0)
+
+    decisions = [controller.observe(latency=0.2, status=200) for _ in range(5)]
+
+    assert decisions[:4] == [None] * 4
+    assert decisions[4].action == "increase" and decisions[4].concurrency == 5
+
+
+def test_controller_decreases_multiplicatively_on_slow_or_failing_window():
+    controller = AimdConcurrencyController(concurrency=8, window=5, target_latency=1.0)
+    for _ in range(4):
+        controller.observe(latency=2.0, status=200)
+    assert controller.observe(latency=2.0, status=200).concurrency == 4
+
+    for _ in range(4):
+        controller.observe(latency=0.1, status=200)
+    decision = controller.observe(latency=0.1, status=503)
+    assert decision.action == "decrease" and decision.concurrency == 2 and decision.error_rate == 0.2
+
+
+def test_controller_backs_off_immediately_on_retry_after_and_relaxes_delay():
+    controller = AimdConcurrencyController(concurrency=8, window=2, min_concurrency=2)
+
+    decision = controller.observe(latency=0.1, status=429, retry_after=10)
+    assert decision.action == "retry_after" and decision.concurrency == 4 and decision.delay == 10
+
+    controller.observe(latency=0.1, status=200)
+    decision = controller.observe(latency=0.1, status=200)
+    assert decision.concurrency == 5 and decision.delay == 5
+
+
+def test_middleware_applies_decisions_to_download_slot():
+    crawler = Mock()
+    crawler.stats = MemoryStatsCollector(crawler)
+    slot = Mock(concurrency=8, delay=0.0)
+    crawler.engine.downloader.slots = {"www.sreality.cz": slot}
+    middleware = ScraperDownloaderMiddleware(crawler, Settings({"ADAPTIVE_CONCURRENCY_WINDOW": 10}))
+
+    request = Request("https://www.sreality.cz/api/cs/v2/estates", meta={"download_slot": "www.sreality.cz"})
+    response = Response(request.url, status=429, headers={"Retry-After": "3"})
+    assert middleware.process_response(request, response, spider=None) is response
+
+    assert slot.concurrency == 4 and slot.delay == 3.0
+    assert crawler.stats.get_value("adaptive_concurrency/retry_after") == 1
+    assert crawler.stats.get_value("adaptive_concurrency/www.sreality.cz/concurrency") == 4
+
+
+def test_middleware_keeps_configured_slot_concurrency_as_upper_limit():
+    crawler = Mock()
+    crawler.stats = MemoryStatsCollector(crawler)
+    detail_slot = Mock(concurrency=4, delay=0.0)
+    crawler.engine.downloader.slots = {"sreality-details": detail_slot}
+    settings = Settings({"ADAPTIVE_CONCURRENCY_WINDOW": 5, "DOWNLOAD_SLOTS": {"sreality-details": {"concurrency": 4}}})
+    middleware = ScraperDownloaderMiddleware(crawler, settings)
+
+    request = Request("https://www.sreality.cz/api/cs/v2/estates/1", meta={"download_slot": "sreality-details"})
+    request.meta["download_latency"] = 0.1
+    for _ in range(50):
+        middleware.process_response(request, Response(request.url, status=200), spider=None)
+        assert detail_slot.concurrency <= 4
+
+    assert crawler.stats.get_value("adaptive_concurrency/hold") == 10
+    assert crawler.stats.get_value("adaptive_concurrency/increase") is None
@@ -0,0 +1,76 @@
+import json
+
+from scraper.services.checkpoint import CrawlCheckpoint
+
+CRAWL_KEY = "https://www.sreality.cz/api/cs/v2/estates?per_page=60&page=1&max_items=500"
+
+
+def test_page_is_completed_once_all_its_items_are_written(tmp_path):
+    checkpoint = CrawlCheckpoint(str(tmp_path / "checkpoint.json"), CRAWL_KEY)
+    checkpoint.last_page = 4
+    checkpoint.page_parsed(1, ["a", "b"])
+    checkpoint.page_parsed(2, ["c"])
+    checkpoint.page_parsed(3, [])
+
+    assert checkpoint.items_written(["a", "c"])
+    assert checkpoint.completed_pages == {2, 3}
+    assert checkpoint.pending_pages() == [1, 4]
+
+    assert checkpoint.items_written(["b"])
+    assert not checkpoint.items_written(["unknown"])
+    assert checkpoint.completed_pages == {1, 2, 3}
+    assert (checkpoint.items_scraped, checkpoint.items_flushed) == (3, 3)
+
+
+def test_page_with_failed_items_stays_pending(tmp_path):
+    checkpoint = CrawlCheckpoint(str(tmp_path / "checkpoint.json"), CRAWL_KEY)
+    checkpoint.last_page = 2
+    checkpoint.page_parsed(1, ["a", "b"])
+
+    checkpoint.items_failed(["a"])
+    checkpoint.items_written(["b"])
+    assert not checkpoint.unwritten_items
+    assert checkpoint.failed_pages == {1}
+    assert checkpoint.pending_pages() == [1, 2]
+
+
+def test_saved_checkpoint_is_loaded_for_the_same_crawl_only(tmp_path):
+    path = str(tmp_path / "checkpoints" / "sreality.json")
+    checkpoint = CrawlCheckpoint(path, CRAWL_KEY)
+    checkpoint.last_page = 3
+    checkpoint.page_parsed(2, ["a"])
+    checkpoint.items_written(["a"])
+    checkpoint.save()
+
+    assert json.loads((tmp_path / "checkpoints" / "sreality.json").read_text())["pending_pages"] == [1, 3]
+    assert [p.name for p in (tmp_path / "checkpoints").iterdir()] == ["sreality.json"]
+
+    loaded = CrawlCheckpoint.load(path, CRAWL_KEY)
+    assert loaded.resumed
+    assert (loaded.last_page, loaded.completed_pages, loaded.items_scraped) == (3, {2}, 1)
+    assert CrawlCheckpoint.load(path, CRAWL_KEY.replace("max_items=500", "max_items=100")) is None
+
+    loaded.clear()
+    assert CrawlCheckpoint.load(path, CRAWL_KEY) is None
+
+
+def test_unreadable_checkpoint_is_ignored(tmp_path):
+    path = tmp_path / "checkpoint.json"
+    path.write_text("{truncated")
+
+    assert CrawlCheckpoint.load(str(path), CRAWL_KEY) is None
+
+
+def test_completed_categories_are_kept_across_category_pagination(tmp_path):
+    path = str(tmp_path / "checkpoint.json")
+    checkpoint = CrawlCheckpoint(path, CRAWL_KEY)
+    checkpoint.last_page = 1
+    checkpoint.page_parsed(1, ["a"])
+    checkpoint.items_written(["a"])
+
+    checkpoint.category_completed("1:1")
+    checkpoint.save()
+
+    loaded = CrawlCheckpoint.load(path, CRAWL_KEY)
+    assert loaded.completed_categories == ["1:1"]
+    assert (loaded.last_page, loaded.completed_pages, loaded.items_scraped) == (None, set(), 1)
@@ -0,0 +1,60 @@
+from unittest.mock import Mock
+
+import pytest
+from scrapy import Request
+from scrapy.http import Response
+
+from scraper.extensions import CrawlMetricsExtension
+from scraper.services.metrics import CrawlMetrics, LatencyHistogram
+
+
+def test_histogram_estimates_quantiles_within_buckets():
+    histogram = LatencyHistogram(buckets=(0.1, 0.2, 0.4, float("inf")))
+    for seconds in [0.05] * 50 + [0.15] * 40 + [0.3] * 9 + [5.0]:
+        histogram.observe(seconds)
+
+    assert histogram.count == 100
+    assert histogram.mean == pytest.approx(0.162)
+    assert histogram.quantile(0.5) == pytest.approx(0.1)
+    assert histogram.quantile(0.9) == pytest.approx(0.2)
+    assert 0.2 < histogram.quantile(0.95) < 0.4
+    assert histogram.quantile(1.0) == 0.4
+
+
+def test_metrics_render_in_prometheus_text_format():
+    metrics = CrawlMetrics(buckets=(0.1, float("inf")))
+    metrics.observe("decode", 0.05)
+    metrics.observe("decode", 0.5)
+    metrics.inc("items_total", 3)
+    metrics.set_gauge("pipeline_buffered_items", 7, pipeline="database")
+
+    lines = metrics.render_prometheus().splitlines()
+
+    assert 'sreality_crawl_stage_seconds_bucket{stage="decode",le="0.1"} 1' in lines
+    assert 'sreality_crawl_stage_seconds_bucket{stage="decode",le="+Inf"} 2' in lines
+    assert 'sreality_crawl_stage_seconds_count{stage="decode"} 2' in lines
+    assert "# TYPE sreality_crawl_items_total counter" in lines
+    assert "sreality_crawl_items_total 3" in lines
+    assert 'sreality_crawl_pipeline_buffered_items{pipeline="database"} 7' in lines
+
+
+def test_extension_writes_stage_latencies_and_throughput_to_stats():
+    crawler = Mock()
+    crawler.engine = None
+    crawler.stats.get_value.return_value = None
+    metrics = CrawlMetrics()
+    extension = CrawlMetricsExtension(crawler, metrics=metrics)
+
+    request = Request("https://www.sreality.cz/api/cs/v2/estates?page=1", meta={"download_latency": 0.3})
+    extension.response_received(Response(request.url, body=b"x" * 100), request, spider=None)
+    cached_request = Request(request.url, meta={"download_latency": 0.0})
+    extension.response_received(Response(request.url, body=b"{}", flags=["cached"]), cached_request, spider=None)
+    extension.item_scraped(item={}, response=None, spider=None)
+    metrics.observe("validate", 0.002)
+
+    extension.update()
+
+    assert metrics.histogram("download").count == 1
+    assert (extension.items_total, extension.bytes_total) == (1, 102)
+    crawler.stats.set_value.assert_any_call("metrics/download/count", 1)
+    crawler.stats.set_value.assert_any_call("metrics/validate/count", 1)
@@ -28,7 +28,51 @@ def test_json_data_extractor():
 
     assert len(items) == 2
     assert items[0]["title"] == "2+kk, 50m², Prague, 3000000 CZK"
+
+    # A page decoded once is read without decoding it again
+    page = extractor.decode(json_response_str)
+    assert extractor.decode(page) is page
+    assert extractor.extract_items_from_response(page) == items
     assert items[0]["image_url"] == "http://example.com/img1.jpg"
 
     assert items[1]["title"] == "3+kk, 60m², Brno, 4000000 CZK"
     assert items[1]["image_url"] == "http://example.com/img2.jpg"
+
+
+def test_fingerprint_changes_with_listing_fields():
+    estate = {"name": "2+kk, 50m²", "locality": "Prague", "price_czk": {"value_raw": 3000000}, "hash_id": 1}
+    estate["_links"] = {"images": [{"href": "http://example.com/img1.jpg"}]}
+    extractor = JsonDataExtractor()
+
+    def fingerprint(estate_json):
+        return extractor.extract_items_from_response(json.dumps({"_embedded": {"estates": [estate_json]}}))[0][
+            "fingerprint"
+        ]
+
+    assert fingerprint(estate) == fingerprint(dict(estate))
+    assert fingerprint(estate) != fingerprint({**estate, "price_czk": {"value_raw": 2900000}})
+
+
+def test_listing_columns_are_extracted_from_name():
+    def extract(name):
+        estate = {"name": name, "locality": "Praha 6 -\xa0Bubeneč", "hash_id": 1}
+        estate["_links"] = {"images": [{"href": "http://example.com/img1.jpg"}]}
+        (item,) = JsonDataExtractor().extract_items_from_response(json.dumps({"_embedded": {"estates": [estate]}}))
+        return item["disposition"], item["area"], item["locality"]
+
+    assert extract("Prodej bytu 2+kk 54\xa0m²") == ("2+kk", 54, "Praha 6 - Bubeneč")
+    assert extract("Prodej bytu 2+1 100 m²") == ("2+1", 100, "Praha 6 - Bubeneč")
+    assert extract("Prodej pozemku 1\xa0200 m²") == (None, 1200, "Praha 6 - Bubeneč")
+    assert extract("Prodej rodinného domu 120 m², pozemek 600 m²") == (None, 120, "Praha 6 - Bubeneč")
+
+
+def test_gps_coordinates_are_extracted_with_geohash():
+    def extract(gps):
+        estate = {"name": "Prodej bytu 2+kk 54 m²", "locality": "Praha", "hash_id": 1, "gps": gps}
+        estate["_links"] = {"images": [{"href": "http://example.com/img1.jpg"}]}
+        (item,) = JsonDataExtractor().extract_items_from_response(json.dumps({"_embedded": {"estates": [estate]}}))
+        return item["lat"], item["lon"], item["geohash"]
+
+    assert extract({"lat": 50.0875, "lon": 14.4213}) == (50.0875, 14.4213, "u2fkbnjkb")
+    assert extract({"lat": 95.0, "lon": 14.4213}) == (None, None, None)
+    assert extract(None) == (None, None, None)
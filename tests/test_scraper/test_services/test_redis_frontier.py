@@ -0,0 +1,58 @@
+def test_push_queues_each_url_once(redis_frontier):
+    assert redis_frontier.push(["http://example.com/api?page=2", "http://example.com/api?page=3"]) == 2
+    assert redis_frontier.push(["http://example.com/api?page=3", "http://example.com/api?page=4"]) == 1
+
+    assert redis_frontier.pop(2) == ["http://example.com/api?page=2", "http://example.com/api?page=3"]
+    assert redis_frontier.pop(2) == ["http://example.com/api?page=4"]
+    assert redis_frontier.pop(2) == []
+
+    # Already fetched pages are never queued again
+    assert redis_frontier.push(["http://example.com/api?page=2"]) == 0
+
+
+def test_claim_items_is_capped_by_max_items(redis_frontier):
+    assert redis_frontier.claim_items(60) == 60
+    assert redis_frontier.claim_items(60) == 40
+    assert redis_frontier.claim_items(60) == 0
+    assert redis_frontier.items_claimed() == 100
+    assert redis_frontier.is_finished()
+
+
+def test_seed_is_claimed_by_a_single_worker(redis_frontier):
+    assert redis_frontier.claim_seed()
+    assert not redis_frontier.claim_seed()
+    assert not redis_frontier.is_finished()
+
+    redis_frontier.push(["http://example.com/api?page=2"])
+    redis_frontier.mark_seeded()
+    assert redis_frontier.is_seeded()
+    assert not redis_frontier.is_finished()
+
+    redis_frontier.pop(1)
+    assert redis_frontier.is_finished()
+
+
+def test_requeue_retries_a_failed_page_a_bounded_number_of_times(redis_frontier):
+    url = "http://example.com/api?page=2"
+    redis_frontier.push([url])
+    assert redis_frontier.pop(1) == [url]
+
+    for _ in range(redis_frontier.MAX_PAGE_RETRIES):
+        assert redis_frontier.requeue(url)
+        assert redis_frontier.pop(1) == [url]
+    assert not redis_frontier.requeue(url)
+    assert redis_frontier.pending() == 0
+
+
+def test_expire_lets_a_finished_crawl_id_be_used_again(redis_frontier):
+    assert redis_frontier.claim_seed()
+    redis_frontier.push(["http://example.com/api?page=2"])
+    redis_frontier.mark_seeded()
+    redis_frontier.pop(1)
+    assert redis_frontier.is_finished()
+
+    redis_frontier.expire(1)
+    assert 0 < redis_frontier.ttl() <= 1
+    redis_frontier.expire(0)
+    assert not redis_frontier.is_finished()
+    assert redis_frontier.claim_seed()
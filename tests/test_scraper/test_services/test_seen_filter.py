@@ -0,0 +1,44 @@
+from scraper.services.seen_filter import BloomFilter
+
+
+def test_added_keys_are_always_found_and_false_positives_stay_near_the_target():
+    bloom_filter = BloomFilter(capacity=10000, false_positive_rate=0.01)
+    bloom_filter.update(range(0, 20000, 2))
+
+    assert all(hash_id in bloom_filter for hash_id in range(0, 20000, 2))
+    false_positives = sum(hash_id in bloom_filter for hash_id in range(1, 200000, 2))
+    assert false_positives / 100000 < 0.02
+    assert abs(bloom_filter.estimated_false_positive_rate() - 0.01) < 0.005
+    # About 9.6 bits per key at 1 %
+    assert bloom_filter.memory_bytes == 11982
+    assert not bloom_filter.is_saturated()
+
+
+def test_count_grows_with_new_keys_only():
+    bloom_filter = BloomFilter(capacity=2)
+
+    assert bloom_filter.add(4227695180)
+    assert not bloom_filter.add(4227695180)
+    bloom_filter.update([1, 2])
+    assert len(bloom_filter) == 3
+    assert bloom_filter.is_saturated()
+
+
+def test_saved_filter_is_loaded_back(tmp_path):
+    path = str(tmp_path / "filters" / "seen.bloom")
+    bloom_filter = BloomFilter(capacity=1000)
+    bloom_filter.update([1, 2, 3])
+    bloom_filter.save(path)
+
+    loaded = BloomFilter.load(path)
+    assert (loaded.capacity, loaded.false_positive_rate, len(loaded)) == (1000, 0.001, 3)
+    assert loaded.bits == bloom_filter.bits
+    assert [p.name for p in (tmp_path / "filters").iterdir()] == ["seen.bloom"]
+
+
+def test_missing_or_unreadable_filter_is_not_loaded(tmp_path):
+    assert BloomFilter.load(str(tmp_path / "missing.bloom")) is None
+    path = tmp_path / "truncated.bloom"
+    BloomFilter(capacity=1000).save(str(path))
+    path.write_bytes(path.read_bytes()[:-1])
+    assert BloomFilter.load(str(path)) is None
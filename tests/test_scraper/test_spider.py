@@ -1,6 +1,20 @@
+import uuid
+from unittest.mock import Mock
+
 import pytest
+from scrapy import Request
+from scrapy.exceptions import DontCloseSpider
 from scrapy.http import HtmlResponse
 
+from database.services.flat import FlatDataReader
+from database.services.flat_detail import FlatDetailReader
+from database.services.image_cache import DiskLRUCache, ImageCacheConfig
+from scraper.services.configuration import ApiUrlConfigService
+from scraper.services.decoder import ApiPage
+from scraper.services.schema import FlatDetailItemModel, FlatItemModel
+from scraper.services.seen_filter import BloomFilter
+from scraper.spiders.sreality_spider import SrealitySpider
+
 
 @pytest.mark.parametrize(
     "json_response,expected_count",
@@ -19,3 +33,341 @@ def test_parse(sreality_spider, mock_api_response_parser, json_response, expecte
 
     parsed_items = [item for item in sreality_spider.parse(fake_response) if isinstance(item, dict)]
     assert len(parsed_items) == expected_count, f"Expected {expected_count} items, got {len(parsed_items)}"
+
+
+def test_parse_schedules_pages_up_to_concurrency_limit(sreality_spider, mock_api_response_parser):
+    mock_api_response_parser.parse_api_response.return_value = []
+    sreality_spider.concurrent_pages = 3
+
+    first_page = HtmlResponse(
+        url="http://example.com/api?per_page=60&page=1",
+        body=b'{"result_size": 10000, "_embedded": {"estates": []}}',
+        encoding="utf-8",
+    )
+    requests = [request for request in sreality_spider.parse(first_page) if isinstance(request, Request)]
+
+    assert [request.url for request in requests] == [
+        "http://example.com/api?per_page=60&page=2",
+        "http://example.com/api?per_page=60&page=3",
+        "http://example.com/api?per_page=60&page=4",
+    ]
+    # 500 items at 60 items per page
+    assert sreality_spider.last_page == 9
+    # The first page is decoded once, for its result_size and its listings
+    assert isinstance(mock_api_response_parser.parse_api_response.call_args.kwargs["json_response"], ApiPage)
+
+    second_page = HtmlResponse(url=requests[0].url, body=b'{"_embedded": {"estates": []}}', encoding="utf-8")
+    requests = [request for request in sreality_spider.parse(second_page) if isinstance(request, Request)]
+    assert [request.url for request in requests] == ["http://example.com/api?per_page=60&page=5"]
+
+
+def test_parse_stops_scheduling_after_last_page(sreality_spider, mock_api_response_parser):
+    mock_api_response_parser.parse_api_response.return_value = []
+
+    first_page = HtmlResponse(
+        url="http://example.com/api?per_page=60&page=1",
+        body=b'{"result_size": 100, "_embedded": {"estates": []}}',
+        encoding="utf-8",
+    )
+    requests = [request for request in sreality_spider.parse(first_page) if isinstance(request, Request)]
+    assert [request.url for request in requests] == ["http://example.com/api?per_page=60&page=2"]
+
+    second_page = HtmlResponse(url=requests[0].url, body=b'{"_embedded": {"estates": []}}', encoding="utf-8")
+    assert not [request for request in sreality_spider.parse(second_page) if isinstance(request, Request)]
+
+
+def test_parse_stops_at_max_items(sreality_spider, mock_api_response_parser):
+    sreality_spider.max_items = 2
+    mock_api_response_parser.parse_api_response.return_value = [
+        {"title": "Mock Flat", "image_url": "http://example.com/mock.jpg"}
+    ] * 3
+
+    fake_response = HtmlResponse(url="http://example.com", body=b'{"result_size": 3}', encoding="utf-8")
+    parsed_items = [item for item in sreality_spider.parse(fake_response) if isinstance(item, dict)]
+
+    assert len(parsed_items) == 2
+    assert sreality_spider.items_scraped == 2
+
+
+def test_parse_incremental_skips_known_items_and_stops_on_known_page(sreality_spider, mock_api_response_parser):
+    sreality_spider.incremental = True
+    sreality_spider.flat_reader = Mock(spec=FlatDataReader)
+    sreality_spider.flat_reader.retrieve_existing_hash_ids.return_value = {2}
+    mock_api_response_parser.parse_api_response.return_value = [
+        FlatItemModel(id=uuid.uuid4(), hash_id=hash_id, title="Flat", image_url="http://example.com/img.jpg")
+        for hash_id in (1, 2)
+    ]
+
+    first_page = HtmlResponse(url="http://example.com/api?sort=0&page=1", body=b"{}", encoding="utf-8")
+    results = list(sreality_spider.parse(first_page))
+
+    assert [item.hash_id for item in results if isinstance(item, FlatItemModel)] == [1]
+    assert [request.url for request in results if isinstance(request, Request)] == [
+        "http://example.com/api?sort=0&page=2"
+    ]
+
+    sreality_spider.flat_reader.retrieve_existing_hash_ids.return_value = {1, 2}
+    second_page = HtmlResponse(url="http://example.com/api?sort=0&page=2", body=b"{}", encoding="utf-8")
+    assert list(sreality_spider.parse(second_page)) == []
+
+
+def test_seen_filter_confirms_only_positives_and_learns_flushed_items(
+    sreality_spider, mock_api_response_parser, tmp_path
+):
+    sreality_spider.crawler = Mock()
+    sreality_spider.incremental = True
+    sreality_spider.flat_reader = Mock(spec=FlatDataReader)
+    sreality_spider.flat_reader.retrieve_hash_id_count.return_value = 1
+    sreality_spider.flat_reader.iterate_hash_ids.return_value = iter([2])
+    sreality_spider.seen_filter_path = str(tmp_path / "seen.bloom")
+    sreality_spider.seen_filter = sreality_spider.load_seen_filter(sreality_spider.seen_filter_path)
+    sreality_spider.flat_reader.retrieve_existing_hash_ids.return_value = {2}
+    items = [
+        FlatItemModel(id=uuid.uuid4(), hash_id=hash_id, title="Flat", image_url="http://example.com/img.jpg")
+        for hash_id in (1, 2)
+    ]
+
+    assert sreality_spider.filter_known_items(items) == items[:1]
+    # The new listing is not looked up
+    sreality_spider.flat_reader.retrieve_existing_hash_ids.assert_called_once_with({2})
+
+    sreality_spider.batch_flushed(items=items[:1])
+    sreality_spider.flat_reader.retrieve_existing_hash_ids.return_value = {1, 2}
+    assert sreality_spider.filter_known_items(items) == []
+    sreality_spider.spider_closed(sreality_spider, reason="finished")
+
+    loaded = BloomFilter.load(str(tmp_path / "seen.bloom"))
+    assert (1 in loaded, 2 in loaded, len(loaded), loaded.capacity) == (True, True, 2, 100000)
+    stats = {call.args[0]: call.args[1] for call in sreality_spider.crawler.stats.set_value.call_args_list}
+    assert (stats["seen_filter/hash_ids"], stats["seen_filter/memory_bytes"]) == (2, 179720)
+    assert stats["seen_filter/false_positive_rate"] < 1e-9
+
+
+def test_parse_distributed_pushes_pages_to_frontier(sreality_spider, mock_api_response_parser, redis_frontier):
+    sreality_spider.frontier = redis_frontier
+    sreality_spider.concurrent_pages = 2
+    mock_api_response_parser.parse_api_response.return_value = [
+        {"title": "Mock Flat", "image_url": "http://example.com/mock.jpg"}
+    ] * 60
+
+    first_page = HtmlResponse(
+        url="http://example.com/api?per_page=60&page=1",
+        body=b'{"result_size": 300, "_embedded": {"estates": []}}',
+        encoding="utf-8",
+    )
+    results = list(sreality_spider.parse(first_page))
+
+    assert [request.url for request in results if isinstance(request, Request)] == [
+        "http://example.com/api?per_page=60&page=2",
+        "http://example.com/api?per_page=60&page=3",
+    ]
+    assert len([item for item in results if isinstance(item, dict)]) == 60
+    assert redis_frontier.is_seeded()
+    assert redis_frontier.pop(10) == [
+        "http://example.com/api?per_page=60&page=4",
+        "http://example.com/api?per_page=60&page=5",
+    ]
+
+    # The shared max_items budget (100 in the fixture) is used up by the second page
+    second_page = HtmlResponse(url="http://example.com/api?per_page=60&page=2", body=b"{}", encoding="utf-8")
+    assert len([item for item in sreality_spider.parse(second_page) if isinstance(item, dict)]) == 40
+    assert redis_frontier.is_finished()
+
+
+def test_failed_distributed_page_is_requeued(sreality_spider, redis_frontier):
+    sreality_spider.frontier = redis_frontier
+    sreality_spider.crawler = Mock()
+    redis_frontier.claim_seed()
+    redis_frontier.push(["http://example.com/api?per_page=60&page=2"])
+    redis_frontier.mark_seeded()
+    (request,) = sreality_spider.schedule_next_pages("http://example.com/api", count=1)
+
+    # The page is handed out again, to this worker or to any other
+    retries = list(sreality_spider.handle_request_failure(Mock(request=request)))
+    assert [retry.url for retry in retries] == [request.url]
+    sreality_spider.crawler.stats.inc_value.assert_called_with("frontier/pages_requeued")
+
+    assert redis_frontier.is_finished()
+    sreality_spider.spider_closed(sreality_spider, "finished")
+    assert 0 < redis_frontier.ttl() <= redis_frontier.FINISHED_CRAWL_TTL
+
+
+def test_schedule_details_requests_only_new_or_changed_listings(sreality_spider):
+    sreality_spider.details = True
+    sreality_spider.crawler = Mock()
+    sreality_spider.flat_detail_reader = Mock(spec=FlatDetailReader)
+    sreality_spider.flat_detail_reader.retrieve_list_fingerprints.return_value = {1: "same", 2: "old"}
+    items = [
+        FlatItemModel(
+            id=uuid.uuid4(),
+            hash_id=hash_id,
+            title="Flat",
+            image_url="http://example.com/img.jpg",
+            fingerprint=fingerprint,
+        )
+        for hash_id, fingerprint in ((1, "same"), (2, "new"), (3, "new"))
+    ]
+
+    requests = list(sreality_spider.schedule_details(items))
+
+    assert [(request.meta["hash_id"], request.priority) for request in requests] == [
+        (2, SrealitySpider.DETAIL_PRIORITY_CHANGED),
+        (3, SrealitySpider.DETAIL_PRIORITY_NEW),
+    ]
+    assert all(request.meta["download_slot"] == SrealitySpider.DETAIL_DOWNLOAD_SLOT for request in requests)
+    assert requests[0].url.endswith("/api/cs/v2/estates/2")
+
+
+def test_parse_detail_yields_detail_item(sreality_spider):
+    request = Request("http://example.com/api/cs/v2/estates/7", meta={"hash_id": 7, "list_fingerprint": "abcd"})
+    response = HtmlResponse(url=request.url, body=b'{"text": {"value": "Nice flat"}}', request=request)
+
+    (item,) = list(sreality_spider.parse_detail(response))
+
+    assert item == FlatDetailItemModel(hash_id=7, list_fingerprint="abcd", payload={"text": {"value": "Nice flat"}})
+
+
+def test_prefetch_images_stores_uncached_thumbnails(sreality_spider, tmp_path):
+    sreality_spider.crawler = Mock()
+    sreality_spider.image_config = ImageCacheConfig(
+        True, str(tmp_path), max_bytes=10_000, width=200, height=150, timeout=5
+    )
+    sreality_spider.image_cache = DiskLRUCache(str(tmp_path), max_bytes=10_000)
+    items = [
+        FlatItemModel(id=uuid.uuid4(), title="Flat", image_url=f"https://example.com/{name}.jpeg?fl=res,400,300,3")
+        for name in ("cached", "new")
+    ]
+    sreality_spider.image_cache.put(sreality_spider.image_config.thumbnail_url(str(items[0].image_url)), b"jpeg")
+
+    (request,) = list(sreality_spider.schedule_image_prefetch(items))
+
+    assert request.meta["download_slot"] == SrealitySpider.IMAGE_DOWNLOAD_SLOT
+    assert request.priority == SrealitySpider.IMAGE_PRIORITY
+    assert "res,200,150" in request.meta["thumbnail_url"]
+
+    sreality_spider.store_image(HtmlResponse(url=request.url, body=b"\xff\xd8\xff", request=request))
+    assert sreality_spider.image_config.thumbnail_url(str(items[1].image_url)) in sreality_spider.image_cache
+
+
+def test_crawl_resumes_from_checkpoint_after_restart(tmp_path, mock_api_response_parser):
+    checkpoint_path = str(tmp_path / "checkpoint.json")
+    spider = SrealitySpider(checkpoint_path=checkpoint_path)
+    spider.crawler = Mock()
+    spider.page_parser = mock_api_response_parser
+    spider.max_items = 180
+    items = [
+        FlatItemModel(id=uuid.uuid4(), hash_id=hash_id, title="Flat", image_url="http://example.com/img.jpg")
+        for hash_id in range(3)
+    ]
+    mock_api_response_parser.parse_api_response.return_value = items
+
+    first_page = HtmlResponse(
+        url=f"{ApiUrlConfigService.BASE_API_URL}?per_page=60&page=1",
+        body=b'{"result_size": 10000, "_embedded": {"estates": []}}',
+    )
+    list(spider.parse(first_page))
+    spider.batch_flushed(items=items[:2])
+    interrupted_spider = SrealitySpider(checkpoint_path=checkpoint_path)
+    # Page 1 is saved only partially, it is downloaded again
+    assert [ApiUrlConfigService.get_page_number(request.url) for request in interrupted_spider.start_requests()] == [
+        1,
+        2,
+        3,
+    ]
+
+    spider.batch_flushed(items=items[2:])
+    spider.spider_closed(spider, reason="shutdown")
+
+    restarted_spider = SrealitySpider(checkpoint_path=checkpoint_path)
+    restarted_spider.max_items = 180
+    assert restarted_spider.items_scraped == 3
+    assert [ApiUrlConfigService.get_page_number(request.url) for request in restarted_spider.start_requests()] == [
+        2,
+        3,
+    ]
+
+    restarted_spider.spider_closed(restarted_spider, reason="finished")
+    assert not (tmp_path / "checkpoint.json").exists()
+
+
+def test_unbounded_crawl_schedules_every_page(mock_api_response_parser):
+    spider = SrealitySpider(max_items="all", concurrent_pages=2)
+    spider.page_parser = mock_api_response_parser
+    mock_api_response_parser.parse_api_response.return_value = []
+    first_page = HtmlResponse(
+        url="http://example.com/api?per_page=60&page=1",
+        body=b'{"result_size": 1000000, "_embedded": {"estates": []}}',
+    )
+
+    requests = [request for request in spider.parse(first_page) if isinstance(request, Request)]
+
+    assert spider.max_items is None
+    assert spider.last_page == 16667
+    assert len(requests) == 2
+
+
+def test_crawl_continues_with_next_category():
+    spider = SrealitySpider(categories="1:1,2:2")
+    spider.crawler = Mock()
+    spider.last_page = 3
+
+    with pytest.raises(DontCloseSpider):
+        spider.spider_idle(spider)
+
+    (request,), _ = spider.crawler.engine.crawl.call_args
+    assert "category_main_cb=2&category_type_cb=2" in request.url
+    assert (spider.category_index, spider.last_page) == (1, None)
+    assert spider.spider_idle(spider) is None
+
+
+def test_next_category_waits_for_pending_writes_only(tmp_path, mock_api_response_parser):
+    spider = SrealitySpider(categories="1:1,2:2", checkpoint_path=str(tmp_path / "checkpoint.json"))
+    spider.crawler = Mock()
+    spider.page_parser = mock_api_response_parser
+    items = [
+        FlatItemModel(id=uuid.uuid4(), hash_id=hash_id, title="Flat", image_url="http://example.com/img.jpg")
+        for hash_id in range(2)
+    ]
+    mock_api_response_parser.parse_api_response.return_value = items
+    list(spider.parse(HtmlResponse(url=f"{ApiUrlConfigService.BASE_API_URL}?page=1", body=b'{"result_size": 2}')))
+
+    spider.crawler.signals.send_catch_log.return_value = [(Mock(), 2)]
+    with pytest.raises(DontCloseSpider):
+        spider.spider_idle(spider)
+    assert spider.category_index == 0
+
+    # The batch failed: the category is completed without waiting for its items
+    spider.batch_failed(items=items)
+    with pytest.raises(DontCloseSpider):
+        spider.spider_idle(spider)
+    assert spider.category_index == 1
+
+
+def test_next_category_does_not_wait_without_database_pipeline(tmp_path, mock_api_response_parser):
+    spider = SrealitySpider(categories="1:1,2:2", checkpoint_path=str(tmp_path / "checkpoint.json"))
+    spider.crawler = Mock()
+    spider.crawler.signals.send_catch_log.return_value = []
+    spider.page_parser = mock_api_response_parser
+    mock_api_response_parser.parse_api_response.return_value = [
+        FlatItemModel(id=uuid.uuid4(), hash_id=1, title="Flat", image_url="http://example.com/img.jpg")
+    ]
+    list(spider.parse(HtmlResponse(url=f"{ApiUrlConfigService.BASE_API_URL}?page=1", body=b'{"result_size": 1}')))
+
+    with pytest.raises(DontCloseSpider):
+        spider.spider_idle(spider)
+    assert spider.category_index == 1
+
+
+def test_pages_are_held_while_detail_requests_pile_up(sreality_spider):
+    sreality_spider.crawler = Mock()
+    sreality_spider.max_pending_requests = 4
+    sreality_spider.pending_requests = 4
+    sreality_spider.last_page = 10
+
+    assert list(sreality_spider.schedule_next_pages("http://example.com/api?per_page=60&page=1", count=2)) == []
+
+    sreality_spider.request_finished()
+    assert not sreality_spider.crawler.engine.crawl.called
+    sreality_spider.request_finished()
+    pages = [call.args[0].url for call in sreality_spider.crawler.engine.crawl.call_args_list]
+    assert pages == ["http://example.com/api?per_page=60&page=2", "http://example.com/api?per_page=60&page=3"]